@@ -0,0 +1,319 @@
+import argparse
+from datetime import datetime
+import heapq
+import json
+import os
+import re
+
+from metrics import Histogram
+
+# Streaming analysis of robot logs: rebuilds the path of every poll and
+# action around the ring and breaks their time down per hop, without
+# loading the logs into memory. Files are read in fixed-size chunks, and a
+# poll is summarized and dropped once no line about it has been seen for
+# `settle` seconds of log time, so memory stays bounded by the polls in
+# flight rather than by the size of the logs.
+
+# "[2025-04-29T23:05:03.149638] Robot3 : text"
+LOG_LINE = re.compile(r"^\[(?P<ts>[^\]]+)\] Robot(?P<robot>\d+) : (?P<text>.*)$")
+POLL = r"(?: \(poll (?P<poll>[^)]+)\))?"
+RECEIVED = re.compile(r"^Received (?P<kind>poll|action|tree poll|tree decision)(?: message)? on (?:action|topic) "
+                      r"'(?P<topic>\w+)'(?: \((?:accepted|rejected)\))? from robot (?P<sender>\d+)" + POLL + r"\.$")
+SENT = re.compile(r"^Sent (?P<kind>\w+) message on topic '(?P<topic>\w+)' to robot on (?P<address>[^ ]+?)" + POLL + r"\.$")
+DECISION = re.compile(r"^Proposal to '(?P<topic>[^']+)' by robot (?P<initiator>\d+)" + POLL +
+                      r" was (?P<result>accepted|rejected)\.$")
+STARTED = re.compile(r"^Started processing (?P<type>\w+) message")
+PROCESSED = re.compile(r"^Message processed in (?P<seconds>[\d.]+) seconds")
+PROPAGATION = re.compile(r"Message propagation to the next peer took (?P<seconds>[\d.]+) seconds")
+
+# Messages that travel hop by hop and are followed along their path
+PHASES = ("poll", "action", "tree_poll", "tree_decision")
+# Key of the poll in single-poll mode, whose log lines carry no poll id
+SINGLE_POLL = "-"
+
+
+def read_lines(path, chunk_size=1 << 20):
+    """Yield the lines of a file, read `chunk_size` bytes at a time."""
+    with open(path, "rb") as f:
+        tail = b""
+        while chunk := f.read(chunk_size):
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                yield line.decode("utf-8", errors="replace")
+        if tail:
+            yield tail.decode("utf-8", errors="replace")
+
+
+def read_log(path, chunk_size=1 << 20):
+    """Yield (epoch, robot_id, text) for every robot line of a log file."""
+    for line in read_lines(path, chunk_size):
+        match = LOG_LINE.match(line.rstrip("\r"))
+        if match:
+            ts = datetime.fromisoformat(match["ts"]).timestamp()
+            yield ts, int(match["robot"]), match["text"]
+
+
+def read_logs(paths, chunk_size=1 << 20):
+    """
+    Lines of several logs merged by time. Each robot writes its own log in
+    order, so per-robot logs can be merged without sorting them.
+    """
+    streams = [read_log(path, chunk_size) for path in paths]
+    if len(streams) == 1:
+        return streams[0]
+    return heapq.merge(*streams, key=lambda line: line[0])
+
+
+def log_files(path):
+    """The common log of a robot_logs directory, or its per-robot logs if there is none."""
+    if not os.path.isdir(path):
+        return [path]
+    common = os.path.join(path, "all_robots.log")
+    if os.path.exists(common):
+        return [common]
+    return sorted(os.path.join(path, name) for name in os.listdir(path)
+                  if name.startswith("robot_") and name.endswith(".log"))
+
+
+def summary(histogram):
+    return histogram.summary() if histogram.count else None
+
+
+class PollTrace:
+    """Everything seen so far about one poll, per phase: {rid: time} of receipts and sends."""
+
+    def __init__(self, key):
+        self.key = key
+        self.topic = None
+        self.initiator = None
+        self.result = None
+        self.decision_time = None
+        self.first_seen = None
+        self.last_seen = None
+        # {phase: {"received": {rid: (ts, sender)}, "sent": {rid: ts}}}
+        self.phases = {}
+
+    def seen(self, ts):
+        self.first_seen = ts if self.first_seen is None else min(self.first_seen, ts)
+        self.last_seen = ts if self.last_seen is None else max(self.last_seen, ts)
+
+    def phase(self, name):
+        return self.phases.setdefault(name, {"received": {}, "sent": {}})
+
+
+class LogAnalyzer:
+    """
+    Feed it log lines in time order with add(); report() returns the
+    results. Hop times are split into the time a robot spent on a message
+    (received to sent on) and the time to the next robot (sent to received).
+    """
+
+    def __init__(self, settle=60.0, path_limit=20):
+        self.settle = settle
+        self.path_limit = path_limit
+        self.now = None
+        self.lines = 0
+        self.robots = set()
+        self.active = {}
+        self.polls = []
+        self.hop_times = {phase: Histogram() for phase in PHASES}
+        self.robot_times = {phase: Histogram() for phase in PHASES}
+        self.decision_times = Histogram()
+        self.propagation = {}
+        self.processing = {}
+        self.failovers = Histogram()
+        self.unreachable = 0
+        self.timeouts = {}
+        self.expired_polls = 0
+        self.graceful_shutdowns = 0
+        # Per robot: message type being processed, type of the last send, unreachable successor since
+        self.processing_type = {}
+        self.last_sent = {}
+        self.failure_seen = {}
+
+    def trace(self, poll_id, ts):
+        key = poll_id or SINGLE_POLL
+        trace = self.active.get(key)
+        if trace is None:
+            trace = self.active[key] = PollTrace(key)
+        trace.seen(ts)
+        return trace
+
+    def add(self, ts, rid, text):
+        self.lines += 1
+        self.robots.add(rid)
+        if self.now is None or ts > self.now:
+            self.now = ts
+        if self.lines % 10000 == 0:
+            self.settle_polls()
+
+        if match := RECEIVED.match(text):
+            trace = self.trace(match["poll"], ts)
+            trace.topic = trace.topic or match["topic"]
+            trace.phase(match["kind"].replace(" ", "_"))["received"].setdefault(rid, (ts, int(match["sender"])))
+        elif match := SENT.match(text):
+            self.last_sent[rid] = match["kind"]
+            if match["kind"] in PHASES:
+                trace = self.trace(match["poll"], ts)
+                trace.phase(match["kind"])["sent"].setdefault(rid, ts)
+        elif match := PROPAGATION.search(text):
+            msg_type = self.last_sent.pop(rid, "unknown")
+            self.propagation.setdefault(msg_type, Histogram()).record(float(match["seconds"]))
+        elif match := STARTED.match(text):
+            self.processing_type[rid] = match["type"]
+        elif match := PROCESSED.match(text):
+            msg_type = self.processing_type.pop(rid, "unknown")
+            self.processing.setdefault(msg_type, Histogram()).record(float(match["seconds"]))
+        elif match := DECISION.match(text):
+            trace = self.trace(match["poll"], ts)
+            if trace.result is None:
+                trace.result = match["result"]
+                trace.initiator = int(match["initiator"])
+                trace.decision_time = ts
+        elif text.startswith("Could not reach successor"):
+            self.unreachable += 1
+            self.failure_seen.setdefault(rid, ts)
+        elif text.startswith("Ring repaired") and rid in self.failure_seen:
+            self.failovers.record(ts - self.failure_seen.pop(rid))
+        elif text.startswith(("Consensus timeout reached", "Timeout reached")):
+            kind = text.split(".")[0]
+            self.timeouts[kind] = self.timeouts.get(kind, 0) + 1
+        elif " expired without a result" in text or " is past its deadline" in text:
+            self.expired_polls += 1
+        elif text == "Gracefully shutted down.":
+            self.graceful_shutdowns += 1
+
+    def settle_polls(self, everything=False):
+        """Summarize the polls nothing has been logged about for `settle` seconds."""
+        for key, trace in list(self.active.items()):
+            if everything or trace.last_seen < self.now - self.settle:
+                self.polls.append(self.summarize(self.active.pop(key)))
+
+    def summarize(self, trace):
+        phases = {}
+        for name, phase in trace.phases.items():
+            received, sent = phase["received"], phase["sent"]
+            hop_times = Histogram()
+            robot_times = Histogram()
+            for rid, (ts, sender) in received.items():
+                if sender in sent and ts >= sent[sender]:
+                    hop_times.record(ts - sent[sender])
+                if rid in sent and sent[rid] >= ts:
+                    robot_times.record(sent[rid] - ts)
+            self.hop_times[name].merge(hop_times)
+            self.robot_times[name].merge(robot_times)
+
+            # The robots in the order the message reached them, starting with its sender
+            path = [rid for rid, _ in sorted(received.items(), key=lambda item: item[1][0])]
+            if path and received[path[0]][1] not in received:
+                path.insert(0, received[path[0]][1])
+            times = [ts for ts, _ in received.values()]
+            phases[name] = {
+                'hops': len(received),
+                'duration_s': max(times) - min(times) if times else None,
+                'path': path[:self.path_limit],
+                'path_truncated': len(path) > self.path_limit,
+                'hop_s': summary(hop_times),
+                'robot_s': summary(robot_times),
+            }
+
+        decision_s = None
+        if trace.decision_time is not None:
+            decision_s = trace.decision_time - trace.first_seen
+            self.decision_times.record(decision_s)
+        return {
+            'poll': trace.key,
+            'topic': trace.topic,
+            'initiator': trace.initiator,
+            'result': trace.result,
+            'first_seen': trace.first_seen,
+            'decision_s': decision_s,
+            'phases': phases,
+        }
+
+    def report(self):
+        self.settle_polls(everything=True)
+        results = {}
+        for poll in self.polls:
+            results[poll['result'] or 'undecided'] = results.get(poll['result'] or 'undecided', 0) + 1
+        return {
+            'lines': self.lines,
+            'robots': len(self.robots),
+            'polls': sorted(self.polls, key=lambda poll: poll['first_seen'] or 0),
+            'results': results,
+            'decision_s': summary(self.decision_times),
+            'hop_s': {phase: summary(h) for phase, h in self.hop_times.items() if h.count},
+            'robot_s': {phase: summary(h) for phase, h in self.robot_times.items() if h.count},
+            'propagation_s': {t: summary(h) for t, h in sorted(self.propagation.items())},
+            'processing_s': {t: summary(h) for t, h in sorted(self.processing.items())},
+            'failovers': {'unreachable': self.unreachable, 'repairs': self.failovers.count,
+                          'duration_s': summary(self.failovers)},
+            'timeouts': self.timeouts,
+            'expired_polls': self.expired_polls,
+            'graceful_shutdowns': self.graceful_shutdowns,
+        }
+
+
+def ms(stats, field):
+    return f"{stats[field] * 1000:.2f}" if stats else "-"
+
+
+def print_report(report, max_polls=20):
+    results = ", ".join(f"{count} {result}" for result, count in sorted(report['results'].items()))
+    print(f"{report['lines']} lines from {report['robots']} robots, {len(report['polls'])} polls ({results or 'none'})")
+
+    print(f"\n{'phase':<14} {'hops':>8} {'hop p50':>10} {'hop p99':>10} {'robot p50':>10} {'robot p99':>10}  (ms)")
+    for phase in PHASES:
+        hops, robot = report['hop_s'].get(phase), report['robot_s'].get(phase)
+        if hops or robot:
+            print(f"{phase:<14} {(hops or robot)['count']:>8} {ms(hops, 'p50'):>10} {ms(hops, 'p99'):>10} "
+                  f"{ms(robot, 'p50'):>10} {ms(robot, 'p99'):>10}")
+
+    print(f"\n{'poll':<12} {'topic':<12} {'result':<10} {'decision s':>10} {'poll hops':>10} {'action hops':>12} {'action s':>9}")
+    for poll in report['polls'][:max_polls]:
+        ring = poll['phases'].get('poll') or poll['phases'].get('tree_poll') or {}
+        action = poll['phases'].get('action') or poll['phases'].get('tree_decision') or {}
+        decision = f"{poll['decision_s']:.3f}" if poll['decision_s'] is not None else "-"
+        action_s = f"{action['duration_s']:.3f}" if action.get('duration_s') is not None else "-"
+        print(f"{poll['poll']:<12} {poll['topic'] or '-':<12} {poll['result'] or '-':<10} {decision:>10} "
+              f"{ring.get('hops', 0):>10} {action.get('hops', 0):>12} {action_s:>9}")
+    if len(report['polls']) > max_polls:
+        print(f"... {len(report['polls']) - max_polls} more in the JSON report")
+
+    failovers = report['failovers']
+    print(f"\nUnreachable successors: {failovers['unreachable']}, ring repairs: {failovers['repairs']} "
+          f"(p50 {ms(failovers['duration_s'], 'p50')} ms)")
+    timeouts = ", ".join(f"{kind}: {count}" for kind, count in report['timeouts'].items())
+    print(f"Timeouts: {timeouts or 'none'}. Expired polls: {report['expired_polls']}. "
+          f"Graceful shutdowns: {report['graceful_shutdowns']}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-poll latency breakdown from robot logs")
+    parser.add_argument('paths', help="Log files or robot_logs directories (default: robot_logs). "
+                        "Pass the common log or the per-robot logs, not both", nargs='*', default=["robot_logs"])
+    parser.add_argument('--output', help="JSON report (default: log_analysis.json)", default="log_analysis.json")
+    parser.add_argument('--settle', help="Seconds of log time after its last line before a poll is summarized "
+                        "(default: 60)", type=float, default=60.0)
+    parser.add_argument('--path_limit', help="Robots of each path kept in the report (default: 20)",
+                        type=int, default=20)
+    parser.add_argument('--max_polls', help="Polls shown in the table (default: 20)", type=int, default=20)
+    parser.add_argument('--chunk_size', help="Bytes read at a time (default: 1 MiB)", type=int, default=1 << 20)
+    args = parser.parse_args()
+
+    files = [path for arg in args.paths for path in log_files(arg)]
+    analyzer = LogAnalyzer(settle=args.settle, path_limit=args.path_limit)
+    for ts, rid, text in read_logs(files, args.chunk_size):
+        analyzer.add(ts, rid, text)
+    report = analyzer.report()
+    report['files'] = files
+
+    print_report(report, args.max_polls)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import copy
+import json
+import time
+import timeit
+
+from codec import BINARY, JSON, decode_payload, encode_payload
+
+
+class _Recorder:
+    """Stands in for robot.connection_pool and keeps the messages handed to it."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, host, port, message):
+        self.sent.append(message)
+        return False
+
+
+class _NullLogger:
+    def log(self, message, level=None):
+        pass
+
+
+def sample_messages(setup="setup5.json", trace=False):
+    """
+    One message of each type the robots send, captured from robot.py's own
+    send paths as robot 2 of `setup` sends them: with message ids, the
+    membership deltas after a ring repair and, with `trace`, trace contexts.
+    """
+    import robot
+    from membership import Membership
+    from metrics import RobotMetrics
+    from tracing import Tracer
+
+    with open(setup) as f:
+        robot.robots = {int(rid): info for rid, info in json.load(f).items()}
+    robot.membership = Membership(robot.robots, 2)
+    robot.metrics = RobotMetrics(2)
+    robot.logger = _NullLogger()
+    # Same votes on every run
+    robot.seed_random(0, 2)
+    robot.connection_pool = recorder = _Recorder()
+    if trace:
+        robot.tracer = Tracer(2, None)
+
+    def sent_by(send, *args):
+        send(*args)
+        return recorder.sent[-1]
+
+    def address(rid):
+        return robot.robots[rid]["host"], robot.robots[rid]["port"]
+
+    # Robot 1 starts a poll that robot 2 votes on and passes on
+    poll = robot.with_message_id(robot.create_poll_message(1, *address(1)), 1)
+    robot.start_time_shutdown = poll['poll']['start_time'] = time.time()
+
+    def vote(count_for=1):
+        # Voting changes the poll it is given
+        received = copy.deepcopy(poll)
+        received['poll']['count_for'] = count_for
+        return robot.process_message(received, 2).forward
+
+    samples = {"poll": sent_by(robot.handle_server, *address(3), 2, vote())}
+    # One more vote for decides it, and robot 2 starts the action
+    samples["action"] = sent_by(robot.handle_server, *address(3), 2, vote(len(robot.robots) // 2))
+    samples["ping"] = sent_by(robot.ping, 2, 3)
+    samples["shutdown"] = sent_by(robot.send_to_all, 2, robot.tracer.stamp({"type": "shutdown", "sender_id": 2}))
+    # Robot 3 is gone: the next poll robot 2 sends carries the repair
+    robot.record_repair(2, 3, 4, [])
+    samples["poll+membership"] = sent_by(robot.handle_server, *address(4), 2, vote())
+    return samples
+
+
+def bench(codec, message, number):
+    payload = encode_payload(message, codec)
+    encode_time = timeit.timeit(lambda: encode_payload(message, codec), number=number) / number
+    decode_time = timeit.timeit(lambda: decode_payload(payload), number=number) / number
+    return len(payload), encode_time, decode_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the JSON and binary message codecs")
+    parser.add_argument(
+        '-n', '--number',
+        help="Encode/decode iterations per message type (default: 100000)",
+        type=int,
+        default=100000
+    )
+    parser.add_argument('-f', '--file', help="Robot setup file (default: setup5.json)", default="setup5.json")
+    parser.add_argument('--trace', help="Messages carry trace contexts, as with robot.py --trace", action='store_true')
+    args = parser.parse_args()
+
+    columns = f"{'bytes':>7}{'encode us':>12}{'decode us':>12}"
+    print(f"{'type':<18}{'codec':<10}{columns}")
+    for msg_type, message in sample_messages(args.file, args.trace).items():
+        results = {}
+        for codec in (JSON, BINARY):
+            results[codec.name] = bench(codec, message, args.number)
+            size, encode_time, decode_time = results[codec.name]
+            print(f"{msg_type:<18}{codec.name:<10}{size:>7}{encode_time * 1e6:>12.2f}{decode_time * 1e6:>12.2f}")
+        # JSON size and times over binary ones, each under its own column
+        size, encode, decode = (j / b for j, b in zip(results[JSON.name], results[BINARY.name]))
+        print(f"{'':<18}{'json/bin':<10}{size:>6.1f}x{encode:>11.1f}x{decode:>11.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import argparse
+import ast
+from datetime import datetime
+import json
+import os
+import re
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from analyze_logs import PROPAGATION, read_log
+
+# End-to-end benchmark: launches real swarms of robot.py processes from a
+# generated setup file and measures one vote per run from the logs and
+# metrics files the robots leave behind.
+
+ROBOT_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "robot.py")
+
+START_TIME = re.compile(r"start_time_shutdown set to (?P<epoch>[\d.]+)")
+
+
+def make_setup(size, faulty, host="127.0.0.1", base_port=8100, unix=False):
+    """
+    Ring of `size` robots in the setupN.json format. Robot 1 starts the poll;
+    `faulty` robots spread evenly over the rest of the ring exit at start.
+    With `unix`, robots also get a Unix socket path (relative to their working directory).
+    """
+    faulty_ids = set()
+    if faulty:
+        step = (size - 1) / faulty
+        faulty_ids = {2 + int(i * step) for i in range(faulty)}
+    setup = {
+        str(rid): {
+            "host": host,
+            "port": base_port + rid,
+            "test_send": rid == 1,
+            "successor": rid % size + 1,
+            "all_vote_against": False,
+            "faulty": rid in faulty_ids,
+        }
+        for rid in range(1, size + 1)
+    }
+    if unix:
+        for rid, info in setup.items():
+            info["path"] = f"robot_{rid}.sock"
+    return setup
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def pick(p):
+        return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+    return {
+        'count': len(values),
+        'mean': statistics.mean(values),
+        'p50': pick(50),
+        'p90': pick(90),
+        'p99': pick(99),
+        'max': values[-1],
+    }
+
+
+def read_last_metrics(path):
+    """Parse the last pprinted snapshot of a robot_<id>_metrics.log file."""
+    with open(path) as f:
+        blocks = f.read().split("==== Metrics at")
+    body = blocks[-1].split("====\n", 1)[-1]
+    return ast.literal_eval(body.strip())
+
+
+def analyze(workdir, initiator=1):
+    """Turn the logs and metrics of one run into measurements."""
+    poll_start = None
+    timer_start = None
+    decision = None
+    decision_time = None
+    action_times = []
+    shutdown_times = []
+    propagation = []
+    failovers = []
+    failure_seen = {}
+
+    for ts, rid, text in read_log(os.path.join(workdir, "robot_logs", "all_robots.log")):
+        if poll_start is None and (match := START_TIME.search(text)):
+            poll_start = float(match["epoch"])
+        elif rid == initiator and text.startswith("Consensus timer started"):
+            timer_start = ts
+        elif decision is None and text.startswith("Proposal to") and text.endswith(("accepted.", "rejected.")):
+            decision = "accepted" if text.endswith("accepted.") else "rejected"
+            decision_time = ts
+        elif text.startswith("Action '") and " completed in " in text:
+            action_times.append(ts)
+        elif text == "Gracefully shutted down.":
+            shutdown_times.append(ts)
+        elif match := PROPAGATION.search(text):
+            propagation.append(float(match["seconds"]))
+        elif text.startswith("Could not reach successor"):
+            failure_seen.setdefault(rid, ts)
+        elif text.startswith("Ring repaired") and rid in failure_seen:
+            failovers.append(ts - failure_seen.pop(rid))
+
+    # The poll's start_time is the initiator's timer start
+    poll_start = poll_start or timer_start
+
+    def since_start(ts):
+        return ts - poll_start if ts is not None and poll_start is not None else None
+
+    messages_sent = {}
+    bytes_sent = {}
+    metrics_dir = os.path.join(workdir, "robot_metrics")
+    for name in os.listdir(metrics_dir) if os.path.isdir(metrics_dir) else []:
+        if not name.endswith("_metrics.log"):
+            continue
+        traffic = read_last_metrics(os.path.join(metrics_dir, name)).get('traffic', {})
+        for msg_type, count in traffic.get('messages_sent', {}).items():
+            messages_sent[msg_type] = messages_sent.get(msg_type, 0) + count
+        for msg_type, size in traffic.get('bytes_sent', {}).items():
+            bytes_sent[msg_type] = bytes_sent.get(msg_type, 0) + size
+
+    decisions = 1 if decision else 0
+    return {
+        'decision': decision,
+        'decision_s': since_start(decision_time),
+        'first_action_s': since_start(min(action_times, default=None)),
+        'last_action_s': since_start(max(action_times, default=None)),
+        'shutdown_s': since_start(max(shutdown_times, default=None)),
+        'graceful_shutdowns': len(shutdown_times),
+        'propagation_s': percentiles(propagation),
+        'failover_s': percentiles(failovers),
+        'messages_sent': messages_sent,
+        'bytes_sent': bytes_sent,
+        'messages_per_decision': sum(messages_sent.values()) / decisions if decisions else None,
+        'bytes_per_decision': sum(bytes_sent.values()) / decisions if decisions else None,
+    }
+
+
+def run_swarm(size, faulty, timeout, robot_args, base_port, keep=False, unix=False):
+    """Launch one swarm, wait for it to finish and return its measurements."""
+    workdir = tempfile.mkdtemp(prefix=f"swarm_bench_{size}_")
+    setup_path = os.path.join(workdir, "setup.json")
+    with open(setup_path, "w") as f:
+        json.dump(make_setup(size, faulty, base_port=base_port, unix=unix), f, indent=4)
+
+    cmd = [sys.executable, ROBOT_PY, "-a", "-f", setup_path, "--timeout", str(timeout), *robot_args]
+    processes = []
+    started = time.time()
+    # Start the initiator last so the others are already listening
+    for rid in list(range(2, size + 1)) + [1]:
+        processes.append(subprocess.Popen(cmd + [str(rid)], cwd=workdir,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+
+    deadline = started + timeout + 10
+    while time.time() < deadline and any(p.poll() is None for p in processes):
+        time.sleep(0.1)
+    wall_time = time.time() - started
+    finished = all(p.poll() is not None for p in processes)
+
+    # Stragglers get a KeyboardInterrupt first so they still write their metrics
+    for p in processes:
+        if p.poll() is None:
+            p.send_signal(signal.SIGINT)
+    for p in processes:
+        try:
+            p.wait(timeout=3)
+        except subprocess.TimeoutExpired:
+            p.kill()
+            p.wait()
+    time.sleep(0.5)  # Let the loggers flush
+
+    result = {'size': size, 'faulty': faulty, 'finished': finished, 'wall_s': wall_time}
+    result.update(analyze(workdir))
+    if keep:
+        result['workdir'] = workdir
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(ROBOT_PY),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure end-to-end poll latency for swarms of different sizes")
+    parser.add_argument('--sizes', help="Swarm sizes to run (default: 3 5 10)", type=int, nargs='+', default=[3, 5, 10])
+    parser.add_argument('--faulty', help="Faulty robots per swarm (default: 0)", type=int, default=0)
+    parser.add_argument('--repeat', help="Runs per size (default: 1)", type=int, default=1)
+    parser.add_argument('--timeout', help="Consensus timeout passed to the robots (default: 110)",
+                        type=float, default=110.0)
+    parser.add_argument('--base_port', help="Robot i listens on base_port + i (default: 8100)", type=int, default=8100)
+    parser.add_argument('--robot_args', help="Extra arguments for every robot, e.g. \"--runtime asyncio\"", default="")
+    parser.add_argument('--output', help="Results file (default: benchmark_results.json)",
+                        default="benchmark_results.json")
+    parser.add_argument('--keep', help="Keep each run's directory with its logs", action='store_true')
+    parser.add_argument('--unix', help="Give every robot a Unix socket, used instead of TCP between them",
+                        action='store_true')
+    args = parser.parse_args()
+
+    runs = []
+    for size in args.sizes:
+        for i in range(args.repeat):
+            result = run_swarm(size, args.faulty, args.timeout, args.robot_args.split(), args.base_port, args.keep,
+                               args.unix)
+            result['repeat'] = i
+            runs.append(result)
+            shutdown = f"{result['shutdown_s']:.2f}s" if result['shutdown_s'] is not None else "-"
+            print(f"size={size:<4} run={i} decision={result['decision'] or '-':<9} "
+                  f"shutdown={shutdown:<8} messages={sum(result['messages_sent'].values()):<6} "
+                  f"bytes={sum(result['bytes_sent'].values())}")
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'args': vars(args),
+        'runs': runs,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
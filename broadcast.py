@@ -0,0 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+def broadcast(send, targets, concurrency=8, deadline=5.0):
+    """
+    Call send(target) for every target, at most `concurrency` at a time,
+    and wait at most `deadline` seconds for all of them together.
+    Returns {target: None if sent, else the exception}, in target order.
+    Targets not done by the deadline get a TimeoutError; their sends are
+    left to finish in the background.
+    """
+    targets = list(targets)
+    if not targets:
+        return {}
+    executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(targets))),
+                                  thread_name_prefix="broadcast")
+    futures = {executor.submit(send, target): target for target in targets}
+    done, not_done = wait(futures, timeout=deadline)
+
+    results = {}
+    for future in done:
+        results[futures[future]] = future.exception()
+    for future in not_done:
+        future.cancel()
+        results[futures[future]] = TimeoutError(f"not sent within the {deadline}s broadcast deadline")
+    executor.shutdown(wait=False, cancel_futures=True)
+    return {target: results[target] for target in targets}
@@ -0,0 +1,175 @@
+import json
+import math
+import struct
+
+# Every frame payload starts with one byte naming the codec that wrote it,
+# so a receiver can decode any frame no matter what was negotiated.
+
+
+class JsonCodec:
+    """Plain JSON, understood by every peer."""
+
+    id = 0
+    name = "json"
+
+    def supports(self, message):
+        return True
+
+    def encode(self, message):
+        return json.dumps(message).encode('utf-8')
+
+    def decode(self, data):
+        return json.loads(bytes(data))
+
+
+# Fixed part shared by all binary messages: type code, sender id
+_HEADER = struct.Struct("!BI")
+# Message id (robot id, sequence number), after the header if the type code has _WITH_MSG_ID set
+_MSG_ID = struct.Struct("!IQ")
+_WITH_MSG_ID = 0x80
+# poll: topic, initiator id, votes for, votes against, start time (NaN if unset or None)
+_POLL = struct.Struct("!BIIId")
+# action: topic, initiator id
+_ACTION = struct.Struct("!BI")
+
+# Fields the binary encoding leaves out: human-readable text and sender
+# addresses that every robot already knows from its setup file.
+_DROPPED = ("message", "sender_host", "sender_port")
+
+# Fields carried in the fixed-width part of each message type. A nested
+# entry lists the fields of the sub-dict. Anything else is appended as a
+# JSON extension so that new fields never get lost on the way.
+_SCHEMAS = {
+    "poll": {"type": None, "sender_id": None,
+             "poll": {"topic", "initiator_id", "count_for", "count_against", "start_time"}},
+    "action": {"type": None, "sender_id": None, "action": {"topic", "initiator_id"}},
+    "ping": {"type": None, "sender_id": None},
+    "shutdown": {"type": None, "sender_id": None},
+}
+_TYPE_CODES = {name: code for code, name in enumerate(_SCHEMAS, start=1)}
+_TYPE_NAMES = {code: name for name, code in _TYPE_CODES.items()}
+
+
+def _split_extra(message, schema):
+    """Collect the fields of a message that the fixed-width part does not cover."""
+    extra = {}
+    for key, value in message.items():
+        if key in _DROPPED:
+            continue
+        if key not in schema:
+            extra[key] = value
+        elif schema[key] is not None:
+            nested = {k: v for k, v in value.items() if k not in schema[key]}
+            if nested:
+                extra[key] = nested
+    return extra
+
+
+def _packs_as_id(msg_id):
+    """Whether a message id is a (robot id, sequence number) pair that fits _MSG_ID."""
+    return (isinstance(msg_id, (list, tuple)) and len(msg_id) == 2
+            and all(type(n) is int for n in msg_id)
+            and 0 <= msg_id[0] < 1 << 32 and 0 <= msg_id[1] < 1 << 64)
+
+
+def _merge_extra(message, extra):
+    for key, value in extra.items():
+        if isinstance(value, dict) and isinstance(message.get(key), dict):
+            message[key].update(value)
+        else:
+            message[key] = value
+    return message
+
+
+class BinaryCodec:
+    """
+    Compact encoding of the known message types with fixed-width fields.
+    Types it has no schema for (e.g. 'regular') are left to JSON.
+    """
+
+    id = 1
+    name = "binary"
+
+    def supports(self, message):
+        return message.get("type") in _TYPE_CODES
+
+    def encode(self, message):
+        msg_type = message["type"]
+        code = _TYPE_CODES[msg_type]
+        extra = _split_extra(message, _SCHEMAS[msg_type])
+        msg_id = extra.get("msg_id")
+        if _packs_as_id(msg_id):
+            del extra["msg_id"]
+            parts = [_HEADER.pack(code | _WITH_MSG_ID, message["sender_id"]), _MSG_ID.pack(*msg_id)]
+        else:
+            parts = [_HEADER.pack(code, message["sender_id"])]
+
+        if msg_type == "poll":
+            poll = message["poll"]
+            start_time = poll.get("start_time")
+            if start_time is None:
+                start_time = math.nan
+                # NaN reads back as unset, so an explicit None goes in the extension
+                if "start_time" in poll:
+                    extra.setdefault("poll", {})["start_time"] = None
+            parts.append(_POLL.pack(poll["topic"], poll["initiator_id"], poll["count_for"],
+                                    poll["count_against"], start_time))
+        elif msg_type == "action":
+            action = message["action"]
+            parts.append(_ACTION.pack(action["topic"], action["initiator_id"]))
+
+        if extra:
+            parts.append(json.dumps(extra).encode('utf-8'))
+        return b"".join(parts)
+
+    def decode(self, data):
+        code, sender_id = _HEADER.unpack_from(data, 0)
+        msg_type = _TYPE_NAMES[code & ~_WITH_MSG_ID]
+        message = {"type": msg_type, "sender_id": sender_id}
+        offset = _HEADER.size
+        if code & _WITH_MSG_ID:
+            message["msg_id"] = list(_MSG_ID.unpack_from(data, offset))
+            offset += _MSG_ID.size
+
+        if msg_type == "poll":
+            topic, initiator_id, count_for, count_against, start_time = _POLL.unpack_from(data, offset)
+            offset += _POLL.size
+            message["poll"] = {"topic": topic, "initiator_id": initiator_id,
+                               "count_for": count_for, "count_against": count_against}
+            if not math.isnan(start_time):
+                message["poll"]["start_time"] = start_time
+        elif msg_type == "action":
+            topic, initiator_id = _ACTION.unpack_from(data, offset)
+            offset += _ACTION.size
+            message["action"] = {"topic": topic, "initiator_id": initiator_id}
+
+        if offset < len(data):
+            _merge_extra(message, json.loads(bytes(data[offset:])))
+        return message
+
+
+JSON = JsonCodec()
+BINARY = BinaryCodec()
+CODECS = {codec.name: codec for codec in (JSON, BINARY)}
+_CODECS_BY_ID = {codec.id: codec for codec in CODECS.values()}
+
+
+def encode_payload(message, codec=JSON):
+    """Encode a message with the given codec, falling back to JSON for unknown types."""
+    if not codec.supports(message):
+        codec = JSON
+    return bytes((codec.id,)) + codec.encode(message)
+
+
+def decode_payload(payload):
+    """Decode a frame payload with the codec named in its first byte."""
+    view = memoryview(payload)
+    return _CODECS_BY_ID[view[0]].decode(view[1:])
+
+
+def choose_codec(offered, preferred):
+    """Pick the codec for a connection: the first of the peer's offers we accept."""
+    for name in offered:
+        if name in CODECS and name in preferred:
+            return CODECS[name]
+    return JSON
@@ -0,0 +1,309 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+
+from codec import CODECS, JSON, choose_codec, decode_payload, encode_payload
+from framing import FrameDecoder, encode_frame, read_frame
+
+# How long to wait for a peer to accept a new connection
+CONNECT_TIMEOUT = 2.0
+# Extra connection attempts (peers may still be starting up)
+CONNECT_RETRIES = 3
+RETRY_DELAY = 0.25
+# How long to wait for a peer to answer a codec offer before using JSON
+HELLO_TIMEOUT = 1.0
+
+
+def encode_message(message, codec=JSON):
+    """Serialize a message for the wire as one length-prefixed frame."""
+    return encode_frame(encode_payload(message, codec))
+
+
+def decode_message(payload):
+    """Decode the payload of one frame back into a message."""
+    return decode_payload(payload)
+
+
+def hello_message(codecs):
+    """Codec offer sent as the first frame of a pooled connection."""
+    return {"type": "hello", "codecs": list(codecs)}
+
+
+def answer_hello(message, accepted):
+    """Reply to a codec offer with the codec this connection will use."""
+    codec = choose_codec(message.get("codecs", []), accepted)
+    return {"type": "hello", "codec": codec.name}
+
+
+def negotiated_codec(reply):
+    if reply is None or reply.get("type") != "hello":
+        return JSON
+    return CODECS.get(reply.get("codec"), JSON)
+
+
+def connect_unix(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def unix_paths(robots, host):
+    """
+    {(host, port): path} of the robots in a setup table that have a Unix
+    socket "path" and run on `host`, the host of the robot using the table.
+    Robots on other hosts are reached over TCP.
+    """
+    return {(info["host"], info["port"]): info["path"]
+            for info in robots.values() if info.get("path") and info["host"] == host}
+
+
+def listen_unix(path):
+    """A listening Unix domain socket at path, replacing a socket file left behind by an earlier run."""
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen()
+    return sock
+
+
+def is_healthy(sock):
+    """
+    Check that a pooled stream is still usable without blocking.
+    A readable socket that returns no data has been closed by the peer.
+    """
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        data = sock.recv(1, socket.MSG_PEEK)
+    except (BlockingIOError, InterruptedError):
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.settimeout(timeout)
+    return bool(data)
+
+
+class ConnectionPool:
+    """
+    Keeps one long-lived stream per peer, keyed by (host, port).
+    Streams are health-checked before reuse and re-established only when
+    the peer closed them or they were discarded after a ring change.
+    The codec of each stream is negotiated when it is opened: `codecs`
+    lists the ones offered, in order of preference.
+    `on_sent(message, size)` is called for every frame written.
+    Peers listed in `unix_paths` ({(host, port): path}) are reached over
+    that Unix domain socket instead of TCP.
+    """
+
+    def __init__(self, codecs=("json",), connect_retries=CONNECT_RETRIES, retry_delay=RETRY_DELAY, on_sent=None,
+                 unix_paths=None):
+        self.codecs = list(codecs)
+        self.connect_retries = connect_retries
+        self.retry_delay = retry_delay
+        self.on_sent = on_sent
+        self.unix_paths = unix_paths or {}
+        self._connections = {}
+        self._peer_locks = {}
+        self._lock = threading.Lock()
+
+    def _write(self, sock, message, codec=JSON):
+        data = encode_message(message, codec)
+        sock.sendall(data)
+        if self.on_sent is not None:
+            self.on_sent(message, len(data))
+
+    def _peer_lock(self, key):
+        with self._lock:
+            return self._peer_locks.setdefault(key, threading.Lock())
+
+    def _connect(self, key):
+        attempt = 0
+        path = self.unix_paths.get(key)
+        while True:
+            try:
+                if path is not None:
+                    return connect_unix(path)
+                sock = socket.create_connection(key, timeout=CONNECT_TIMEOUT)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                return sock
+            except (ConnectionRefusedError, FileNotFoundError):
+                # FileNotFoundError: the peer has not created its Unix socket yet
+                if attempt >= self.connect_retries:
+                    raise
+                attempt += 1
+                time.sleep(self.retry_delay)
+
+    def _negotiate(self, sock):
+        """Offer our codecs on a fresh stream and wait for the peer's choice."""
+        if self.codecs == [JSON.name]:
+            return JSON
+        self._write(sock, hello_message(self.codecs))
+        sock.settimeout(HELLO_TIMEOUT)
+        decoder = FrameDecoder(size=256)
+        try:
+            while True:
+                if not decoder.recv_into(sock):
+                    raise ConnectionResetError("Peer closed the connection during the codec handshake")
+                for payload in decoder.frames():
+                    return negotiated_codec(decode_message(payload))
+        except TimeoutError:
+            return JSON
+        finally:
+            sock.settimeout(CONNECT_TIMEOUT)
+
+    def send(self, host, port, message):
+        """
+        Send a message over the pooled stream to (host, port).
+        Returns True if a new connection had to be opened.
+        Raises socket.error if the peer cannot be reached.
+        """
+        key = (host, port)
+        with self._peer_lock(key):
+            conn = self._connections.get(key)
+            if conn is not None and not is_healthy(conn[0]):
+                self._close(key)
+                conn = None
+
+            if conn is not None:
+                sock, codec = conn
+                try:
+                    self._write(sock, message, codec)
+                    return False
+                except OSError:
+                    # Stale stream: fall through to a single fresh attempt
+                    self._close(key)
+
+            sock = self._connect(key)
+            try:
+                codec = self._negotiate(sock)
+                self._write(sock, message, codec)
+            except OSError:
+                sock.close()
+                raise
+            self._connections[key] = (sock, codec)
+            return True
+
+    def discard(self, host, port):
+        """Drop the stream to a peer that left the ring."""
+        key = (host, port)
+        with self._peer_lock(key):
+            self._close(key)
+
+    def close_all(self):
+        with self._lock:
+            keys = list(self._connections)
+        for host, port in keys:
+            self.discard(host, port)
+
+    def _close(self, key):
+        conn = self._connections.pop(key, None)
+        if conn is not None:
+            try:
+                conn[0].close()
+            except OSError:
+                pass
+
+
+class AsyncConnectionPool:
+    """
+    asyncio counterpart of ConnectionPool: one long-lived
+    (StreamReader, StreamWriter) pair per peer, keyed by (host, port).
+    """
+
+    def __init__(self, codecs=("json",), connect_retries=CONNECT_RETRIES, retry_delay=RETRY_DELAY, on_sent=None,
+                 unix_paths=None):
+        self.codecs = list(codecs)
+        self.connect_retries = connect_retries
+        self.retry_delay = retry_delay
+        self.on_sent = on_sent
+        self.unix_paths = unix_paths or {}
+        self._connections = {}
+        self._peer_locks = {}
+
+    async def _write(self, writer, message, codec=JSON):
+        data = encode_message(message, codec)
+        writer.write(data)
+        await writer.drain()
+        if self.on_sent is not None:
+            self.on_sent(message, len(data))
+
+    async def _connect(self, key):
+        attempt = 0
+        path = self.unix_paths.get(key)
+        while True:
+            try:
+                if path is not None:
+                    return await asyncio.wait_for(asyncio.open_unix_connection(path), CONNECT_TIMEOUT)
+                return await asyncio.wait_for(asyncio.open_connection(*key), CONNECT_TIMEOUT)
+            except (ConnectionRefusedError, FileNotFoundError):
+                if attempt >= self.connect_retries:
+                    raise
+                attempt += 1
+                await asyncio.sleep(self.retry_delay)
+
+    async def _negotiate(self, reader, writer):
+        """Offer our codecs on a fresh stream and wait for the peer's choice."""
+        if self.codecs == [JSON.name]:
+            return JSON
+        await self._write(writer, hello_message(self.codecs))
+        try:
+            payload = await asyncio.wait_for(read_frame(reader), HELLO_TIMEOUT)
+        except asyncio.TimeoutError:
+            return JSON
+        if payload is None:
+            raise ConnectionResetError("Peer closed the connection during the codec handshake")
+        return negotiated_codec(decode_message(payload))
+
+    async def send(self, host, port, message):
+        """
+        Send a message over the pooled stream to (host, port).
+        Returns True if a new connection had to be opened.
+        Raises OSError if the peer cannot be reached.
+        """
+        key = (host, port)
+        lock = self._peer_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            conn = self._connections.get(key)
+            if conn is not None:
+                reader, writer, codec = conn
+                if writer.is_closing() or reader.at_eof():
+                    self._close(key)
+                else:
+                    try:
+                        await self._write(writer, message, codec)
+                        return False
+                    except OSError:
+                        # Stale stream: fall through to a single fresh attempt
+                        self._close(key)
+
+            reader, writer = await self._connect(key)
+            try:
+                codec = await self._negotiate(reader, writer)
+                await self._write(writer, message, codec)
+            except OSError:
+                writer.close()
+                raise
+            self._connections[key] = (reader, writer, codec)
+            return True
+
+    def discard(self, host, port):
+        """Drop the stream to a peer that left the ring."""
+        self._close((host, port))
+
+    def close_all(self):
+        for key in list(self._connections):
+            self._close(key)
+
+    def _close(self, key):
+        conn = self._connections.pop(key, None)
+        if conn is not None:
+            conn[1].close()
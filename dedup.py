@@ -0,0 +1,38 @@
+from collections import OrderedDict
+import threading
+import time
+
+# Ids of the messages a robot has handled. A robot that cannot reach its
+# successor resends the message to the next live robot; if the first send
+# got through after all, the message can reach that robot twice, once
+# passed on by the old successor and once resent. The second copy carries
+# the same id and is dropped on arrival instead of being voted or acted
+# on again.
+
+
+class DedupCache:
+    """
+    Remembers the last `capacity` keys for `ttl` seconds each, least
+    recently seen first out. Safe to use from several threads.
+    """
+
+    def __init__(self, capacity=10000, ttl=60.0, clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> expiry time, oldest first
+        self.lock = threading.Lock()
+
+    def seen(self, key):
+        """True if `key` was seen within the TTL. Either way it is remembered from now on."""
+        now = self.clock()
+        with self.lock:
+            expiry = self.entries.pop(key, None)
+            self.entries[key] = now + self.ttl
+            # Entries are in expiry order, so the expired ones are at the front
+            while self.entries and (len(self.entries) > self.capacity or next(iter(self.entries.values())) <= now):
+                self.entries.popitem(last=False)
+            return expiry is not None and expiry > now
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,175 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+# Upper bounds (seconds) of the histogram buckets shown to Prometheus.
+# The histograms keep much finer buckets; these are summed up for export.
+BUCKET_BOUNDS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class _Exposition:
+    """Collects metric families in the Prometheus text format."""
+
+    def __init__(self, robot_id):
+        self.robot_id = robot_id
+        self.lines = []
+        self.declared = set()
+
+    def _declare(self, name, kind, help_text):
+        if name not in self.declared:
+            self.declared.add(name)
+            self.lines.append(f"# HELP {name} {help_text}")
+            self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name, kind, help_text, value, **labels):
+        self._declare(name, kind, help_text)
+        self.lines.append(f"{name}{_labels(robot=self.robot_id, **labels)} {value}")
+
+    def histogram(self, name, help_text, histogram, **labels):
+        self._declare(name, "histogram", help_text)
+        for bound, count in zip(BUCKET_BOUNDS, histogram.cumulative_counts(BUCKET_BOUNDS)):
+            self.lines.append(f"{name}_bucket{_labels(robot=self.robot_id, **labels, le=bound)} {count}")
+        self.lines.append(f"{name}_bucket{_labels(robot=self.robot_id, **labels, le='+Inf')} {histogram.count}")
+        self.lines.append(f"{name}_sum{_labels(robot=self.robot_id, **labels)} {histogram.total}")
+        self.lines.append(f"{name}_count{_labels(robot=self.robot_id, **labels)} {histogram.count}")
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def render_prometheus(metrics, ring_size=None):
+    """Render a RobotMetrics snapshot in the Prometheus text exposition format."""
+    m = metrics.snapshot()
+    out = _Exposition(metrics.robot_id)
+
+    for msg_type, count in sorted(m.message_counts.items()):
+        out.sample("robot_messages_received_total", "counter",
+                   "Messages received, per message type.", count, type=msg_type)
+    for msg_type, count in sorted(m.messages_sent.items()):
+        out.sample("robot_messages_sent_total", "counter",
+                   "Frames written to peers, per message type.", count, type=msg_type)
+    for msg_type, size in sorted(m.bytes_sent.items()):
+        out.sample("robot_bytes_sent_total", "counter",
+                   "Bytes written to peers, per message type.", size, type=msg_type)
+    for action, count in sorted(m.action_counts.items()):
+        out.sample("robot_actions_total", "counter",
+                   "Actions performed, per action.", count, action=action)
+    for vote, count in sorted(m.vote_distribution.items()):
+        out.sample("robot_votes_total", "counter",
+                   "Votes cast by this robot.", count, vote=vote)
+    out.sample("robot_polls_started_total", "counter",
+               "Polls started by this robot (multi-poll mode).", m.polls_started)
+    for result, count in sorted(m.decisions.items()):
+        out.sample("robot_decisions_total", "counter",
+                   "Poll decisions made by this robot (multi-poll mode).", count, result=result)
+    out.sample("robot_polls_expired_total", "counter",
+               "Own polls dropped at their deadline (multi-poll mode).", m.polls_expired)
+    out.sample("robot_failures_detected_total", "counter",
+               "Watched robots the failure detector found down.", m.failures_detected)
+    out.sample("robot_recoveries_total", "counter",
+               "Watched robots the failure detector found back up.", m.recoveries)
+    for result, count in sorted(m.dedup.items()):
+        out.sample("robot_dedup_lookups_total", "counter",
+                   "Received messages looked up in the dedup cache; hits were dropped as duplicates.",
+                   count, result=result)
+    out.sample("robot_rejected_messages_total", "counter",
+               "Times a message found the worker pool full and its stream was paused.", m.rejected_messages)
+    out.sample("robot_max_queue_depth", "gauge",
+               "Largest number of tasks seen waiting for a worker.", m.max_queue_depth)
+    if ring_size is not None:
+        out.sample("robot_ring_size", "gauge",
+                   "Robots this robot believes are in the ring.", ring_size)
+
+    for msg_type, histogram in sorted(m.message_propagation_times.items()):
+        out.histogram("robot_message_propagation_seconds",
+                      "Time to send a message to the next peer.", histogram, type=msg_type)
+    for topic, histogram in sorted(m.voting_times.items()):
+        out.histogram("robot_voting_seconds", "Time to make a vote decision.", histogram, topic=topic)
+    out.histogram("robot_decision_seconds", "Time from poll creation to its decision.", m.decision_times)
+    out.histogram("robot_failure_detection_seconds",
+                  "Time from a robot's last answered heartbeat to it being found down.", m.detection_times)
+    out.histogram("robot_action_seconds", "Time to perform an action.", m.action_execution_times)
+    out.histogram("robot_client_wait_seconds", "Time between accepted connections.", m.message_wait_times)
+    return out.text()
+
+
+class MetricsServer:
+    """
+    Serves GET /metrics over HTTP from a background thread.
+    `ring_size` is a callable so the current ring is read on every scrape.
+    """
+
+    def __init__(self, metrics, host, port, ring_size=None):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_prometheus(exporter.metrics, exporter.ring_size()).encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes are not worth a line in the robot logs
+                pass
+
+        self.metrics = metrics
+        self.ring_size = ring_size or (lambda: None)
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SnapshotWriter:
+    """
+    Appends a JSON line with the current metrics every `interval` seconds,
+    so trends can be followed while polls are in flight.
+    """
+
+    def __init__(self, metrics, path, interval, ring_size=None):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.ring_size = ring_size or (lambda: None)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-snapshots", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        """Append one snapshot now."""
+        snapshot = self.metrics.get_metrics()
+        snapshot['ring_size'] = self.ring_size()
+        line = json.dumps(snapshot) + "\n"
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+    def stop(self):
+        self.stopped.set()
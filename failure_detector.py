@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+
+class FailureDetector:
+    """
+    Timeout-based failure detector for the robots following this one on the ring.
+    A background thread sends a heartbeat to each watched robot every
+    `interval` seconds and keeps a liveness table of the results, so a
+    failover can look up the nearest live robot instead of probing the
+    ring one robot at a time. Entries older than `stale_after` seconds
+    are not trusted and are probed again, in parallel, when asked for.
+
+    `probe(rid)` sends one heartbeat and returns True if it got through.
+    `watched()` returns the robots to watch, nearest first.
+    `on_change(rid, alive, detection_time)` is called when a robot is
+    found down (with the time since its last answered heartbeat) or back up.
+    """
+
+    def __init__(self, probe, watched, interval=1.0, stale_after=None, on_change=None,
+                 max_parallel=8, clock=time.time):
+        self.probe = probe
+        self.watched = watched
+        self.interval = interval
+        self.stale_after = stale_after if stale_after is not None else 2 * interval
+        self.on_change = on_change or (lambda rid, alive, detection_time: None)
+        self.clock = clock
+        # {rid: {"alive": bool, "checked": float, "last_seen": float or None}}
+        self.table = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="heartbeat")
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="failure-detector", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.executor.shutdown(wait=False)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.probe_all(self.watched())
+            self.stopped.wait(self.interval)
+
+    def _update(self, rid, alive):
+        now = self.clock()
+        with self.lock:
+            entry = self.table.get(rid)
+            was_alive = entry["alive"] if entry else None
+            last_seen = now if alive else (entry["last_seen"] if entry else None)
+            self.table[rid] = {"alive": alive, "checked": now, "last_seen": last_seen}
+        if was_alive is True and not alive:
+            self.on_change(rid, False, now - last_seen)
+        elif was_alive is False and alive:
+            self.on_change(rid, True, None)
+
+    def probe_all(self, rids):
+        """Probe robots in parallel and return {rid: alive}."""
+        rids = list(rids)
+        if not rids or self.stopped.is_set():
+            return {}
+        try:
+            results = dict(zip(rids, self.executor.map(self.probe, rids)))
+        except RuntimeError:
+            # The executor was shut down while stopping
+            return {}
+        for rid, alive in results.items():
+            self._update(rid, alive)
+        return results
+
+    def cached(self, rid):
+        """Liveness of a robot from the table, or None if unknown or stale."""
+        with self.lock:
+            entry = self.table.get(rid)
+        if entry is None or self.clock() - entry["checked"] > self.stale_after:
+            return None
+        return entry["alive"]
+
+    def refresh(self, rids):
+        """Probe the robots among `rids` that have no fresh entry, in parallel."""
+        return self.probe_all([rid for rid in rids if self.cached(rid) is None])
+
+    def is_alive(self, rid):
+        """Liveness of a robot, probing it only if its entry is missing or stale."""
+        alive = self.cached(rid)
+        if alive is None:
+            alive = self.probe_all([rid]).get(rid, False)
+        return alive
+
+    def forget(self, rid):
+        with self.lock:
+            self.table.pop(rid, None)
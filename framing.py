@@ -0,0 +1,94 @@
+import struct
+
+# Every frame starts with the payload length as a 4-byte big-endian integer
+HEADER = struct.Struct("!I")
+# Refuse frames above this size instead of buffering without limit
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+# Initial size of the receive buffer
+BUFFER_SIZE = 64 * 1024
+
+
+def encode_frame(payload):
+    """Prefix a payload with its length."""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {len(payload)} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+    return HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for length-prefixed frames.
+    Data is received straight into a reusable bytearray; complete frames are
+    sliced off the front and the unfinished tail is moved back to the start
+    only when the buffer runs out of room.
+    """
+
+    def __init__(self, size=BUFFER_SIZE):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # First byte not yet decoded
+        self.end = 0    # One past the last received byte
+
+    def _make_room(self, needed):
+        """Ensure at least `needed` free bytes after self.end."""
+        if len(self.buffer) - self.end >= needed:
+            return
+        pending = self.end - self.start
+        if len(self.buffer) - pending < needed:
+            # Grow for a frame larger than the buffer
+            new_buffer = bytearray(max(len(self.buffer) * 2, pending + needed))
+            new_buffer[:pending] = self.view[self.start:self.end]
+            self.view.release()
+            self.buffer = new_buffer
+            self.view = memoryview(self.buffer)
+        else:
+            self.view[:pending] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = pending
+
+    def recv_into(self, sock):
+        """Receive from a socket into the buffer. Returns the number of bytes read."""
+        self._make_room(4096)
+        n = sock.recv_into(self.view[self.end:])
+        self.end += n
+        return n
+
+    def feed(self, data):
+        """Append bytes received by other means (e.g. an asyncio stream)."""
+        self._make_room(len(data))
+        self.view[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def frames(self):
+        """Yield the payload of every complete frame received so far."""
+        while self.end - self.start >= HEADER.size:
+            (length,) = HEADER.unpack_from(self.buffer, self.start)
+            if length > MAX_FRAME_SIZE:
+                raise ValueError(f"Frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+            frame_end = self.start + HEADER.size + length
+            if frame_end > self.end:
+                # Make sure the rest of a large frame fits
+                self._make_room(frame_end - self.end)
+                return
+            payload = bytes(self.view[self.start + HEADER.size:frame_end])
+            self.start = frame_end
+            yield payload
+        if self.start == self.end:
+            self.start = self.end = 0
+
+
+async def read_frame(reader):
+    """
+    Read one frame from an asyncio StreamReader. Returns None at end of
+    stream, also when the peer closed it in the middle of a frame.
+    """
+    # readexactly raises asyncio.IncompleteReadError, an EOFError, when the
+    # stream ends early
+    try:
+        header = await reader.readexactly(HEADER.size)
+        (length,) = HEADER.unpack(header)
+        if length > MAX_FRAME_SIZE:
+            raise ValueError(f"Frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+        return await reader.readexactly(length)
+    except EOFError:
+        return None
@@ -0,0 +1,505 @@
+import argparse
+import asyncio
+from contextlib import contextmanager
+import copy
+import json
+import os
+import time
+
+import robot
+from connections import AsyncConnectionPool, answer_hello, decode_message, encode_message, listen_unix, unix_paths
+from dedup import DedupCache
+from framing import read_frame
+from logger import DEBUG, LEVELS, WARNING, SharedLogger
+from membership import Membership
+from metrics import RobotMetrics, get_common_log_file, get_log_file, get_metrics_file
+
+# Many robots in one process, on one event loop.
+#
+# Every hosted robot is a real robot: it has its own listener, ring view,
+# membership, metrics, log file and metrics file, and runs the protocol code
+# from robot.py. As in simulator.py, a robot's private state is swapped into
+# the robot module globals whenever it runs that code; the swaps only wrap
+# synchronous calls, so robots never see each other's state across an await.
+#
+# Messages between robots of the same host are handed over in memory, in
+# order, without encoding them. Robots of the setup file that are not hosted
+# here (other hosts, robot.py processes) are reached over TCP as usual, and
+# reach the hosted robots through their listeners.
+
+
+class HostedRobot:
+    """Private state of one hosted robot (what a robot process keeps in globals)."""
+
+    __slots__ = ("rid", "host", "port", "test_send", "robots", "start_time_shutdown", "all_vote_against",
+                 "pending_actions", "polls", "tree_votes", "membership", "dedup", "metrics", "metrics_file", "log",
+                 "pool", "outbox", "actions", "server", "unix_server", "tasks", "running")
+
+    def __init__(self, rid, info, robots, log, codecs):
+        self.rid = rid
+        self.host = info["host"]
+        self.port = info["port"]
+        self.test_send = info["test_send"]
+        self.robots = robots
+        self.start_time_shutdown = None
+        self.all_vote_against = robots[rid].get("all_vote_against", False)
+        self.pending_actions = {}
+        self.polls = {}
+        self.tree_votes = {}
+        self.membership = Membership(robots, rid)
+        self.dedup = DedupCache()
+        self.metrics = RobotMetrics(rid)
+        self.metrics_file = get_metrics_file(rid)
+        self.log = log
+        # Streams to robots outside this host; traffic counts as this robot's
+        self.pool = AsyncConnectionPool(codecs, on_sent=self.record_sent, unix_paths=unix_paths(robots, self.host))
+        # Messages to the successor, sent one at a time and in order
+        self.outbox = asyncio.Queue()
+        # Actions, performed one at a time like the action executor
+        self.actions = asyncio.Queue()
+        self.server = None
+        self.unix_server = None
+        self.tasks = []
+        self.running = False
+
+    def record_sent(self, message, size):
+        self.metrics.record_sent(message['type'], size)
+
+
+class Host:
+    """
+    Runs the robots `ids` of a setup file until all of them have shut down.
+    Robots marked faulty in the setup file exit at start, like robot.py does.
+    """
+
+    def __init__(self, setup, ids, logger, codecs=("json",), all_vote_against=False,
+                 serial_actions=False, initiate_polls=None):
+        self.setup = setup
+        self.logger = logger
+        self.serial_actions = serial_actions
+        # (interval, max_in_flight) for multi-poll initiators
+        self.initiate_polls = initiate_polls
+        self.faulty = [rid for rid in ids if setup[rid]["faulty"]]
+        self.robots = {}
+        for rid in ids:
+            if rid in self.faulty:
+                continue
+            robots = {other: {"host": info["host"], "port": info["port"], "successor": info["successor"],
+                              "all_vote_against": info.get("all_vote_against", False), "path": info.get("path")}
+                      for other, info in setup.items()}
+            hosted = HostedRobot(rid, setup[rid], robots, logger.channel(get_log_file(rid)), list(codecs))
+            hosted.all_vote_against = all_vote_against or hosted.all_vote_against
+            self.robots[rid] = hosted
+        self.stopped = None
+
+    @contextmanager
+    def acting_as(self, hosted):
+        """Swap a robot's state into the robot module for the protocol code."""
+        robot.robots = hosted.robots
+        robot.start_time_shutdown = hosted.start_time_shutdown
+        robot.all_vote_against = hosted.all_vote_against
+        robot.pending_actions = hosted.pending_actions
+        robot.polls = hosted.polls
+        robot.tree_votes = hosted.tree_votes
+        robot.membership = hosted.membership
+        robot.dedup_cache = hosted.dedup
+        robot.metrics = hosted.metrics
+        robot.METRICS_FILE = hosted.metrics_file
+        robot.logger = hosted.log
+        try:
+            yield
+        finally:
+            hosted.start_time_shutdown = robot.start_time_shutdown
+
+    # --- receiving -----------------------------------------------------------
+
+    async def serve(self, hosted):
+        async def on_connect(reader, writer):
+            try:
+                while hosted.running:
+                    try:
+                        payload = await read_frame(reader)
+                    except (OSError, ValueError) as e:
+                        hosted.log.log(f"Robot{hosted.rid} : Dropped connection: {e}", WARNING)
+                        break
+                    if payload is None:
+                        break
+                    message = decode_message(payload)
+                    if message['type'] == 'hello':
+                        # Codec offer on a new stream: tell the peer what to use
+                        writer.write(encode_message(answer_hello(message, hosted.pool.codecs)))
+                        continue
+                    self.receive(hosted, message)
+            finally:
+                writer.close()
+
+        hosted.server = await asyncio.start_server(on_connect, hosted.host, hosted.port, reuse_address=True)
+        hosted.log.log(f"Robot{hosted.rid} : Listening on {hosted.host}:{hosted.port} (hosted)...")
+        path = self.setup[hosted.rid].get("path")
+        if path:
+            hosted.unix_server = await asyncio.start_unix_server(on_connect, sock=listen_unix(path))
+            hosted.log.log(f"Robot{hosted.rid} : Listening on {path}...")
+
+    def receive(self, hosted, message):
+        """Handle a message, from the network or from a robot of this host."""
+        if not hosted.running:
+            return
+        receive_time = time.time()
+        with self.acting_as(hosted):
+            message = robot.deduplicate(message, hosted.rid)
+            if message is None:
+                return
+            if robot.consensus_timed_out():
+                robot.log_message(f"Robot{hosted.rid} : Consensus timeout reached. Shutting down...", WARNING)
+                self.shut_down(hosted, broadcast=True)
+                return
+            outcome = robot.process_message(message, hosted.rid)
+        self.carry_out(hosted, outcome)
+        hosted.log.log(f"Robot{hosted.rid} : Message processed in {time.time() - receive_time:.2f} seconds.", DEBUG)
+
+    # --- carrying out outcomes -----------------------------------------------
+
+    def carry_out(self, hosted, outcome):
+        """Carry out an Outcome like robot.async_carry_out does."""
+        if outcome.action:
+            # With serial actions the rest of the outcome waits for the action
+            hosted.actions.put_nowait((outcome, outcome if self.serial_actions else None))
+            if self.serial_actions:
+                return
+        self.finish(hosted, outcome)
+
+    def finish(self, hosted, outcome):
+        """Shutdown and sends of an Outcome."""
+        if not hosted.running:
+            return
+        if outcome.shutdown:
+            self.shut_down(hosted, broadcast=outcome.shutdown == "broadcast")
+            return
+        if outcome.forward:
+            hosted.outbox.put_nowait(outcome.forward)
+        for target_id, message in outcome.sends:
+            self.spawn(hosted, self.send_direct(hosted, target_id, message))
+        if outcome.ack_timer:
+            asyncio.get_running_loop().call_later(robot.ACK_TIMEOUT, self.acks_expired, hosted, outcome.ack_timer)
+
+    async def act(self, hosted):
+        """The action executor of one robot."""
+        while True:
+            outcome, then = await hosted.actions.get()
+            start_time = robot.clock()
+            await asyncio.sleep(robot.ACTION_DURATION)
+            if not hosted.running:
+                return
+            with self.acting_as(hosted):
+                robot.complete_action(outcome.action, hosted.rid, start_time)
+                done = robot.action_completed(outcome.action_ack, hosted.rid)
+            self.finish(hosted, done)
+            if then is not None:
+                self.finish(hosted, then)
+
+    def acks_expired(self, hosted, key):
+        if not hosted.running:
+            return
+        with self.acting_as(hosted):
+            outcome = robot.acks_expired(key, hosted.rid)
+        self.finish(hosted, outcome)
+
+    # --- sending -------------------------------------------------------------
+
+    async def transmit(self, hosted, target_id, message):
+        """Hand a message to another robot. Returns False if it cannot be reached."""
+        host, port = self.setup[target_id]["host"], self.setup[target_id]["port"]
+        start_time = robot.clock()
+        peer = self.robots.get(target_id)
+        if peer is not None:
+            if not peer.running:
+                hosted.log.log(f"Robot{hosted.rid} : Could not reach robot {target_id}. Error: not running", WARNING)
+                return False
+            # In memory; call_soon keeps the messages of a sender in order.
+            # The receiver gets its own copy, as it would off the wire: voting
+            # changes the nested poll of the message it is given.
+            asyncio.get_running_loop().call_soon(self.receive, peer, copy.deepcopy(message))
+        elif target_id in self.faulty:
+            hosted.log.log(f"Robot{hosted.rid} : Could not reach robot {target_id}. Error: not running", WARNING)
+            return False
+        else:
+            try:
+                if await hosted.pool.send(host, port, message):
+                    hosted.log.log(f"Robot{hosted.rid} : Connected to server {host}:{port}.", DEBUG)
+            except OSError as e:
+                hosted.log.log(f"Robot{hosted.rid} : Could not reach robot {target_id}. Error: {e}", WARNING)
+                hosted.pool.discard(host, port)
+                return False
+        if message['type'] != 'shutdown':
+            with self.acting_as(hosted):
+                robot.log_sent_message(hosted.rid, message, host, port, start_time)
+        return True
+
+    async def send_direct(self, hosted, target_id, message):
+        """Send to any robot; a tree message that cannot be delivered is routed around the robot."""
+        message = robot.with_message_id(message, hosted.rid)
+        if target_id in hosted.robots and await self.transmit(hosted, target_id, message):
+            return True
+        if message['type'] in robot.TREE_MESSAGES and hosted.running:
+            with self.acting_as(hosted):
+                outcome = robot.tree_send_failed(message, target_id, hosted.rid)
+            self.finish(hosted, outcome)
+        return False
+
+    async def forward(self, hosted):
+        """Send the messages of the outbox to the successor, repairing the ring when it is gone."""
+        while True:
+            # Resent with the same id after a repair
+            message = robot.with_message_id(await hosted.outbox.get(), hosted.rid)
+            while hosted.running:
+                successor_id = hosted.robots[hosted.rid]["successor"]
+                with self.acting_as(hosted):
+                    outgoing = robot.with_membership(message, successor_id)
+                if await self.transmit(hosted, successor_id, outgoing):
+                    break
+                await self.repair(hosted, successor_id)
+
+    async def probe(self, hosted, target_id):
+        """Whether a robot is reachable: a ping, or a look at a robot of this host."""
+        if target_id in self.robots:
+            return self.robots[target_id].running
+        if target_id in self.faulty:
+            return False
+        ping_msg = {
+            "type": "ping",
+            "sender_id": hosted.rid,
+            "message": f"Ping from robot {hosted.rid} to robot {target_id}."
+        }
+        try:
+            await hosted.pool.send(self.setup[target_id]["host"], self.setup[target_id]["port"], ping_msg)
+            hosted.log.log(f"Robot{hosted.rid} : Pinged robot {target_id}.", DEBUG)
+            return True
+        except OSError as e:
+            hosted.log.log(f"Robot{hosted.rid} : Failed to ping robot {target_id}: {e}", WARNING)
+            return False
+
+    async def repair(self, hosted, old_successor):
+        """robot.find_new_successor for a hosted robot: probe first, then walk the ring on the results."""
+        hosted.log.log(f"Robot{hosted.rid} : Could not reach successor {old_successor}.", WARNING)
+        alive = {}
+        candidate = hosted.robots[old_successor]["successor"]
+        while candidate != hosted.rid and candidate in hosted.robots:
+            alive[candidate] = await self.probe(hosted, candidate)
+            if alive[candidate]:
+                break
+            candidate = hosted.robots[candidate]["successor"]
+
+        with self.acting_as(hosted):
+            new_successor, faulty_robots = robot.select_new_successor(hosted.rid, lambda rid: alive.get(rid, False))
+            if new_successor == hosted.rid:
+                robot.log_message(f"Robot{hosted.rid} : No successor found. I am alone in this world.", WARNING)
+                self.stop(hosted)
+                return
+            robot.record_repair(hosted.rid, old_successor, new_successor, faulty_robots)
+        for rid in [old_successor] + faulty_robots:
+            hosted.pool.discard(self.setup[rid]["host"], self.setup[rid]["port"])
+
+    # --- polls ---------------------------------------------------------------
+
+    def start_poll(self, hosted, message):
+        if robot.overlay == "tree":
+            with self.acting_as(hosted):
+                message = robot.create_tree_poll_message(message, hosted.rid)
+                outcome = robot.start_tree_poll(message, hosted.rid)
+            asyncio.get_running_loop().call_later(robot.TREE_TIMEOUT, self.tree_vote_expired,
+                                                  hosted, robot.tree_key(message['poll']))
+            self.finish(hosted, outcome)
+        else:
+            hosted.outbox.put_nowait(message)
+
+    def tree_vote_expired(self, hosted, key):
+        if not hosted.running:
+            return
+        with self.acting_as(hosted):
+            fallback = robot.tree_vote_expired(key, hosted.rid)
+        if fallback:
+            hosted.outbox.put_nowait(fallback)
+
+    async def poll_initiator(self, hosted, interval, max_in_flight):
+        """robot.async_poll_initiator for a hosted robot."""
+        while hosted.running:
+            with self.acting_as(hosted):
+                message = robot.start_poll(hosted.rid, hosted.host, hosted.port, max_in_flight)
+            if message:
+                self.start_poll(hosted, message)
+            await asyncio.sleep(interval)
+
+    # --- lifecycle -----------------------------------------------------------
+
+    def spawn(self, hosted, coroutine):
+        task = asyncio.create_task(coroutine)
+        hosted.tasks.append(task)
+        task.add_done_callback(hosted.tasks.remove)
+        return task
+
+    def shut_down(self, hosted, broadcast):
+        """robot.perform_graceful_shutdown for a hosted robot."""
+        if not hosted.running:
+            return
+        hosted.running = False
+        hosted.log.log(f"Robot{hosted.rid} : Shutting down initiated...")
+        if broadcast:
+            asyncio.create_task(self.broadcast_shutdown(hosted))
+        else:
+            self.stop(hosted)
+
+    async def broadcast_shutdown(self, hosted):
+        shutdown_msg = robot.with_message_id({"type": "shutdown", "sender_id": hosted.rid}, hosted.rid)
+        targets = [rid for rid in hosted.robots if rid != hosted.rid]
+        try:
+            sent = await asyncio.wait_for(
+                asyncio.gather(*(self.transmit(hosted, rid, shutdown_msg) for rid in targets)),
+                robot.BROADCAST_DEADLINE)
+        except asyncio.TimeoutError:
+            sent = [False] * len(targets)
+        for rid, ok in zip(targets, sent):
+            if ok:
+                hosted.log.log(f"Robot{hosted.rid} : Sent shutdown message to robot {rid}")
+            else:
+                hosted.log.log(f"Robot{hosted.rid} : Failed to send shutdown to robot {rid}", WARNING)
+        self.stop(hosted)
+
+    def stop(self, hosted):
+        hosted.running = False
+        if hosted.server is None:
+            return
+        hosted.server.close()
+        hosted.server = None
+        if hosted.unix_server is not None:
+            hosted.unix_server.close()
+            if os.path.exists(self.setup[hosted.rid]["path"]):
+                os.unlink(self.setup[hosted.rid]["path"])
+        hosted.pool.close_all()
+        for task in list(hosted.tasks):
+            if task is not asyncio.current_task():
+                task.cancel()
+        with self.acting_as(hosted):
+            robot.log_metrics()
+            robot.log_message(f"Robot{hosted.rid} : Gracefully shutted down.")
+        if not any(other.running for other in self.robots.values()):
+            self.stopped.set()
+
+    async def check_timeouts(self):
+        """The consensus timer of robot.run_async, for all robots at once."""
+        while not self.stopped.is_set():
+            for hosted in list(self.robots.values()):
+                if not hosted.running:
+                    continue
+                with self.acting_as(hosted):
+                    timed_out = robot.consensus_timed_out()
+                if timed_out:
+                    hosted.log.log(f"Robot{hosted.rid} : Timeout reached in server loop", WARNING)
+                    self.shut_down(hosted, broadcast=True)
+            await asyncio.sleep(robot.POLL_INTERVAL)
+
+    async def run(self):
+        self.stopped = asyncio.Event()
+        for rid in self.faulty:
+            self.logger.channel(get_log_file(rid)).log(f"Robot{rid} : Simulating a faulty robot. Shutting down...")
+        for hosted in self.robots.values():
+            await self.serve(hosted)
+            hosted.running = True
+        self.logger.log(f"Host : Running robots {sorted(self.robots)} in one process.")
+
+        for hosted in self.robots.values():
+            self.spawn(hosted, self.forward(hosted))
+            self.spawn(hosted, self.act(hosted))
+            if not robot.multi_poll:
+                # In multi-poll mode each poll has its own deadline instead
+                hosted.start_time_shutdown = time.time()
+                hosted.log.log(f"Robot{hosted.rid} : Consensus timer started (timeout: {robot.CONSENSUS_TIMEOUT}s)")
+
+        for hosted in self.robots.values():
+            if not hosted.test_send:
+                continue
+            if self.initiate_polls:
+                self.spawn(hosted, self.poll_initiator(hosted, *self.initiate_polls))
+            else:
+                with self.acting_as(hosted):
+                    message = robot.create_poll_message(hosted.rid, hosted.host, hosted.port)
+                self.start_poll(hosted, message)
+
+        timeouts = asyncio.create_task(self.check_timeouts())
+        try:
+            await self.stopped.wait()
+        finally:
+            timeouts.cancel()
+            for hosted in self.robots.values():
+                self.stop(hosted)
+
+
+def parse_ids(text, setup):
+    """Robot ids from "1-50,60,70-80", or all robots of the setup file for "all"."""
+    if text == "all":
+        return sorted(setup)
+    ids = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        ids.extend(range(int(first), int(last or first) + 1))
+    return [rid for rid in ids if rid in setup]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many robots of a setup file in one process")
+    parser.add_argument('-f', '--file', help="Setup file with all robots of the swarm", required=True)
+    parser.add_argument('--ids', help="Robots to run here, e.g. 1-50,60 (default: all)", default="all")
+    parser.add_argument('--timeout', help="Consensus timeout in seconds (default: 30)", type=float, default=30.0)
+    parser.add_argument('--all_vote_against', help="Force all robots to vote against", action='store_true')
+    parser.add_argument('--codec', help="Preferred wire codec towards other processes (default: binary)",
+                        choices=["binary", "json"], default="binary")
+    parser.add_argument('--log_level', help="Lowest level logged (default: debug)",
+                        choices=list(LEVELS), default="debug")
+    parser.add_argument('--serial_actions', help="Perform each action before passing the action message on",
+                        action='store_true')
+    parser.add_argument('--ack_timeout', help="Seconds to wait for the last action acknowledgements (default: 10)",
+                        type=float, default=10.0)
+    parser.add_argument('--multi_poll', help="Keep running with several polls in flight, as robot.py --multi_poll",
+                        action='store_true')
+    parser.add_argument('--poll_interval', help="Multi-poll mode: seconds between new polls (default: 1.0)",
+                        type=float, default=1.0)
+    parser.add_argument('--max_in_flight', help="Multi-poll mode: unfinished polls per initiator (default: 4)",
+                        type=int, default=4)
+    parser.add_argument('--poll_timeout', help="Multi-poll mode: seconds before a poll is dropped (default: 30)",
+                        type=float, default=30.0)
+    parser.add_argument('--ballot', help="Poll type, as robot.py --ballot (default: yes_no)",
+                        choices=["yes_no", "plurality", "borda"], default="yes_no")
+    parser.add_argument('--overlay', help="ring or tree, as robot.py --overlay (default: ring)",
+                        choices=["ring", "tree"], default="ring")
+    parser.add_argument('--fanout', help="Tree overlay: children per robot (default: 4)", type=int, default=4)
+    parser.add_argument('--tree_timeout', help="Tree overlay: seconds before falling back to the ring (default: 5)",
+                        type=float, default=5.0)
+    args = parser.parse_args()
+
+    with open(args.file, "r") as f:
+        setup = {int(rid): info for rid, info in json.load(f).items()}
+    ids = parse_ids(args.ids, setup)
+
+    robot.CONSENSUS_TIMEOUT = args.timeout
+    robot.ACK_TIMEOUT = args.ack_timeout
+    robot.multi_poll = args.multi_poll
+    robot.POLL_TIMEOUT = args.poll_timeout
+    robot.BALLOT = args.ballot
+    robot.overlay = args.overlay
+    robot.TREE_FANOUT = args.fanout
+    robot.TREE_TIMEOUT = args.tree_timeout
+
+    logger = SharedLogger([get_common_log_file()], level=LEVELS[args.log_level])
+    codecs = [args.codec, "json"] if args.codec != "json" else ["json"]
+    initiate_polls = (args.poll_interval, args.max_in_flight) if args.multi_poll else None
+    host = Host(setup, ids, logger, codecs=codecs, all_vote_against=args.all_vote_against,
+                serial_actions=args.serial_actions, initiate_polls=initiate_polls)
+    try:
+        asyncio.run(host.run())
+    except KeyboardInterrupt:
+        logger.log("Host : Shutting down...")
+    finally:
+        logger.close()
+
+
+if __name__ == "__main__":
+    main()
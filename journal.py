@@ -0,0 +1,330 @@
+import argparse
+from collections import Counter, namedtuple
+import heapq
+import itertools
+import json
+import os
+from pprint import pprint
+import struct
+import threading
+import time
+
+from codec import BINARY, decode_payload, encode_payload
+
+# Message journal of one robot: every message it received and sent, the
+# polls it started and the ring repairs it made, in the order they
+# happened. The file is append-only binary,
+#
+#     b"RJNL" version  header length  header (JSON: robot id, seed, setup, settings)
+#     record*          time  kind  peer  type length  payload length  type  payload
+#
+# with payloads in the compact binary codec. Together with --seed (which
+# fixes the robot's votes and topics) the inbound messages are the whole
+# workload of the robot, so `python journal.py <file>` can feed them back
+# through the message handling of robot.py, as fast as possible or at the
+# recorded pace, and measure it.
+
+MAGIC = b"RJNL"
+VERSION = 1
+_HEADER = struct.Struct("!4sBI")
+# time, kind, peer robot id, type length, payload length
+_RECORD = struct.Struct("!dBIBI")
+
+RECEIVED, SENT, STARTED, REPAIRED = range(4)
+KINDS = {RECEIVED: "received", SENT: "sent", STARTED: "started", REPAIRED: "repaired"}
+
+Record = namedtuple("Record", "time kind peer type payload")
+
+
+def get_journal_file(robot_id):
+    journal_dir = "robot_journals"
+    os.makedirs(journal_dir, exist_ok=True)
+    return os.path.join(journal_dir, f"robot_{robot_id}.journal")
+
+
+class Journal:
+    """
+    Appends the messages of one robot to `path`. `robots` is the setup of
+    the swarm, used to tell which robot a sent message went to; it is
+    written to the header along with `seed` and the protocol `settings`
+    a replay needs.
+    """
+
+    def __init__(self, robot_id, path, robots, seed=None, settings=None):
+        self.robot_id = robot_id
+        self.path = path
+        self.peers = {(info["host"], info["port"]): rid for rid, info in robots.items()}
+        self.lock = threading.Lock()
+        self.count = 0
+        header = json.dumps({
+            "robot_id": robot_id, "seed": seed, "started": time.time(),
+            "robots": robots, "settings": settings or {},
+        }).encode('utf-8')
+        self.file = open(path, "wb")
+        self.file.write(_HEADER.pack(MAGIC, VERSION, len(header)) + header)
+
+    def record(self, kind, peer, message):
+        payload = encode_payload(message, BINARY)
+        msg_type = message['type'].encode('utf-8')
+        data = _RECORD.pack(time.time(), kind, peer, len(msg_type), len(payload)) + msg_type + payload
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(data)
+            self.count += 1
+
+    def received(self, message):
+        self.record(RECEIVED, message.get('sender_id', 0), message)
+
+    def sent(self, host, port, message):
+        self.record(SENT, self.peers.get((host, port), 0), message)
+
+    def started(self, message):
+        """A poll this robot started (its topic came from the random generator)."""
+        self.record(STARTED, self.robot_id, message)
+
+    def repaired(self, old_successor, new_successor, faulty_robots):
+        self.record(REPAIRED, new_successor, {"type": "repair", "old_successor": old_successor,
+                                              "new_successor": new_successor, "faulty_robots": faulty_robots})
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+class NullJournal:
+    """Stands in for Journal when journaling is off."""
+
+    count = 0
+
+    def received(self, message):
+        pass
+
+    def sent(self, host, port, message):
+        pass
+
+    def started(self, message):
+        pass
+
+    def repaired(self, old_successor, new_successor, faulty_robots):
+        pass
+
+    def close(self):
+        pass
+
+
+def read_journal(path):
+    """The header and records of a journal. A record cut short by a crash ends it."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, length = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} robot journal")
+    offset = _HEADER.size
+    header = json.loads(data[offset:offset + length])
+    offset += length
+
+    records = []
+    while offset + _RECORD.size <= len(data):
+        timestamp, kind, peer, type_length, payload_length = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        end = start + type_length + payload_length
+        if end > len(data):
+            break
+        msg_type = data[start:start + type_length].decode('utf-8')
+        records.append(Record(timestamp, kind, peer, msg_type, data[start + type_length:end]))
+        offset = end
+    return header, records
+
+
+class _NullLogger:
+    def log(self, message, level=None):
+        pass
+
+
+def replay(header, records, pace="full"):
+    """
+    Run the recorded workload of one robot through robot.process_message
+    again, on the recorded clock, and measure it. Actions take
+    robot.ACTION_DURATION of that clock and sends are only counted; timers
+    (ack and tree timeouts) do not fire.
+    With pace "recorded" each message is handled at its recorded offset.
+    """
+    import robot
+    from membership import Membership
+    from metrics import RobotMetrics
+
+    rid = header["robot_id"]
+    now = [records[0].time if records else header["started"]]
+    robot.robots = {int(key): dict(info) for key, info in header["robots"].items()}
+    robot.membership = Membership(robot.robots, rid)
+    robot.polls, robot.tree_votes, robot.pending_actions = {}, {}, {}
+    robot.poll_counter = itertools.count(1)
+    robot.metrics = RobotMetrics(rid)
+    robot.logger = _NullLogger()
+    robot.clock = lambda: now[0]
+    robot.shutdown_flag = robot.timeout_flag = False
+    for name, value in header["settings"].items():
+        setattr(robot, name, value)
+    if header["seed"] is not None:
+        robot.seed_random(header["seed"], rid)
+
+    sent = Counter()
+    # Vote counts on the polls this robot passed on, to compare with the recording
+    tallies = []
+    handled = Counter()
+    handling_time = Counter()
+    diverged = []
+    ended = "end of journal"
+    # Actions in progress as (done time, order, action_ack); one at a time, like the action executor
+    actions = []
+    order = itertools.count()
+    busy_until = [0.0]
+
+    def send(message):
+        sent[message['type']] += 1
+        if message['type'] == 'poll':
+            tallies.append(_tally(message))
+
+    def settle(outcome):
+        """Count what an Outcome sends; True once the robot shuts down."""
+        if outcome.action:
+            busy_until[0] = max(now[0], busy_until[0]) + robot.ACTION_DURATION
+            heapq.heappush(actions, (busy_until[0], next(order), outcome.action_ack))
+        if outcome.shutdown == "broadcast":
+            sent["shutdown"] += len(robot.robots) - 1
+        if outcome.shutdown:
+            return True
+        if outcome.forward:
+            send(outcome.forward)
+        for _, message in outcome.sends:
+            send(message)
+        return False
+
+    def finish_actions(until):
+        """Complete the actions done by `until`; True once the robot shuts down."""
+        while actions and actions[0][0] <= until:
+            now[0], _, action_ack = heapq.heappop(actions)
+            if settle(robot.action_completed(action_ack, rid)):
+                return True
+        return False
+
+    host, port = robot.robots[rid]["host"], robot.robots[rid]["port"]
+    replay_start = time.perf_counter()
+    for record in records:
+        if pace == "recorded":
+            delay = (record.time - records[0].time) - (time.perf_counter() - replay_start)
+            if delay > 0:
+                time.sleep(delay)
+        if finish_actions(record.time):
+            ended = "shutdown"
+            break
+        now[0] = record.time
+
+        if record.kind == REPAIRED:
+            repair = decode_payload(record.payload)
+            robot.robots[rid]["successor"] = repair["new_successor"]
+            robot.record_repair(rid, repair["old_successor"], repair["new_successor"], repair["faulty_robots"])
+        elif record.kind == STARTED:
+            message = decode_payload(record.payload)
+            # Draws the same topic (and ranking) from the random generator
+            expected = robot.create_poll_message(rid, host, port)
+            # The binary codec leaves the text out
+            message.setdefault('message', expected['message'])
+            if expected['poll']['topic'] != message['poll']['topic']:
+                diverged.append(f"poll started at {record.time:.6f} on topic {expected['poll']['topic']}, "
+                                f"recorded {message['poll']['topic']}")
+            if 'deadline' in message['poll']:
+                robot.open_poll(message['poll'], rid)
+            if robot.overlay == "tree":
+                if message['type'] != 'tree_poll':
+                    message = robot.create_tree_poll_message(message, rid)
+                settle(robot.start_tree_poll(message, rid))
+            else:
+                send(message)
+        elif record.kind == RECEIVED:
+            if robot.consensus_timed_out():
+                ended = "consensus timeout"
+                break
+            start = time.perf_counter()
+            message = decode_payload(record.payload)
+            outcome = robot.process_message(message, rid)
+            handling_time[record.type] += time.perf_counter() - start
+            handled[record.type] += 1
+            if settle(outcome):
+                ended = "shutdown"
+                break
+    elapsed = time.perf_counter() - replay_start
+
+    recorded_sent = Counter(record.type for record in records if record.kind == SENT)
+    # Shutdowns to robots that were already gone are not in the journal
+    for msg_type in sorted((set(sent) | set(recorded_sent)) - {"shutdown"}):
+        if sent[msg_type] != recorded_sent[msg_type]:
+            diverged.append(f"sent {sent[msg_type]} {msg_type} messages, recorded {recorded_sent[msg_type]}")
+    recorded_tallies = [_tally(decode_payload(record.payload)) for record in records
+                        if record.kind == SENT and record.type == 'poll']
+    if tallies != recorded_tallies:
+        diverged.append(f"votes {tallies} on the polls sent, recorded {recorded_tallies}")
+
+    handling = sum(handling_time.values())
+    return {
+        "robot_id": rid,
+        "seed": header["seed"],
+        "pace": pace,
+        "records": len(records),
+        "messages": sum(handled.values()),
+        "ended": ended,
+        "elapsed_s": elapsed,
+        "handling_s": handling,
+        "messages_per_s": sum(handled.values()) / handling if handling else 0.0,
+        "per_type_us": {t: handling_time[t] / handled[t] * 1e6 for t in sorted(handled)},
+        "sent": dict(sent),
+        "recorded_sent": dict(recorded_sent),
+        "diverged": diverged,
+    }
+
+
+def _tally(message):
+    poll = message['poll']
+    return [poll['count_for'], poll['count_against']] + poll.get('scores', [])
+
+
+def list_records(header, records):
+    print(f"Robot {header['robot_id']}, seed {header['seed']}, {len(records)} records")
+    start = records[0].time if records else 0.0
+    for record in records:
+        print(f"{record.time - start:10.6f}  {KINDS[record.kind]:<8}  {record.peer:>5}  "
+              f"{record.type:<12}  {len(record.payload):>5} B  {decode_payload(record.payload)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a robot's message journal and measure its throughput")
+    parser.add_argument('path', help="Journal file (robot_journals/robot_<id>.journal)")
+    parser.add_argument('--pace', help="Replay as fast as possible or at the recorded pace (default: full)",
+                        choices=["full", "recorded"], default="full")
+    parser.add_argument('--repeat', help="Replay the journal this many times (default: 1)", type=int, default=1)
+    parser.add_argument('--list', help="Print the records instead of replaying them", action='store_true')
+    parser.add_argument('--output', help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    header, records = read_journal(args.path)
+    if args.list:
+        list_records(header, records)
+        return
+    if header["seed"] is None:
+        print("Recorded without --seed: votes and topics will differ from the recording.")
+
+    runs = [replay(header, records, args.pace) for _ in range(args.repeat)]
+    pprint(runs[-1])
+    if args.repeat > 1:
+        rates = sorted(run["messages_per_s"] for run in runs)
+        print(f"messages/s over {args.repeat} runs: min {rates[0]:.0f}, "
+              f"median {rates[len(rates) // 2]:.0f}, max {rates[-1]:.0f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(runs, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
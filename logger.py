@@ -0,0 +1,152 @@
+import atexit
+from datetime import datetime
+import queue
+import sys
+import threading
+
+# Log levels, same values as the standard logging module
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+
+
+class AsyncLogger:
+    """
+    Log lines are timestamped by the caller and queued; a background thread
+    writes them in batches to held-open files and the console, so logging
+    never does file I/O on the message-processing path.
+    If the queue is full, lines below WARNING are dropped; warnings and
+    errors wait up to `block_timeout` seconds for room first. The number
+    of dropped lines is written to the log with the next batch.
+    """
+
+    def __init__(self, paths, level=DEBUG, echo=True, queue_size=10000,
+                 flush_interval=0.2, batch_size=512, block_timeout=1.0):
+        self.level = level
+        self.echo = echo
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self.dropped_lock = threading.Lock()
+        self.lines = queue.Queue(maxsize=queue_size)
+        self.files = [open(path, "ab") for path in paths]
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="logger", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def log(self, message, level=INFO):
+        if level < self.level or self.closed:
+            return
+        line = f"[{datetime.now().isoformat()}] {message}\n"
+        self._put(line, level)
+
+    def _put(self, item, level):
+        try:
+            if level >= WARNING:
+                self.lines.put(item, timeout=self.block_timeout)
+            else:
+                self.lines.put_nowait(item)
+        except queue.Full:
+            with self.dropped_lock:
+                self.dropped += 1
+
+    def _run(self):
+        running = True
+        while running:
+            try:
+                batch = [self.lines.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.lines.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                # close() was called: write what came before it and stop
+                batch = batch[:batch.index(None)]
+                running = False
+            self._write(batch)
+
+    def _write(self, batch):
+        with self.dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            batch.append(f"[{datetime.now().isoformat()}] Logger : Dropped {dropped} log lines (queue full).\n")
+        if not batch:
+            return
+        text = "".join(batch)
+        if self.echo:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        data = text.encode('utf-8')
+        for f in self.files:
+            f.write(data)
+            f.flush()
+
+    def close(self):
+        """Flush the queued lines and close the files."""
+        if self.closed:
+            return
+        self.closed = True
+        self.lines.put(None)
+        self.thread.join()
+        for f in self.files:
+            f.close()
+
+
+class LogChannel:
+    """What one robot logs through in a SharedLogger; has the log() of AsyncLogger."""
+
+    def __init__(self, shared, file):
+        self.shared = shared
+        self.file = file
+
+    def log(self, message, level=INFO):
+        self.shared.log(message, level, self.file)
+
+
+class SharedLogger(AsyncLogger):
+    """
+    AsyncLogger for several robots in one process (host.py): one writer
+    thread for all of them. Lines go to the shared files as usual and,
+    when logged through a channel(), also to that channel's own file.
+    """
+
+    def __init__(self, paths, **kwargs):
+        self.channel_files = []
+        super().__init__(paths, **kwargs)
+
+    def channel(self, path):
+        f = open(path, "ab")
+        self.channel_files.append(f)
+        return LogChannel(self, f)
+
+    def log(self, message, level=INFO, file=None):
+        if level < self.level or self.closed:
+            return
+        line = f"[{datetime.now().isoformat()}] {message}\n"
+        self._put((file, line), level)
+
+    def _write(self, batch):
+        own = {}
+        lines = []
+        for f, line in batch:
+            lines.append(line)
+            if f is not None:
+                own.setdefault(f, []).append(line)
+        super()._write(lines)
+        for f, lines in own.items():
+            f.write("".join(lines).encode('utf-8'))
+            f.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        for f in self.channel_files:
+            f.close()
@@ -0,0 +1,130 @@
+from collections import deque
+from itertools import islice
+import threading
+
+# Deltas kept for robots that become a successor later on; older ones are
+# dropped, and ignored if they arrive again from the robot that made them
+LOG_SIZE = 1024
+
+
+class Membership:
+    """
+    Versioned view of the ring, kept in a robots table of the form
+    {robot_id: {"host", "port", "successor"}} that it changes in place.
+
+    Every change is a delta record stamped with an epoch, a (counter,
+    robot_id) pair: the counter is one more than the highest one this robot
+    has seen, and the robot id breaks ties between robots repairing the ring
+    at the same time. A delta holds successor changes and removed robot ids:
+
+        {"epoch": [counter, robot_id], "successors": [[rid, successor], ...], "removed": [rid, ...]}
+
+    Applying a delta is idempotent and the order does not matter: a robot's
+    successor is only overwritten by a newer epoch, and removed robots stay
+    removed. So robots that have seen the same deltas have the same ring,
+    however the deltas reached them.
+
+    Deltas travel on ordinary ring traffic: outgoing() returns what the
+    successor has not been sent yet, to piggyback on the next message to it.
+    A delta goes round the ring until it reaches the robot that made it, so
+    when one of this robot's deltas comes back, every robot has seen it and
+    the deltas sent before it. A new successor only gets the deltas after
+    that, out of the last `log_size` kept. A delta never removes the robot
+    itself: it is alive to receive it.
+    """
+
+    def __init__(self, robots, robot_id, log_size=LOG_SIZE):
+        self.robots = robots
+        self.robot_id = robot_id
+        self.counter = 0
+        self.epoch = (0, 0)
+        # Epoch of the delta that set each robot's current successor
+        self.versions = {}
+        self.removed = set()
+        self.log = deque()
+        self.log_size = log_size
+        # Deltas ever added to the log, and how many of the first ones are
+        # known to have gone round the ring
+        self.appended = 0
+        self.passed = 0
+        # Epochs of the deltas in the log with their place in it, and per
+        # robot that made deltas the highest epoch of its deltas dropped from
+        # the log. A robot's epochs only grow, so its deltas at or below that
+        # one have all been seen; another robot's delta with a lower epoch
+        # may still be new.
+        self.seen = {}
+        self.floors = {}
+        # Deltas not yet sent to sent_to, the successor they go to
+        self.unsent = []
+        self.sent_to = None
+        self.lock = threading.Lock()
+
+    def record(self, successors=(), removed=()):
+        """Make a change to the ring as a new delta and apply it. Returns the delta."""
+        with self.lock:
+            delta = {
+                "epoch": [self.counter + 1, self.robot_id],
+                "successors": [[rid, successor] for rid, successor in successors],
+                "removed": list(removed),
+            }
+            self._apply(delta)
+        return delta
+
+    def apply(self, delta):
+        """Apply a delta from another robot. Returns False if it was already applied."""
+        with self.lock:
+            return self._apply(delta)
+
+    def _apply(self, delta):
+        epoch = tuple(delta["epoch"])
+        if epoch in self.seen:
+            if epoch[1] == self.robot_id:
+                # Back from the lap round the ring
+                self.passed = max(self.passed, self.seen[epoch] + 1)
+            return False
+        if epoch <= self.floors.get(epoch[1], (0, 0)):
+            return False
+        self.seen[epoch] = self.appended
+        self.counter = max(self.counter, epoch[0])
+        self.epoch = max(self.epoch, epoch)
+
+        for rid in delta["removed"]:
+            if rid == self.robot_id:
+                continue
+            self.removed.add(rid)
+            self.robots.pop(rid, None)
+        for rid, successor in delta["successors"]:
+            if rid in self.removed or rid not in self.robots:
+                continue
+            if self.versions.get(rid, (0, 0)) < epoch:
+                self.versions[rid] = epoch
+                self.robots[rid]["successor"] = successor
+
+        self.log.append(delta)
+        self.appended += 1
+        self.unsent.append(delta)
+        while len(self.log) > self.log_size:
+            oldest = tuple(self.log.popleft()["epoch"])
+            del self.seen[oldest]
+            self.floors[oldest[1]] = max(self.floors.get(oldest[1], (0, 0)), oldest)
+        return True
+
+    def outgoing(self, successor):
+        """
+        The epoch and the deltas to piggyback on a message to `successor`.
+        A new successor gets the deltas not known to have gone round the
+        ring, since the old successor may have failed before passing them on.
+        """
+        with self.lock:
+            if successor != self.sent_to:
+                self.sent_to = successor
+                first = self.appended - len(self.log)
+                deltas = list(islice(self.log, max(0, self.passed - first), None))
+            else:
+                deltas = self.unsent
+            self.unsent = []
+            return {"epoch": list(self.epoch), "deltas": deltas}
+
+    def merge(self, piggyback):
+        """Apply the deltas piggybacked on a message. Returns the number that were new."""
+        return sum(self.apply(delta) for delta in piggyback["deltas"])
@@ -1,7 +1,10 @@
 from collections import defaultdict
 from datetime import datetime
+import math
 import os
-import statistics
+import threading
+import time
+import weakref
 
 # One file for all robots
 def get_common_log_file():
@@ -21,68 +24,376 @@ def get_metrics_file(robot_id):
     os.makedirs(metrics_dir, exist_ok=True)
     return os.path.join(metrics_dir, f"robot_{robot_id}_metrics.log")
 
-class RobotMetrics:
-    """Stores runtime metrics of each robot"""
+# Periodic JSON-lines metrics snapshots per each robot
+def get_snapshot_file(robot_id):
+    metrics_dir = "robot_metrics"
+    os.makedirs(metrics_dir, exist_ok=True)
+    return os.path.join(metrics_dir, f"robot_{robot_id}_metrics.jsonl")
 
-    def __init__(self, robot_id):
-        self.robot_id = robot_id
+# Histogram resolution: values are kept in units of 1 microsecond, each
+# power of two is split into SUB_BUCKETS linear buckets (relative error
+# below 1/SUB_BUCKETS) and values above 2**MAX_EXPONENT units (~71 minutes)
+# land in the last bucket.
+UNIT = 1e-6
+SUB_BUCKETS = 32
+MAX_EXPONENT = 32
+
+class Histogram:
+    """
+    Log-bucketed histogram of durations in seconds (HDR-style).
+    Recording is O(1) and memory is a fixed array of bucket counts, so it
+    can stay alive for the whole run. Histograms with the same layout can be
+    merged, and percentiles are read from the bucket counts.
+    """
+
+    def __init__(self):
+        # Bucket 0 holds values below one unit
+        self.counts = [0] * (MAX_EXPONENT * SUB_BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    @staticmethod
+    def _index(value):
+        units = value / UNIT
+        if units < 1:
+            return 0
+        # units = mantissa * 2**exponent with mantissa in [0.5, 1)
+        mantissa, exponent = math.frexp(units)
+        if exponent > MAX_EXPONENT:
+            return MAX_EXPONENT * SUB_BUCKETS
+        return (exponent - 1) * SUB_BUCKETS + int((mantissa * 2 - 1) * SUB_BUCKETS) + 1
+
+    @staticmethod
+    def _bucket_value(index):
+        """Middle of the value range covered by a bucket."""
+        if index == 0:
+            return UNIT / 2
+        exponent, sub = divmod(index - 1, SUB_BUCKETS)
+        return (1 + (sub + 0.5) / SUB_BUCKETS) * 2 ** exponent * UNIT
+
+    def record(self, value):
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Add the samples of another histogram to this one."""
+        for i, n in enumerate(other.counts):
+            if n:
+                self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def copy(self):
+        return Histogram().merge(self)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, p):
+        """Value below which p percent of the samples fall."""
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                # Never report outside the range actually recorded
+                return min(max(self._bucket_value(i), self.min), self.max)
+        return self.max
+
+    def cumulative_counts(self, bounds):
+        """Number of samples at or below each of the ascending bounds (bucket precision)."""
+        counts = []
+        seen = 0
+        i = 0
+        for bound in bounds:
+            last = self._index(bound)
+            while i <= last:
+                seen += self.counts[i]
+                i += 1
+            counts.append(seen)
+        return counts
+
+    def summary(self):
+        return {
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'count': self.count,
+        }
+
+class MetricsShard:
+    """
+    Metrics recorded by a single thread. Only the owning thread writes to
+    it, so its lock is uncontended except while a snapshot is being taken.
+    """
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.lock = threading.Lock()
         # Time to send a message to the next peer. Stored per each msg type.
-        self.message_propagation_times = defaultdict(list)
+        self.message_propagation_times = defaultdict(Histogram)
         # Time to vote(make a decision). Stored per each topic
-        self.voting_times = defaultdict(list)
+        self.voting_times = defaultdict(Histogram)
         # Time to perform an action
-        self.action_execution_times = []
+        self.action_execution_times = Histogram()
         # Time for waiting a client connection
-        self.message_wait_times = []
+        self.message_wait_times = Histogram()
         # How many times each message type was received. Stored per each msg type
         self.message_counts = defaultdict(int)
         # How many actions were performed. Stored per each action type
         self.action_counts = defaultdict(int)
 
         self.vote_distribution = {'for': 0, 'against': 0}
-        
+        # Times a message found the worker pool queue full (its stream is paused)
+        self.rejected_messages = 0
+        # Largest number of tasks waiting for a free worker
+        self.max_queue_depth = 0
+        # Frames and bytes written to peers. Stored per each msg type
+        self.messages_sent = defaultdict(int)
+        self.bytes_sent = defaultdict(int)
+        # Multi-poll mode: polls started here, decisions made here and own
+        # polls that ran out of time
+        self.polls_started = 0
+        self.decisions = {'accepted': 0, 'rejected': 0}
+        self.polls_expired = 0
+        # Time from poll creation to the decision
+        self.decision_times = Histogram()
+        # Failure detector: robots found down or back up, and the time from a
+        # robot's last answered heartbeat to it being found down
+        self.failures_detected = 0
+        self.recoveries = 0
+        self.detection_times = Histogram()
+        # Received messages looked up in the dedup cache: hits are duplicates
+        # that were dropped
+        self.dedup = {'hits': 0, 'misses': 0}
+
+    def merge(self, other):
+        """Add the metrics of another shard to this one."""
+        for k, v in other.message_propagation_times.items():
+            self.message_propagation_times[k].merge(v)
+        for k, v in other.voting_times.items():
+            self.voting_times[k].merge(v)
+        self.action_execution_times.merge(other.action_execution_times)
+        self.message_wait_times.merge(other.message_wait_times)
+        for k, v in other.message_counts.items():
+            self.message_counts[k] += v
+        for k, v in other.action_counts.items():
+            self.action_counts[k] += v
+        for k, v in other.vote_distribution.items():
+            self.vote_distribution[k] += v
+        self.rejected_messages += other.rejected_messages
+        self.max_queue_depth = max(self.max_queue_depth, other.max_queue_depth)
+        for k, v in other.messages_sent.items():
+            self.messages_sent[k] += v
+        for k, v in other.bytes_sent.items():
+            self.bytes_sent[k] += v
+        self.polls_started += other.polls_started
+        for k, v in other.decisions.items():
+            self.decisions[k] += v
+        self.polls_expired += other.polls_expired
+        self.decision_times.merge(other.decision_times)
+        self.failures_detected += other.failures_detected
+        self.recoveries += other.recoveries
+        self.detection_times.merge(other.detection_times)
+        for k, v in other.dedup.items():
+            self.dedup[k] += v
+        return self
+
+class _ThreadExit:
+    """Kept in a thread's local storage, which is freed when the thread exits."""
+
+class RobotMetrics:
+    """
+    Stores runtime metrics of each robot.
+    Every thread records into its own shard; the shards are only merged
+    when a snapshot is taken, so recording never waits on other threads.
+    The shard of a thread is folded into the retired metrics when the
+    thread exits, so short-lived threads do not keep theirs around.
+    """
+
+    def __init__(self, robot_id):
+        self.robot_id = robot_id
+        self.start_time = time.time()
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        # Metrics of threads that have exited, folded together
+        self._retired = MetricsShard()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = MetricsShard(threading.current_thread())
+            self._local.shard = shard
+            self._local.exit = _ThreadExit()
+            weakref.finalize(self._local.exit, self._retire, shard).atexit = False
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _retire(self, shard):
+        """Fold the shard of a thread that has exited into the retired metrics."""
+        with self._shards_lock:
+            # snapshot() may have retired it already
+            if any(s is shard for s in self._shards):
+                self._shards = [s for s in self._shards if s is not shard]
+                self._retired.merge(shard)
+
     def record_propagation_time(self, message_type, time_taken):
-        self.message_propagation_times[message_type].append(time_taken)
-            
+        shard = self._shard()
+        with shard.lock:
+            shard.message_propagation_times[message_type].record(time_taken)
+
     def record_voting_time(self, topic, time_taken):
-        self.voting_times[topic].append(time_taken)
-            
+        shard = self._shard()
+        with shard.lock:
+            shard.voting_times[topic].record(time_taken)
+
     def record_action_time(self, time_taken):
-        self.action_execution_times.append(time_taken)
-            
+        shard = self._shard()
+        with shard.lock:
+            shard.action_execution_times.record(time_taken)
+
     def record_wait_time(self, time_taken):
-        self.message_wait_times.append(time_taken)
-            
+        shard = self._shard()
+        with shard.lock:
+            shard.message_wait_times.record(time_taken)
+
     def increment_message_count(self, message_type):
-        self.message_counts[message_type] += 1
-            
+        shard = self._shard()
+        with shard.lock:
+            shard.message_counts[message_type] += 1
+
     def increment_action_count(self, action_type):
-        self.action_counts[action_type] += 1
-            
+        shard = self._shard()
+        with shard.lock:
+            shard.action_counts[action_type] += 1
+
     def record_vote(self, is_vote_for):
-        if is_vote_for:
-            self.vote_distribution['for'] += 1
-        else:
-            self.vote_distribution['against'] += 1
-                
+        shard = self._shard()
+        with shard.lock:
+            shard.vote_distribution['for' if is_vote_for else 'against'] += 1
+
+    def record_rejected_message(self):
+        shard = self._shard()
+        with shard.lock:
+            shard.rejected_messages += 1
+
+    def record_queue_depth(self, depth):
+        shard = self._shard()
+        with shard.lock:
+            shard.max_queue_depth = max(shard.max_queue_depth, depth)
+
+    def record_sent(self, message_type, size):
+        shard = self._shard()
+        with shard.lock:
+            shard.messages_sent[message_type] += 1
+            shard.bytes_sent[message_type] += size
+
+    def record_poll_started(self):
+        shard = self._shard()
+        with shard.lock:
+            shard.polls_started += 1
+
+    def record_decision(self, accepted, time_taken):
+        shard = self._shard()
+        with shard.lock:
+            shard.decisions['accepted' if accepted else 'rejected'] += 1
+            shard.decision_times.record(time_taken)
+
+    def record_poll_expired(self):
+        shard = self._shard()
+        with shard.lock:
+            shard.polls_expired += 1
+
+    def record_failure_detected(self, time_taken):
+        shard = self._shard()
+        with shard.lock:
+            shard.failures_detected += 1
+            shard.detection_times.record(time_taken)
+
+    def record_recovery(self):
+        shard = self._shard()
+        with shard.lock:
+            shard.recoveries += 1
+
+    def record_dedup(self, hit):
+        shard = self._shard()
+        with shard.lock:
+            shard.dedup['hits' if hit else 'misses'] += 1
+
+    def snapshot(self):
+        """Merge all shards into one. Shards of finished threads are retired."""
+        with self._shards_lock:
+            live = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                else:
+                    # Its thread is gone, so nobody writes to it any more
+                    self._retired.merge(shard)
+            self._shards = live
+            total = MetricsShard().merge(self._retired)
+        for shard in live:
+            with shard.lock:
+                total.merge(shard)
+        return total
+
     def get_metrics(self):
+        m = self.snapshot()
         metrics = {
             'robot_id': self.robot_id,
             'timestamp': datetime.now().isoformat(),
             'message_propagation': {
-                'average': {k: statistics.mean(v) for k, v in self.message_propagation_times.items() if v},
-                'counts': dict(self.message_counts)
+                'average': {k: v.mean() for k, v in m.message_propagation_times.items() if v.count},
+                'percentiles': {k: v.summary() for k, v in m.message_propagation_times.items() if v.count},
+                'counts': dict(m.message_counts)
             },
             'voting': {
-                'average_time': {k: statistics.mean(v) for k, v in self.voting_times.items() if v},
-                'distribution': dict(self.vote_distribution)
+                'average_time': {k: v.mean() for k, v in m.voting_times.items() if v.count},
+                'percentiles': {k: v.summary() for k, v in m.voting_times.items() if v.count},
+                'distribution': dict(m.vote_distribution)
             },
             'actions': {
-                'average_time': statistics.mean(self.action_execution_times) if self.action_execution_times else 0,
-                'counts': dict(self.action_counts)
+                'average_time': m.action_execution_times.mean(),
+                'percentiles': m.action_execution_times.summary(),
+                'counts': dict(m.action_counts)
             },
             'client_wait_times': {
-                'average': statistics.mean(self.message_wait_times) if self.message_wait_times else 0
+                'average': m.message_wait_times.mean(),
+                'percentiles': m.message_wait_times.summary()
+            },
+            'dispatch': {
+                'rejected_messages': m.rejected_messages,
+                'max_queue_depth': m.max_queue_depth
+            },
+            'polls': {
+                'started': m.polls_started,
+                'decisions': dict(m.decisions),
+                'expired': m.polls_expired,
+                'decisions_per_second': sum(m.decisions.values()) / max(time.time() - self.start_time, 1e-9),
+                'decision_time': m.decision_times.summary()
+            },
+            'traffic': {
+                'messages_sent': dict(m.messages_sent),
+                'bytes_sent': dict(m.bytes_sent)
+            },
+            'failure_detector': {
+                'failures_detected': m.failures_detected,
+                'recoveries': m.recoveries,
+                'detection_time': m.detection_times.summary()
             },
+            'dedup': dict(m.dedup),
         }
         return metrics
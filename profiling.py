@@ -0,0 +1,207 @@
+import cProfile
+from collections import Counter
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+
+# Where a robot spends its time and memory. Two CPU modes:
+#
+#   cpu     deterministic, every call in every thread (cProfile). Exact call
+#           counts, but slows a robot down noticeably.
+#   sample  a background thread looks at the stacks of all threads every
+#           `interval` seconds. Cheap enough to leave on for long runs.
+#
+# Allocation tracking (tracemalloc) can be added to either, or used alone.
+# dump() writes what was collected so far into robot_profiles/, so it can be
+# called at shutdown and on demand (SIGUSR1) while the robot keeps running.
+
+
+def get_profile_dir():
+    profile_dir = "robot_profiles"
+    os.makedirs(profile_dir, exist_ok=True)
+    return profile_dir
+
+
+class _Stats:
+    """What pstats.Stats needs from a profile, without disabling it."""
+
+    def __init__(self, profile):
+        profile.snapshot_stats()
+        self.stats = profile.stats
+
+    def create_stats(self):
+        pass
+
+
+class _ThreadExit:
+    """Kept in a thread's local storage, which is freed when the thread exits."""
+
+
+class Profiler:
+    """
+    Profiles one robot from start() on: `mode` is "cpu", "sample" or None,
+    `memory` adds tracemalloc with `frames` frames per allocation. Dumps
+    list the `top` entries.
+    """
+
+    def __init__(self, robot_id, mode=None, memory=False, interval=0.005, frames=10, top=40):
+        self.robot_id = robot_id
+        self.mode = mode
+        self.memory = memory
+        self.interval = interval
+        self.frames = frames
+        self.top = top
+        self.profiles = []
+        # Before 3.12 every thread has its own profile; the profiles of
+        # threads that have exited are merged here and released
+        self.local = threading.local()
+        self.retired = None
+        self.threads_profiled = 0
+        self.samples = Counter()
+        self.sample_count = 0
+        self.snapshot = None
+        self.snapshots = 0
+        self.started = None
+        self.stop_event = threading.Event()
+        self.lock = threading.RLock()
+
+    def start(self):
+        self.started = time.time()
+        if self.memory:
+            tracemalloc.start(self.frames)
+        if self.mode == "cpu":
+            if sys.version_info >= (3, 12):
+                # cProfile uses sys.monitoring here, which sees every thread
+                self._enable()
+            else:
+                # A profile only sees the thread that enabled it: one per thread
+                threading.setprofile(self._thread_started)
+                self._enable()
+        elif self.mode == "sample":
+            threading.Thread(target=self._sample, name="profiler", daemon=True).start()
+        return self
+
+    def _enable(self):
+        profile = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(profile)
+            self.threads_profiled += 1
+        if sys.version_info < (3, 12):
+            self.local.exit = _ThreadExit()
+            weakref.finalize(self.local.exit, self._retire, profile).atexit = False
+        profile.enable()
+
+    def _retire(self, profile):
+        """Merge the profile of a thread that has exited into the retired stats."""
+        with self.lock:
+            if self.retired is None:
+                self.retired = pstats.Stats(_Stats(profile))
+            else:
+                self.retired.add(_Stats(profile))
+            self.profiles = [p for p in self.profiles if p is not profile]
+
+    def _thread_started(self, frame, event, arg):
+        # Called once on the first event of a new thread; enable() replaces it
+        self._enable()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.mode == "cpu":
+            threading.setprofile(None)
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                self.samples[tuple(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def dump(self, label="final"):
+        """Write the profiles collected so far. Returns the paths written."""
+        with self.lock:
+            prefix = os.path.join(get_profile_dir(), f"robot_{self.robot_id}_{label}")
+            paths = []
+            if self.mode == "cpu" and (self.profiles or self.retired is not None):
+                paths.extend(self._dump_cpu(prefix))
+            elif self.mode == "sample":
+                paths.extend(self._dump_samples(prefix))
+            if self.memory:
+                paths.append(self._dump_memory(prefix))
+            return paths
+
+    def snapshot_dump(self):
+        """An on-demand dump while the robot keeps running."""
+        with self.lock:
+            self.snapshots += 1
+            label = f"snapshot{self.snapshots}"
+        return self.dump(label)
+
+    def _dump_cpu(self, prefix):
+        stats = pstats.Stats()
+        if self.retired is not None:
+            stats.add(self.retired)
+        for profile in self.profiles:
+            stats.add(_Stats(profile))
+        stats.dump_stats(f"{prefix}.prof")
+
+        summary = io.StringIO()
+        stats.stream = summary
+        summary.write(f"Robot {self.robot_id}: {self.threads_profiled} threads profiled "
+                      f"over {time.time() - self.started:.2f}s\n")
+        stats.sort_stats("cumulative").print_stats(self.top)
+        stats.sort_stats("tottime").print_stats(self.top)
+        with open(f"{prefix}_cpu.txt", "w") as f:
+            f.write(summary.getvalue())
+        return [f"{prefix}.prof", f"{prefix}_cpu.txt"]
+
+    def _dump_samples(self, prefix):
+        samples = dict(self.samples)
+        own = Counter()
+        with open(f"{prefix}_samples.folded", "w") as f:
+            # One line per distinct stack, for flamegraph.pl / speedscope
+            for stack, count in samples.items():
+                f.write(";".join(_frame_name(code) for code in stack) + f" {count}\n")
+                if stack:
+                    own[stack[-1]] += count
+
+        total = sum(samples.values()) or 1
+        with open(f"{prefix}_samples.txt", "w") as f:
+            f.write(f"Robot {self.robot_id}: {self.sample_count} samples every {self.interval}s "
+                    f"over {time.time() - self.started:.2f}s\n")
+            f.write(f"{'samples':>8} {'share':>7}  function (where the thread was)\n")
+            for code, count in own.most_common(self.top):
+                f.write(f"{count:>8} {count / total:>7.1%}  {_frame_name(code)}\n")
+        return [f"{prefix}_samples.folded", f"{prefix}_samples.txt"]
+
+    def _dump_memory(self, prefix):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        with open(f"{prefix}_memory.txt", "w") as f:
+            f.write(f"Robot {self.robot_id}: {current / 1024:.1f} KiB allocated, peak {peak / 1024:.1f} KiB\n\n")
+            f.write(f"Top {self.top} allocation sites:\n")
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                f.write(f"{stat}\n")
+            if self.snapshot is not None:
+                f.write(f"\nTop {self.top} changes since the last dump:\n")
+                for stat in snapshot.compare_to(self.snapshot, "lineno")[:self.top]:
+                    f.write(f"{stat}\n")
+        self.snapshot = snapshot
+        return f"{prefix}_memory.txt"
+
+
+def _frame_name(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
@@ -1,21 +1,41 @@
+import asyncio
+import itertools
 import socket
+import selectors
+import signal
 import threading
 import time
 from datetime import datetime
 import argparse
 import json
+import os
 from pprint import pprint
 from enum import Enum
 import random
+from collections import deque
 
 # Import custom metrics tracking module
-from metrics import get_common_log_file, get_log_file, get_metrics_file, RobotMetrics
+from metrics import get_common_log_file, get_log_file, get_metrics_file, get_snapshot_file, RobotMetrics
+from connections import (AsyncConnectionPool, ConnectionPool, answer_hello, decode_message, encode_message,
+                         listen_unix, unix_paths)
+from broadcast import broadcast
+from dedup import DedupCache
+from exporter import MetricsServer, SnapshotWriter
+from failure_detector import FailureDetector
+from membership import Membership
+from tracing import NullTracer, Tracer, get_trace_file
+from profiling import Profiler
+from journal import Journal, NullJournal, get_journal_file
+from framing import FrameDecoder, read_frame
+from logger import AsyncLogger, DEBUG, ERROR, INFO, LEVELS, WARNING
+from workers import Strand, WorkerPool
 
 # Global variables that will be initialized in main():
 COMMON_LOG_FILE: str  # Path to shared log file for all robots
 LOG_FILE: str         # Path to individual log file for this robot
 METRICS_FILE: str     # Path to file storing this robot's performance metrics
 metrics: RobotMetrics # Metrics tracker instance
+logger: AsyncLogger   # Background writer for both log files
 
 CONSENSUS_TIMEOUT = 30.0
 start_time_shutdown = None
@@ -24,6 +44,103 @@ shutdown_flag = False
 
 all_vote_against = False
 
+# How a poll decides (--ballot): "yes_no" on one random topic, or a single
+# pass in which every robot ranks all topics, counted by "plurality" or "borda"
+BALLOT = "yes_no"
+
+# Multi-poll mode (--multi_poll): every poll carries an id and its own
+# deadline, several polls circulate at once and the swarm keeps running
+# after each decision instead of shutting down.
+multi_poll = False
+POLL_TIMEOUT = 30.0
+# Polls this robot has seen and not yet seen finish:
+# {poll_id: {"initiator_id": int, "topic": int, "deadline": float}}
+polls = {}
+polls_lock = threading.Lock()
+poll_counter = itertools.count(1)
+
+# Tree overlay (--overlay tree): polls fan out down a k-ary spanning tree
+# of the ring and tallies are combined on the way back to the initiator,
+# so a decision takes O(log N) hops instead of a lap of the ring.
+overlay = "ring"
+TREE_FANOUT = 4
+# Seconds the initiator waits for all tallies before re-running the poll on the ring
+TREE_TIMEOUT = 5.0
+# Tree polls this robot takes part in: {poll_key: state} (see start_tree_poll)
+tree_votes = {}
+tree_lock = threading.Lock()
+
+# How often blocking socket calls wake up to check the shutdown flags
+POLL_INTERVAL = 0.5
+# How often streams paused on a full worker pool try to queue their messages again
+PAUSE_INTERVAL = 0.01
+
+# Time a physical action takes, in seconds
+ACTION_DURATION = 2.0
+
+# Actions run on a dedicated worker so the action message is passed on
+# right away; with --serial_actions they are performed before forwarding.
+# Each robot acknowledges a finished action to the robot that decided on it.
+action_executor = None  # WorkerPool with one worker (threads runtime)
+action_queue = None     # asyncio.Queue feeding async_action_executor (asyncio runtime)
+# Actions decided by this robot that not every robot has finished yet:
+# {key: {"topic": int, "poll_id": str or None, "acked": set, "start_time": float,
+#        "expected": acks to wait for, known once the action message has returned}
+pending_actions = {}
+actions_lock = threading.Lock()
+# Seconds the deciding robot waits for the last acks once the action message
+# has returned; robots that crashed while acting never send theirs
+ACK_TIMEOUT = 10.0
+
+# Time source for the protocol logic. The simulator replaces it with its
+# virtual clock.
+clock = time.time
+
+# Long-lived streams to successors, reused for every outgoing message
+connection_pool = ConnectionPool()
+
+# Ids of the messages this robot sends ([robot id, n]) and of the ones it has
+# handled, so that a message resent after a failover is handled only once
+message_ids = itertools.count(1)
+dedup_cache = DedupCache()
+
+# Streams used by the asyncio runtime instead of connection_pool
+async_connection_pool = AsyncConnectionPool()
+
+# Bounded pool of message handlers (None = one thread per connection)
+worker_pool = None
+
+# Periodic JSON-lines metrics writer (None unless --metrics_interval is set)
+snapshot_writer = None
+
+# Heartbeats to the next WATCHED_ROBOTS robots on the ring (None unless
+# --heartbeat_interval is set). Failover reads its liveness table instead of
+# pinging robots one at a time.
+failure_detector = None
+WATCHED_ROBOTS = 3
+# Heartbeats use their own streams, without connect retries, so a probe of a
+# dead robot fails fast and never holds up a message to the same robot
+heartbeat_pool = ConnectionPool(connect_retries=0)
+
+# Unix domain socket this robot listens on besides TCP ("path" in the setup
+# file). Robots on the same host connect to it instead of the TCP port.
+unix_path = None
+
+# Spans of the messages this robot handles (--trace); written to
+# robot_traces/ at shutdown
+tracer = NullTracer()
+
+# CPU and allocation profiles of this robot (None unless --profile or
+# --profile_memory is set); written to robot_profiles/ at shutdown and on SIGUSR1
+profiler = None
+
+# Every message this robot receives and sends (--journal); replayed with journal.py
+journal = NullJournal()
+
+# Shutdown messages go to all robots at once: at most
+# BROADCAST_CONCURRENCY sends in flight, all done within BROADCAST_DEADLINE seconds
+BROADCAST_CONCURRENCY = 8
+BROADCAST_DEADLINE = 5.0
 
 # Lists to keep track of active threads:
 client_threads = []  # Threads handling incoming client connections
@@ -32,6 +149,10 @@ server_threads = []  # Threads making outgoing server connections
 # Dictionary storing information about all robots in the network:
 # Format: {robot_id: {"host": str, "port": int, "successor": int}}
 robots = {}
+# Versioned changes to `robots` (see membership.py). Ring repairs are
+# recorded as deltas and piggybacked on the poll and action messages.
+membership: Membership
+PIGGYBACK_TYPES = ('poll', 'action')
 
 # Predefined topics/actions that robots can vote on:
 topics = {
@@ -50,31 +171,45 @@ class Topics(Enum):
     MOVE_RIGHT = 4
     LOOK_CUTE = 5
 
-def server_loop(socket, robot_id):
+def server_loop(listeners, robot_id):
     """
-    Main server loop that continuously accepts incoming connections.
-    Each connection is handled in a separate thread.
+    Main server loop that continuously accepts incoming connections on
+    the listening sockets (TCP, and the Unix socket if the robot has one).
+    Each connection is handled in a separate thread. Connections are
+    long-lived (peers reuse them), so handlers are not joined here.
     """
     global timeout_flag, time_start_shutdown
+    if worker_pool is not None:
+        return pooled_server_loop(listeners, robot_id)
+    selector = selectors.DefaultSelector()
     try:
-        with socket:
-            while not timeout_flag and not shutdown_flag:
-                if start_time_shutdown and (time.time() - start_time_shutdown) > CONSENSUS_TIMEOUT:
-                    log_message(f"Robot{robot_id} : Timeout reached in server loop")
-                    perform_graceful_shutdown(robot_id)
-                # Measure wait time for metrics
-                start_time = time.time()
-                
+        for listener in listeners:
+            listener.setblocking(False)
+            selector.register(listener, selectors.EVENT_READ)
+        # Measure wait time for metrics
+        start_time = time.time()
+        while not timeout_flag and not shutdown_flag:
+            if start_time_shutdown and (time.time() - start_time_shutdown) > CONSENSUS_TIMEOUT:
+                log_message(f"Robot{robot_id} : Timeout reached in server loop", WARNING)
+                perform_graceful_shutdown(robot_id)
+
+            # Wake up periodically to check the shutdown and timeout flags
+            for key, _ in selector.select(timeout=POLL_INTERVAL):
                 # Accept incoming connection
-                client_socket, addr = socket.accept()
-                
+                try:
+                    client_socket, addr = key.fileobj.accept()
+                except BlockingIOError:
+                    continue
+                client_socket.setblocking(True)
+
                 # Record connection wait time
                 end_time = time.time()
                 metrics.record_wait_time(end_time - start_time)
-                
+                start_time = end_time
+
                 # Log the new connection
-                log_message(f"Robot{robot_id} : Accepted connection from {':'.join(map(str, addr))}.")
-                
+                log_message(f"Robot{robot_id} : Accepted connection from {peer_name(addr)}.", DEBUG)
+
                 # Create and start a thread to handle the client
                 client_thread = threading.Thread(
                     target=handle_client,
@@ -82,32 +217,144 @@ def server_loop(socket, robot_id):
                 )
                 client_threads.append(client_thread)
                 client_thread.start()
-                client_thread.join()
-            socket.close()
     except KeyboardInterrupt:
         return
     except Exception as e:
-        log_message(f"Robot{robot_id} : Error in server loop: {e}")
+        log_message(f"Robot{robot_id} : Error in server loop: {e}", ERROR)
+        exit(1)
+    finally:
+        selector.close()
+        for listener in listeners:
+            listener.close()
+
+def peer_name(addr):
+    """host:port of a TCP peer; Unix socket peers have no address."""
+    return ':'.join(map(str, addr)) if addr else "unix socket"
+
+def pooled_server_loop(listeners, robot_id):
+    """
+    Server loop for the worker pool mode.
+    A selector watches the listening sockets and every open stream; complete
+    messages are queued on the bounded worker pool, one strand per stream so
+    each peer's messages stay in order. The loop never runs a handler itself,
+    so a slow action cannot hold up pings or shutdowns.
+    When the pool is full the stream is no longer read until its messages
+    fit, so TCP holds back the sender instead of messages being dropped.
+    A stream that sends an undecodable frame is closed.
+    """
+    selector = selectors.DefaultSelector()
+    # Streams not read from while the pool is full: socket -> (decoder, strand, peer, messages to queue)
+    paused = {}
+
+    def close(client_socket):
+        selector.unregister(client_socket)
+        client_socket.close()
+
+    def queue_messages(client_socket, decoder, strand, peer, messages):
+        """Queue messages on the stream's strand; pause the stream if the pool is full."""
+        while messages:
+            if not strand.submit(handle_message, messages[0], robot_id):
+                metrics.record_rejected_message()
+                if client_socket not in paused:
+                    log_message(f"Robot{robot_id} : Worker pool is full, stopped reading from {peer} " \
+                                f"with {len(messages)} messages waiting.", WARNING)
+                    selector.unregister(client_socket)
+                paused[client_socket] = (decoder, strand, peer, messages)
+                return
+            metrics.record_queue_depth(worker_pool.pending())
+            messages.popleft()
+        if paused.pop(client_socket, None) is not None:
+            log_message(f"Robot{robot_id} : Worker pool has room, reading from {peer} again.")
+            selector.register(client_socket, selectors.EVENT_READ, (decoder, strand, peer))
+
+    try:
+        for listener in listeners:
+            listener.setblocking(False)
+            selector.register(listener, selectors.EVENT_READ)
+        # Measure wait time for metrics
+        start_time = time.time()
+        while not timeout_flag and not shutdown_flag:
+            if start_time_shutdown and (time.time() - start_time_shutdown) > CONSENSUS_TIMEOUT:
+                log_message(f"Robot{robot_id} : Timeout reached in server loop", WARNING)
+                perform_graceful_shutdown(robot_id)
+
+            for client_socket, (decoder, strand, peer, messages) in list(paused.items()):
+                queue_messages(client_socket, decoder, strand, peer, messages)
+
+            for key, _ in selector.select(timeout=PAUSE_INTERVAL if paused else POLL_INTERVAL):
+                if key.fileobj in listeners:
+                    client_socket, addr = key.fileobj.accept()
+                    end_time = time.time()
+                    metrics.record_wait_time(end_time - start_time)
+                    start_time = end_time
+                    log_message(f"Robot{robot_id} : Accepted connection from {peer_name(addr)}.", DEBUG)
+                    client_socket.setblocking(False)
+                    selector.register(client_socket, selectors.EVENT_READ,
+                                      (FrameDecoder(), Strand(worker_pool), peer_name(addr)))
+                    continue
+
+                client_socket = key.fileobj
+                decoder, strand, peer = key.data
+                try:
+                    received = decoder.recv_into(client_socket)
+                    payloads = list(decoder.frames())
+                except BlockingIOError:
+                    continue
+                except (OSError, ValueError):
+                    received = 0
+                if not received:
+                    close(client_socket)
+                    continue
+
+                messages = deque()
+                try:
+                    for payload in payloads:
+                        decode_start = time.time_ns()
+                        message = decode_message(payload)
+                        if message['type'] == 'hello':
+                            # Codec offer on a new stream: answer right away
+                            client_socket.sendall(encode_message(answer_hello(message, connection_pool.codecs)))
+                            continue
+                        tracer.record("decode", decode_start, message.get('trace'), type=message['type'])
+                        message = deduplicate(message, robot_id)
+                        if message is not None:
+                            messages.append(message)
+                except Exception as e:
+                    # A bad frame from one peer must not stop the robot
+                    log_message(f"Robot{robot_id} : Closed the connection from {peer}: " \
+                                f"could not handle a message: {e!r}", WARNING)
+                    close(client_socket)
+                    continue
+                queue_messages(client_socket, decoder, strand, peer, messages)
+    except KeyboardInterrupt:
+        return
+    except Exception as e:
+        log_message(f"Robot{robot_id} : Error in server loop: {e}", ERROR)
         exit(1)
+    finally:
+        selector.close()
+        for client_socket in paused:
+            client_socket.close()
+        for listener in listeners:
+            listener.close()
+        # Let queued handlers (e.g. an in-progress shutdown) finish
+        worker_pool.shutdown()
 
-def log_message(message):
+def log_message(message, level=INFO):
     """
     Log a message to both console and log files.
     Writes to:
     - Individual robot log file
     - Common log file shared by all robots
     - Console output
+    The line is only queued here; the logger thread writes it in a batch.
+    Per-hop chatter is logged at DEBUG so it can be silenced with --log_level.
     """
-    log_line = f"[{datetime.now().isoformat()}] {message}\n"
-    print(log_line, end="")
+    logger.log(message, level)
 
-    # Append to individual log file
-    with open(LOG_FILE, "a") as log_file:
-        log_file.write(log_line)
-    
-    # Append to common log file
-    with open(COMMON_LOG_FILE, "a") as log_file:
-        log_file.write(log_line)
+def poll_label(poll_id):
+    """Suffix for log lines about a poll, so analyze_logs.py can tell concurrent polls apart."""
+    return f" (poll {poll_id})" if poll_id is not None else ""
 
 def log_metrics():
     """Record current metrics to the metrics file with a timestamp."""
@@ -116,6 +363,8 @@ def log_metrics():
         metrics_file.write(f"\n==== Metrics at {datetime.now().isoformat()} ====\n")
         pprint(metrics_data, metrics_file)
         metrics_file.write("\n")
+    if snapshot_writer is not None:
+        snapshot_writer.write()
 
 def perform_action(action, robot_id):
     """
@@ -125,11 +374,15 @@ def perform_action(action, robot_id):
     - Action-specific logging
     - Metrics recording
     """
-    start_time = time.time()
+    start_time = clock()
 
     # Simulate action taking time
-    time.sleep(2)
+    time.sleep(ACTION_DURATION)
+
+    complete_action(action, robot_id, start_time)
 
+def complete_action(action, robot_id, start_time):
+    """Log and record an action once its execution time has passed."""
     # Log specific action being performed
     if action == Topics.MOVE_UP:
         log_message(f"Robot{robot_id} : Moving Up.")
@@ -145,103 +398,194 @@ def perform_action(action, robot_id):
         log_message(f"Robot{robot_id} : Unknown action '{action}'.")
 
     # Record metrics about this action
-    action_time = time.time() - start_time
+    action_time = clock() - start_time
     metrics.record_action_time(action_time)
     metrics.increment_action_count(action.name)
     log_message(f"Robot{robot_id} : Action '{action.name}' completed in {action_time:.2f} seconds.")
 
 def ping(sender_id, receiver_id) -> bool:
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        try:
-            s.connect((robots[receiver_id]["host"], robots[receiver_id]["port"]))
-            ping_msg = {
-                "type": "ping",
-                "sender_id": sender_id,
-                "message": f"Ping from robot {sender_id} to robot {receiver_id}."
-            }
-            s.sendall(json.dumps(ping_msg).encode('utf-8'))
-            log_message(f"Robot{sender_id} : Pinged robot {receiver_id}.")
-            return True
-        except socket.error as e:
-            log_message(f"Robot{sender_id} : Failed to ping robot {receiver_id}: {e}")
-            return False
-        
-def handle_update_message(message, robot_id):
     """
-    Handle an update message from another robot.
-    Updates the successor information and logs the change.
+    Check that a robot is reachable.
+    The ping goes through the connection pool, so a successful probe leaves
+    an open stream behind for the new successor to reuse.
     """
-    global robots
-    new_successor = message['successor']
-    initiator_id = message['initiator_id']
-    faulty_robots = message['faulty_robots']
-
-    # Update the successor information
-    robots[initiator_id]["successor"] = new_successor
-    
-    # Remove faulty robots from the network
-    for faulty_robot in faulty_robots:
-        if faulty_robot in robots:
-            robots.pop(faulty_robot)
-
-    new_message = {
-        "type": "update",
-        "initiator_id": initiator_id,
-        "sender_id": robot_id,
-        "message": f"Robot {robot_id} has a new successor {new_successor}.",
-        "successor": new_successor,
-        "faulty_robots": faulty_robots
+    ping_msg = {
+        "type": "ping",
+        "sender_id": sender_id,
+        "message": f"Ping from robot {sender_id} to robot {receiver_id}."
     }
-    
-    log_message(f"Robot{robot_id} : Updated network as per message from robot {message['sender_id']}.")
-
-    return new_message
+    try:
+        with tracer.span("send ping") as span:
+            connection_pool.send(robots[receiver_id]["host"], robots[receiver_id]["port"], tracer.inject(ping_msg, span))
+        log_message(f"Robot{sender_id} : Pinged robot {receiver_id}.", DEBUG)
+        return True
+    except socket.error as e:
+        log_message(f"Robot{sender_id} : Failed to ping robot {receiver_id}: {e}", WARNING)
+        return False
+
+def heartbeat(sender_id, receiver_id) -> bool:
+    """Probe used by the failure detector: a ping that only logs at DEBUG level."""
+    info = robots.get(receiver_id)
+    if info is None:
+        return False
+    heartbeat_msg = {
+        "type": "ping",
+        "sender_id": sender_id,
+        "message": f"Heartbeat from robot {sender_id}."
+    }
+    try:
+        heartbeat_pool.send(info["host"], info["port"], heartbeat_msg)
+        return True
+    except socket.error as e:
+        log_message(f"Robot{sender_id} : Heartbeat to robot {receiver_id} failed: {e}", DEBUG)
+        return False
+
+def successors(robot_id, count):
+    """The next `count` robots after robot_id on the ring, nearest first."""
+    result = []
+    rid = robots.get(robot_id, {}).get("successor")
+    while rid in robots and rid != robot_id and rid not in result and len(result) < count:
+        result.append(rid)
+        rid = robots.get(rid, {}).get("successor")
+    return result
+
+def liveness_changed(robot_id, rid, alive, detection_time):
+    """Failure detector callback."""
+    if alive:
+        metrics.record_recovery()
+        log_message(f"Robot{robot_id} : Robot {rid} answers heartbeats again.")
+    else:
+        metrics.record_failure_detected(detection_time)
+        log_message(f"Robot{robot_id} : Robot {rid} is down (last heartbeat answered " \
+                    f"{detection_time:.2f} seconds ago).", WARNING)
 
-def find_new_successor(robot_id):
-    global shutdown_flag
-    global robots
+def select_new_successor(robot_id, is_alive):
+    """
+    Walk the ring past the unreachable successor until a live robot is found.
+    `is_alive(rid)` probes one robot. Returns the new successor (robot_id
+    itself if nobody else is alive) and the robots found dead on the way.
+    """
     faulty_robots = []
-    new_successor = robots[robots[robot_id]["successor"]]["successor"]
-    
+    old_successor = robots[robot_id]["successor"]
+    new_successor = robots[old_successor]["successor"]
+
     log_message(f"Robot{robot_id} : Looking for new successor starting from {new_successor}...")
 
     while new_successor != robot_id:
-        if ping(robot_id, new_successor):
+        if is_alive(new_successor):
             log_message(f"Robot{robot_id} : Found new successor {new_successor}.")
             robots[robot_id]["successor"] = new_successor
             break
         else:
             faulty_robots.append(new_successor)
-            log_message(f"Robot{robot_id} : No response from robot {new_successor}.")
+            log_message(f"Robot{robot_id} : No response from robot {new_successor}.", WARNING)
             new_successor = robots[new_successor]["successor"]
 
+    return new_successor, faulty_robots
+
+def record_repair(robot_id, old_successor, new_successor, faulty_robots):
+    """
+    Record a ring repair as a membership delta: the unreachable successor and
+    the robots found dead after it leave the ring. The delta reaches the new
+    successor on the message that could not be sent, and the rest of the
+    ring on the polls and actions after it.
+    """
+    removed = [old_successor] + faulty_robots
+    delta = membership.record(successors=[(robot_id, new_successor)], removed=removed)
+    journal.repaired(old_successor, new_successor, faulty_robots)
+    log_message(f"Robot{robot_id} : Ring repaired at epoch {delta['epoch'][0]}: " \
+                f"new successor {new_successor}, removed {removed}.")
+    return delta
+
+def with_membership(message, successor_id):
+    """Piggyback the membership deltas the successor has not seen on a poll or action message."""
+    if message['type'] not in PIGGYBACK_TYPES or membership.epoch == (0, 0):
+        return message
+    message = message.copy()
+    message['membership'] = membership.outgoing(successor_id)
+    return message
+
+def with_message_id(message, robot_id):
+    """
+    Give a message about to be sent an id, unless it has one: messages passed
+    on keep the id they arrived with, and so does a message resent to a new
+    successor after a failover.
+    """
+    if 'msg_id' in message:
+        return message
+    return dict(message, msg_id=[robot_id, next(message_ids)])
+
+def deduplicate(message, robot_id):
+    """
+    Look up the id of a received message in the dedup cache. Returns None for
+    a message already handled, else the message to handle. Messages without
+    an id (pings) are always handled.
+    """
+    msg_id = message.get('msg_id')
+    if msg_id is None:
+        return message
+    duplicate = dedup_cache.seen((msg_id[0], msg_id[1], message['type']))
+    metrics.record_dedup(duplicate)
+    if duplicate:
+        log_message(f"Robot{robot_id} : Dropped duplicate {message['type']} message {msg_id[0]}.{msg_id[1]} " \
+                    f"from robot {message['sender_id']}.", WARNING)
+        return None
+    if msg_id[0] == robot_id:
+        # Our own message came all the way round the ring: passing it on
+        # starts a new lap, which needs a new id
+        message = dict(message)
+        del message['msg_id']
+    return message
+
+def find_new_successor(robot_id):
+    global shutdown_flag
+    global robots
+    old_successor = robots[robot_id]["successor"]
+
+    # The ring changes here: forget the stream to the unreachable successor
+    connection_pool.discard(robots[old_successor]["host"], robots[old_successor]["port"])
+
+    if failure_detector is not None:
+        # Probe the robots after the lost successor in parallel where the
+        # table is stale; the walk below then only reads the table
+        failure_detector.refresh([rid for rid in successors(old_successor, WATCHED_ROBOTS) if rid != robot_id])
+        is_alive = failure_detector.is_alive
+    else:
+        is_alive = lambda rid: ping(robot_id, rid)
+    new_successor, faulty_robots = select_new_successor(robot_id, is_alive)
+
     if new_successor == robot_id:
-        log_message(f"Robot{robot_id} : No successor found. I am alone in this world.")
+        log_message(f"Robot{robot_id} : No successor found. I am alone in this world.", WARNING)
         log_message(f"Robot{robot_id} : Shutting down...")
         shutdown_flag = True
         exit(1)
 
-    for faulty_robot in faulty_robots:
-        robots.pop(faulty_robot)
-    
-    upd_message = {
-        "type": "update",
-        'initiator_id': robot_id,
-        "sender_id": robot_id,
-        "message": f"Robot {robot_id} has a new successor {new_successor}.",
-        "successor": new_successor,
-        "faulty_robots": faulty_robots
-    }
+    for faulty_robot in [old_successor] + faulty_robots:
+        info = robots[faulty_robot]
+        connection_pool.discard(info["host"], info["port"])
+        if failure_detector is not None:
+            failure_detector.forget(faulty_robot)
 
-    upd_message = handle_update_message(upd_message, robot_id)
+    record_repair(robot_id, old_successor, new_successor, faulty_robots)
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        try:
-            s.connect((robots[new_successor]["host"], robots[new_successor]["port"]))
-            s.sendall(json.dumps(upd_message).encode('utf-8'))
-            log_message(f"Robot{robot_id} : Sent update message to new successor {new_successor}.")
-        except socket.error as e:
-            log_message(f"Robot{robot_id} : Failed to send update message to new successor {new_successor}: {e}")
+def send_to_all(robot_id, message):
+    """
+    Send a message to every other robot over the pooled streams, in parallel.
+    Returns {robot_id: None if sent, else the exception}.
+    """
+    addresses = {rid: (info["host"], info["port"]) for rid, info in list(robots.items()) if rid != robot_id}
+    message = with_message_id(message, robot_id)
+
+    def send(rid):
+        with tracer.span(f"send {message['type']}", message.get('trace')) as span:
+            connection_pool.send(*addresses[rid], tracer.inject(message, span))
+        journal.sent(*addresses[rid], message)
+
+    return broadcast(send, addresses, concurrency=BROADCAST_CONCURRENCY, deadline=BROADCAST_DEADLINE)
+
+def dump_profiles(robot_id, snapshot=False):
+    paths = profiler.snapshot_dump() if snapshot else profiler.dump()
+    log_message(f"Robot{robot_id} : Wrote {'profile snapshot' if snapshot else 'profiles'} to {', '.join(paths)}")
 
 def perform_graceful_shutdown(robot_id, send_shutdown_to_others=True):
     global shutdown_flag
@@ -249,37 +593,51 @@ def perform_graceful_shutdown(robot_id, send_shutdown_to_others=True):
 
     shutdown_flag = True
     log_message(f"Robot{robot_id} : Shutting down initiated...")
+    if failure_detector is not None:
+        failure_detector.stop()
 
     if send_shutdown_to_others:
-        shutdown_msg = {
+        shutdown_msg = tracer.stamp({
             "type": "shutdown",
             "sender_id": robot_id
-        }
-        for rid, info in robots.items():
-            if rid != robot_id:
-                try:
-                    sock = socket.create_connection((info["host"], info["port"]), timeout=2)
-                    msg_str = json.dumps(shutdown_msg)
-                    sock.sendall(msg_str.encode('utf-8'))
-                    sock.close()
-                    log_message(f"Robot{robot_id} : Sent shutdown message to robot {rid}")
-                except Exception as e:
-                    log_message(f"Robot{robot_id} : Failed to send shutdown to robot {rid}: {e}")
+        })
+        for rid, error in send_to_all(robot_id, shutdown_msg).items():
+            if error is None:
+                log_message(f"Robot{robot_id} : Sent shutdown message to robot {rid}")
+            else:
+                log_message(f"Robot{robot_id} : Failed to send shutdown to robot {rid}: {error}", WARNING)
 
     '''current_thread = threading.current_thread()
     for thread in client_threads + server_threads:
         if thread.is_alive() and thread != current_thread:
             thread.join(timeout=1.0)'''
 
+    if action_executor is not None:
+        # Let an action in progress finish
+        action_executor.shutdown()
+    connection_pool.close_all()
+    heartbeat_pool.close_all()
     log_metrics()
+    if profiler is not None:
+        dump_profiles(robot_id)
+    journal.close()
     log_message(f"Robot{robot_id} : Gracefully shutted down.")
     exit(0)
 
 def handle_action_message(message, robot_id):
     """
     Prepare an action message for propagation.
-    Adds sender information to the message.
+    Adds sender information to the message and counts this robot among
+    the ones that started the action, so the deciding robot knows how
+    many acknowledgements to wait for.
     """
+    new_message = relay_message(message, robot_id)
+    action = message['action']
+    new_message['action'] = dict(action, started=action.get('started', 0) + 1)
+    return new_message
+
+def relay_message(message, robot_id):
+    """Copy a message to pass it on unchanged, with this robot as the sender."""
     new_message = message.copy()
     host, port = robots[robot_id]["host"], robots[robot_id]["port"]
     new_message['sender_id'] = robot_id
@@ -295,6 +653,7 @@ def handle_vote_message(message, robot_id):
     3. Updates vote counts
     4. Records voting metrics
     """
+    global all_vote_against
     new_message = message.copy()
     host, port = robots[robot_id]["host"], robots[robot_id]["port"]
     new_message['sender_id'] = robot_id
@@ -302,13 +661,23 @@ def handle_vote_message(message, robot_id):
     new_message['sender_port'] = port
 
     topic = Topics(message['poll']['topic'])
-    start_time = time.time()
+    start_time = clock()
+    vote_start = time.time_ns()
 
     # if it is initiator - no voting
     if robot_id == message['poll']['initiator_id']:
         log_message(f"Robot{robot_id} : Initiator already voted for '{topic.name}'.")
+    elif 'ballot' in message['poll']:
+        # Rank every topic at once; robots forced to vote against put the proposed one last
+        ranking = rank_topics(last=topic if all_vote_against else None)
+        points = ballot_points(ranking, message['poll']['ballot'])
+        new_message['poll'] = dict(message['poll'],
+                                   scores=[a + b for a, b in zip(message['poll']['scores'], points)],
+                                   count_for=message['poll']['count_for'] + 1)
+        log_message(f"Robot{robot_id} : Ballot {', '.join(t.name for t in ranking)} " \
+                    f"from robot {message['sender_id']}.")
+        metrics.record_voting_time(topic.name, clock() - start_time)
     else:
-        global all_vote_against
         # tie votes
         if all_vote_against:
             new_message['poll']['count_against'] += 1
@@ -327,55 +696,60 @@ def handle_vote_message(message, robot_id):
                 log_message(f"Robot{robot_id} : Vote against '{topic.name}' from robot {message['sender_id']}.")
 
         # Record voting metrics
-        end_time = time.time()
+        end_time = clock()
         metrics.record_voting_time(topic.name, end_time - start_time)
         metrics.record_vote(is_vote_for)
 
+    tracer.record("vote", vote_start, topic=topic.name)
     return new_message
 
+def seed_random(seed, robot_id):
+    """Make the votes and topics of this robot repeatable (--seed); robots still differ."""
+    random.seed(f"{seed}-{robot_id}")
+
+def rank_topics(last=None):
+    """A random ranking of all topics, optionally with one of them forced last."""
+    ranking = random.sample(list(Topics), len(Topics))
+    if last is not None:
+        ranking.remove(last)
+        ranking.append(last)
+    return ranking
+
+def ballot_points(ranking, ballot):
+    """
+    Points a ranking gives each topic, in Topics order. Plurality gives the
+    first choice one point; Borda gives len(Topics) - 1 points to the first
+    choice down to none for the last.
+    """
+    points = [0] * len(Topics)
+    for place, topic in enumerate(ranking):
+        index = list(Topics).index(topic)
+        if ballot == "plurality":
+            points[index] = 1 if place == 0 else 0
+        else:
+            points[index] = len(Topics) - 1 - place
+    return points
+
 def handle_server(server_host, server_port, robot_id, message):
     """
-    Connect to another robot's server to send a message.
+    Send a message to another robot's server.
     Handles:
-    - Connection establishment
+    - Reuse of the pooled connection to the peer
     - Message serialization and sending
     - Propagation time measurement
     """
     global timeout_flag
-    start_time = time.time()
+    start_time = clock()
+    message = with_message_id(with_membership(message, robots[robot_id]["successor"]), robot_id)
 
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
-            time.sleep(0.5)
-            # Connect to target robot
-            client_socket.connect((server_host, server_port))
-            log_message(f"Robot{robot_id} : Connected to server {server_host}:{server_port}.")
-
-            # Send the JSON message
-            client_socket.sendall(json.dumps(message).encode('utf-8'))
-            
-            # Log based on message type
-            if message['type'] == 'regular':
-                log_message(f"Robot{robot_id} : Sent message: '{message['message']}' to robot on {server_host}:{server_port}.")
-            elif message['type'] == 'ping':
-                log_message(f"Robot{robot_id} : Sent ping message to robot on {server_host}:{server_port}.")
-            elif message['type'] == 'update':
-                log_message(f"Robot{robot_id} : Sent update message to robot on {server_host}:{server_port}.")
-            else:
-                msg_type = message['type']
-                topic = Topics(message[msg_type]['topic']).name
-                log_message(f"Robot{robot_id} : Sent {msg_type} message on topic '{topic}' to "\
-                            f"robot on {server_host}:{server_port}.")
-
-            # Record propagation metrics
-            propog_time = time.time() - start_time
-            metrics.record_propagation_time(message['type'], propog_time)
-            log_message(f"Robot{robot_id} : Message propagation to the next peer took {propog_time:.2f} seconds.")
-
-            log_message(f"Robot{robot_id} : Closed connection to server {server_host}:{server_port}.")
-            client_socket.close()
+        # Reuse the long-lived stream to the target robot
+        with tracer.span(f"send {message['type']}", message.get('trace')) as span:
+            if connection_pool.send(server_host, server_port, tracer.inject(message, span)):
+                log_message(f"Robot{robot_id} : Connected to server {server_host}:{server_port}.", DEBUG)
+        log_sent_message(robot_id, message, server_host, server_port, start_time)
     except socket.error as e:
-        log_message(f"Robot{robot_id} : Could not reach successor {server_host}:{server_port}. Error: {e}")
+        log_message(f"Robot{robot_id} : Could not reach successor {server_host}:{server_port}. Error: {e}", WARNING)
         find_new_successor(robot_id)
         new_successor = robots[robot_id]["successor"]
         server_host = robots[new_successor]["host"]
@@ -389,147 +763,1037 @@ def handle_server(server_host, server_port, robot_id, message):
         t.join()
     return
 
+def record_sent(message, size):
+    """Count a frame written to a peer (connection pools call this too)."""
+    metrics.record_sent(message['type'], size)
+
+def log_sent_message(robot_id, message, server_host, server_port, start_time):
+    """Log a message that was handed to a peer and record its propagation time."""
+    journal.sent(server_host, server_port, message)
+    # Log based on message type
+    if message['type'] == 'regular':
+        log_message(f"Robot{robot_id} : Sent message: '{message['message']}' to robot on {server_host}:{server_port}.", DEBUG)
+    elif message['type'] == 'ping':
+        log_message(f"Robot{robot_id} : Sent ping message to robot on {server_host}:{server_port}.", DEBUG)
+    else:
+        msg_type = message['type']
+        # Tree overlay messages carry the poll they belong to
+        body = message.get(msg_type, message.get('poll'))
+        topic = Topics(body['topic']).name
+        poll_id = body.get('id', body.get('poll_id'))
+        log_message(f"Robot{robot_id} : Sent {msg_type} message on topic '{topic}' to "\
+                    f"robot on {server_host}:{server_port}{poll_label(poll_id)}.", DEBUG)
+
+    # Record propagation metrics
+    propog_time = clock() - start_time
+    metrics.record_propagation_time(message['type'], propog_time)
+    log_message(f"Robot{robot_id} : Message propagation to the next peer took {propog_time:.4f} seconds.", DEBUG)
+
 def handle_client(client_socket, robot_id):
     """
-    Handle incoming messages from connected robots.
-    Processes different message types:
-    - Regular messages (simple logging)
-    - Poll messages (voting)
-    - Action messages (command execution)
+    Read messages from a connected robot until it closes the stream.
+    Peers keep their connection open and send length-prefixed frames,
+    so several messages of any size may arrive on the same connection.
+    A stream that sends a message that cannot be handled is closed.
     """
-    global timeout_flag, start_time_shutdown
     with client_socket:
-        while not timeout_flag:
+        # Wake up periodically to check the shutdown flags
+        client_socket.settimeout(POLL_INTERVAL)
+        decoder = FrameDecoder()
+        while not timeout_flag and not shutdown_flag:
             # Receive data from connected robot
-            data = client_socket.recv(1024)
-            if not data:
+            try:
+                if not decoder.recv_into(client_socket):
+                    break
+                payloads = list(decoder.frames())
+            except TimeoutError:
+                continue
+            except (OSError, ValueError) as e:
+                log_message(f"Robot{robot_id} : Dropped connection: {e}", WARNING)
                 break
-            if start_time_shutdown and (time.time() - start_time_shutdown) > CONSENSUS_TIMEOUT:
-                log_message(f"Robot{robot_id} : Consensus timeout reached. Shutting down...")
-                timeout_flag = True
-                perform_graceful_shutdown(robot_id)
+
+            try:
+                for payload in payloads:
+                    decode_start = time.time_ns()
+                    message = decode_message(payload)
+                    if message['type'] == 'hello':
+                        # Codec offer on a new stream: tell the peer what to use
+                        client_socket.sendall(encode_message(answer_hello(message, connection_pool.codecs)))
+                        continue
+                    tracer.record("decode", decode_start, message.get('trace'), type=message['type'])
+                    message = deduplicate(message, robot_id)
+                    if message is not None:
+                        handle_message(message, robot_id)
+            except Exception as e:
+                # A bad frame from one peer must not stop the robot
+                log_message(f"Robot{robot_id} : Closed the connection: could not handle a message: {e!r}", WARNING)
                 break
+    return
 
-            receive_time = time.time()
-            message = json.loads(data.decode('utf-8'))
-            new_message = None
-
-            # Record message receipt in metrics
-            metrics.increment_message_count(message['type'])
-            log_message(f"Robot{robot_id} : Started processing {message['type']} message from robot {message['sender_id']}...")
-
-            # Process message based on type
-            if message['type'] == 'regular':
-                # Simple message - just log it
-                log_message(f"Robot{robot_id} : Received regular message '{message['message']}' " \
-                            f"from robot {message['sender_id']}.")
-                
-            elif message['type'] == 'ping':
-                log_message(f"Robot{robot_id} : Received ping message from robot {message['sender_id']}.")
-
-            elif message['type'] == 'update':
-                # Update message - update network information
-                log_message(f"Robot{robot_id} : Received update message from robot {message['sender_id']}.")
-
-                if message['initiator_id'] != robot_id:
-                    new_message = handle_update_message(message, robot_id)
-                else:
-                    log_message(f"Robot{robot_id} : Update message returned to initiator.")
-
-            elif message['type'] == 'poll':
-                if start_time_shutdown is None and 'start_time' in message['poll']:
-                    start_time_shutdown = message['poll']['start_time']
-                    log_message(f"Robot{robot_id} : start_time_shutdown set to {start_time_shutdown}")
-                    
-                # Voting message
-                topic = Topics(message['poll']['topic']).name
-                log_message(f"Robot{robot_id} : Received poll message on action '{topic}' " \
-                            f"from robot {message['sender_id']}.")
-                
-                # Process the vote
-                new_message = handle_vote_message(message, robot_id)
-
-                global consensus_count, CONSENSUS_LIMIT
-
-                # Check voting results
-                if new_message['poll']['count_against'] > len(robots) // 2 or \
-                    new_message['poll']['count_for'] + new_message['poll']['count_against'] == len(robots):
-                    # Majority against or all votes counted - reject proposal
-                    log_message(f"Robot{robot_id} : Proposal to '{topics[message['poll']['topic']]}' by " \
-                                f"robot {message['poll']['initiator_id']} was rejected.")
-                    
-                elif new_message['poll']['count_for'] > len(robots) // 2:
-                    # Majority for - perform the action
-                    perform_action(Topics(message['poll']['topic']), robot_id)
-
-
-                    # Convert to action message and propagate
-                    new_message = {
-                        'sender_id': robot_id,
-                        'sender_host': robots[robot_id]['host'],
-                        'sender_port': robots[robot_id]['port'],
-                        'type': 'action',
-                        'action': {
-                            'initiator_id': robot_id,
-                            'topic': message['poll']['topic']
-                        },
-                        'message': f"Action '{Topics(message['poll']['topic']).name}' initiated by robot {message['sender_id']}."
-                    }                    
-                else:
-                    # No majority yet - continue voting
-                    log_message(f"Robot{robot_id} : Poll for {topic} still in progress.")
-
-            elif message['type'] == 'action':
-                # Action execution message
-                topic = Topics(message['action']['topic']).name
-
-                log_message(f"Robot{robot_id} : Received action message on topic '{topic}' " \
-                            f"from robot {message['sender_id']}.")
-                
-                # Only perform action if we're not the original initiator
-                if message['action']['initiator_id'] != robot_id:
-                    perform_action(Topics(message['action']['topic']), robot_id)
-                    new_message = handle_action_message(message, robot_id)
-                else:
-                    # Message has returned to initiator - stop propagation
-                    log_message(f"Robot{robot_id} : Action '{topic}' " \
-                                f"returned to initiator.")
-                    new_message = None
-                    perform_graceful_shutdown(robot_id)
-                    
-            elif message['type'] == 'shutdown':             
-                perform_graceful_shutdown(robot_id, send_shutdown_to_others=False)
+def open_poll(poll, robot_id):
+    """
+    Add a poll to the in-flight table (multi-poll mode).
+    Returns False if the poll is past its deadline and must be dropped.
+    """
+    now = clock()
+    with polls_lock:
+        expire_polls(robot_id, now)
+        if poll['deadline'] < now:
+            return False
+        polls.setdefault(poll['id'], {
+            "initiator_id": poll['initiator_id'],
+            "topic": poll['topic'],
+            "deadline": poll['deadline'],
+        })
+    return True
+
+def close_poll(poll_id):
+    with polls_lock:
+        polls.pop(poll_id, None)
+
+def expire_polls(robot_id, now):
+    """Drop polls past their deadline. The caller holds polls_lock."""
+    for poll_id in [pid for pid, poll in polls.items() if poll["deadline"] < now]:
+        if polls.pop(poll_id)["initiator_id"] == robot_id:
+            metrics.record_poll_expired()
+            log_message(f"Robot{robot_id} : Poll {poll_id} expired without a result.", WARNING)
+
+def finish_poll(poll, robot_id, accepted):
+    """Record the decision on a poll made by this robot (multi-poll mode)."""
+    close_poll(poll['id'])
+    metrics.record_decision(accepted, clock() - poll['start_time'])
+
+def start_poll(robot_id, host, port, max_in_flight):
+    """
+    Open a new poll unless this robot already has max_in_flight of its own
+    polls in flight. Returns the poll message, or None.
+    """
+    now = clock()
+    with polls_lock:
+        expire_polls(robot_id, now)
+        if sum(1 for poll in polls.values() if poll["initiator_id"] == robot_id) >= max_in_flight:
+            return None
+    message = create_poll_message(robot_id, host, port)
+    message['poll'].update({
+        'id': f"{robot_id}-{next(poll_counter)}",
+        'start_time': now,
+        'deadline': now + POLL_TIMEOUT,
+    })
+    open_poll(message['poll'], robot_id)
+    journal.started(message)
+    metrics.record_poll_started()
+    log_message(f"Robot{robot_id} : Started poll {message['poll']['id']} " \
+                f"on '{Topics(message['poll']['topic']).name}'.")
+    return message
+
+def poll_initiator(robot_id, host, port, interval, max_in_flight):
+    """Start a new poll every `interval` seconds while there is room (multi-poll mode)."""
+    while not timeout_flag and not shutdown_flag:
+        message = start_poll(robot_id, host, port, max_in_flight)
+        if message and overlay == "tree":
+            start_tree_vote(create_tree_poll_message(message, robot_id), robot_id)
+        elif message:
+            successor_id = robots[robot_id]["successor"]
+            handle_server(robots[successor_id]["host"], robots[successor_id]["port"], robot_id, message)
+        time.sleep(interval)
+
+class Outcome:
+    """
+    What has to happen once a message has been processed.
+    Filled in by process_message and carried out by the runtime, so the
+    thread and asyncio runtimes share the same protocol logic.
+    """
+
+    def __init__(self, forward=None, action=None, shutdown=None, sends=None):
+        self.forward = forward    # Message to send to the successor
+        self.action = action      # Topics member to perform before forwarding
+        self.shutdown = shutdown  # None, "broadcast" or "local"
+        self.sends = sends or []  # (robot_id, message) pairs sent after forwarding
+        self.action_ack = None    # Who to tell once the action is done (see action_completed)
+        self.ack_timer = None     # Key of an action whose missing acks to give up on after ACK_TIMEOUT
+
+def poll_verdict(poll, electorate):
+    """
+    Result of a poll so far among `electorate` robots: "accepted",
+    "rejected" or None while it is still open, and the topic decided on.
+    """
+    if 'ballot' in poll:
+        return ballot_verdict(poll, electorate)
+    if poll['count_against'] > electorate // 2 or poll['count_for'] + poll['count_against'] == electorate:
+        return "rejected", poll['topic']
+    if poll['count_for'] > electorate // 2:
+        return "accepted", poll['topic']
+    return None, poll['topic']
+
+def ballot_verdict(poll, electorate):
+    """
+    A ballot is won as soon as the leader is further ahead than the robots
+    that have not voted yet could make up. If every ballot is in and the
+    top score is shared, the poll is rejected, like a tied yes/no poll.
+    """
+    scores = poll['scores']
+    ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    leader, runner_up = ranked[0], ranked[1]
+    remaining = max(electorate - poll['count_for'], 0)
+    most_points = 1 if poll['ballot'] == "plurality" else len(scores) - 1
+    topic = list(Topics)[leader].value
+    if scores[leader] - scores[runner_up] > remaining * most_points:
+        return "accepted", topic
+    if remaining == 0:
+        return "rejected", topic
+    return None, topic
+
+def consensus_timed_out():
+    return bool(start_time_shutdown) and (clock() - start_time_shutdown) > CONSENSUS_TIMEOUT
+
+def handle_message(message, robot_id):
+    """
+    Process a single message received from another robot and carry out
+    the resulting action, shutdown and propagation.
+    """
+    global timeout_flag
+    if consensus_timed_out():
+        log_message(f"Robot{robot_id} : Consensus timeout reached. Shutting down...", WARNING)
+        timeout_flag = True
+        perform_graceful_shutdown(robot_id)
+        return
+
+    receive_time = time.time()
+    journal.received(message)
+    with tracer.span(f"receive {message['type']}", message.get('trace')):
+        outcome = process_message(message, robot_id)
+        carry_out(outcome, robot_id)
+
+    # Record message processing time
+    processed_time = time.time() - receive_time
+    log_message(f"Robot{robot_id} : Message processed in {processed_time:.2f} seconds.", DEBUG)
+    if consensus_timed_out():
+        log_message(f"Robot{robot_id} : Timeout reached after processing in handle_client", WARNING)
+        perform_graceful_shutdown(robot_id)
+
+def carry_out(outcome, robot_id):
+    """Perform the action, shutdown and sends of an Outcome."""
+    if outcome.action:
+        # Act on the executor and pass the message on right away
+        parent = tracer.current()
+        if action_executor is None or \
+                not action_executor.submit(run_action, outcome.action, outcome.action_ack, robot_id, parent):
+            run_action(outcome.action, outcome.action_ack, robot_id, parent)
+
+    if outcome.shutdown:
+        perform_graceful_shutdown(robot_id, send_shutdown_to_others=outcome.shutdown == "broadcast")
+
+    # Propagate message to next robot if needed
+    if outcome.forward:
+        successor_id = robots[robot_id]["successor"]
+        successor_host = robots[successor_id]["host"]
+        successor_port = robots[successor_id]["port"]
+        server_thread = threading.Thread(
+            target=handle_server,
+            args=(successor_host,
+                  successor_port,
+                  robot_id,
+                  tracer.stamp(outcome.forward))
+        )
+        server_threads.append(server_thread)
+        server_thread.start()
+        server_thread.join()
+
+    # Messages to explicit robots (tree overlay). An unreachable robot is
+    # handed back to the protocol, which may route around it.
+    for target_id, message in outcome.sends:
+        if not send_direct(robot_id, target_id, tracer.stamp(message)) and message['type'] in TREE_MESSAGES:
+            carry_out(tree_send_failed(message, target_id, robot_id), robot_id)
+
+    if outcome.ack_timer:
+        timer = threading.Timer(ACK_TIMEOUT, lambda: carry_out(acks_expired(outcome.ack_timer, robot_id), robot_id))
+        timer.daemon = True
+        timer.start()
+
+def run_action(action, action_ack, robot_id, parent=None):
+    with tracer.span(f"action {action.name}", parent):
+        perform_action(action, robot_id)
+        carry_out(action_completed(action_ack, robot_id), robot_id)
+
+def send_direct(robot_id, target_id, message):
+    """Send a message to one robot without ring repair. Returns False if it is unreachable."""
+    if target_id not in robots:
+        return False
+    host, port = robots[target_id]["host"], robots[target_id]["port"]
+    message = with_message_id(message, robot_id)
+    start_time = clock()
+    try:
+        with tracer.span(f"send {message['type']}", message.get('trace')) as span:
+            if connection_pool.send(host, port, tracer.inject(message, span)):
+                log_message(f"Robot{robot_id} : Connected to server {host}:{port}.", DEBUG)
+        log_sent_message(robot_id, message, host, port, start_time)
+        return True
+    except socket.error as e:
+        log_message(f"Robot{robot_id} : Could not reach robot {target_id}. Error: {e}", WARNING)
+        connection_pool.discard(host, port)
+        return False
+
+def start_tree_vote(message, robot_id):
+    """Start a tree poll as its root and fall back to the ring if it does not finish in time."""
+    # One span for the whole fan-out, so that the poll is one trace
+    with tracer.span("start tree", poll=tree_key(message['poll'])):
+        outcome = start_tree_poll(message, robot_id)
+        timer = threading.Timer(TREE_TIMEOUT, check_tree_vote, args=(tree_key(message['poll']), robot_id))
+        timer.daemon = True
+        timer.start()
+        carry_out(outcome, robot_id)
+
+def check_tree_vote(key, robot_id):
+    fallback = tree_vote_expired(key, robot_id)
+    if fallback:
+        successor_id = robots[robot_id]["successor"]
+        handle_server(robots[successor_id]["host"], robots[successor_id]["port"], robot_id, fallback)
+
+def process_message(message, robot_id):
+    """
+    Apply a message to this robot's state and decide what happens next.
+    Processes different message types:
+    - Regular messages (simple logging)
+    - Poll messages (voting)
+    - Action messages (command execution)
+    Does no I/O besides logging; the returned Outcome tells the runtime
+    which action to perform and what to send.
+    """
+    global start_time_shutdown
+    outcome = Outcome()
+
+    # Record message receipt in metrics
+    metrics.increment_message_count(message['type'])
+    log_message(f"Robot{robot_id} : Started processing {message['type']} message from robot {message['sender_id']}...", DEBUG)
+
+    if 'membership' in message:
+        applied = membership.merge(message['membership'])
+        if applied:
+            log_message(f"Robot{robot_id} : Applied {applied} membership deltas from robot {message['sender_id']}, " \
+                        f"now at epoch {membership.epoch[0]}.")
+
+    # Process message based on type
+    if message['type'] == 'regular':
+        # Simple message - just log it
+        log_message(f"Robot{robot_id} : Received regular message '{message['message']}' " \
+                    f"from robot {message['sender_id']}.")
+        
+    elif message['type'] == 'ping':
+        log_message(f"Robot{robot_id} : Received ping message from robot {message['sender_id']}.", DEBUG)
+
+    elif message['type'] == 'poll':
+        poll_id = message['poll'].get('id')
+        if poll_id is None and start_time_shutdown is None and 'start_time' in message['poll']:
+            start_time_shutdown = message['poll']['start_time']
+            log_message(f"Robot{robot_id} : start_time_shutdown set to {start_time_shutdown}")
+            
+        # Voting message
+        topic = Topics(message['poll']['topic']).name
+        log_message(f"Robot{robot_id} : Received poll message on action '{topic}' " \
+                    f"from robot {message['sender_id']}{poll_label(poll_id)}.")
+
+        if poll_id is not None and 'result' in message['poll']:
+            # Result of a finished poll on its way back to the initiator
+            close_poll(poll_id)
+            if message['poll']['initiator_id'] != robot_id:
+                outcome.forward = relay_message(message, robot_id)
             else:
-                # Unknown message type
-                log_message(f"Robot{robot_id} : Unknown message type '{message['type']}' from robot {message['sender_id']}.")
-                new_message = None
-
-            # Propagate message to next robot if needed
-            if new_message:
-                successor_id = robots[robot_id]["successor"]
-                successor_host = robots[successor_id]["host"]
-                successor_port = robots[successor_id]["port"]
-                server_thread = threading.Thread(
-                    target=handle_server,
-                    args=(successor_host,
-                          successor_port,
-                          robot_id,
-                          new_message)
-                )
-                server_threads.append(server_thread)
-                server_thread.start()
-                server_thread.join()
+                log_message(f"Robot{robot_id} : Poll {poll_id} returned to initiator " \
+                            f"({message['poll']['result']}).")
+            return outcome
+
+        if poll_id is not None and not open_poll(message['poll'], robot_id):
+            log_message(f"Robot{robot_id} : Poll {poll_id} is past its deadline. Dropped.", WARNING)
+            return outcome
         
-            # Record message processing time
-            processed_time = time.time() - receive_time
-            log_message(f"Robot{robot_id} : Message processed in {processed_time:.2f} seconds.")
-            if start_time_shutdown and (time.time() - start_time_shutdown) > CONSENSUS_TIMEOUT:
-                log_message(f"Robot{robot_id} : Timeout reached after processing in handle_client")
-                perform_graceful_shutdown(robot_id)
-                return
-            break
-        client_socket.close()
-    return
+        # Process the vote
+        new_message = handle_vote_message(message, robot_id)
+        outcome.forward = new_message
+
+        # Check voting results
+        verdict, chosen = poll_verdict(new_message['poll'], len(robots))
+        if verdict == "rejected":
+            # Majority against or all votes counted - reject proposal
+            log_message(f"Robot{robot_id} : Proposal to '{topics[chosen]}' by " \
+                        f"robot {message['poll']['initiator_id']}{poll_label(poll_id)} was rejected.")
+            if poll_id is None:
+                # The vote is over: stop the poll instead of circulating it until the timeout
+                outcome.forward = None
+                outcome.shutdown = "broadcast"
+            else:
+                # Keep running; the result travels on so the initiator can close the poll
+                finish_poll(new_message['poll'], robot_id, accepted=False)
+                new_message['poll']['result'] = "rejected"
+                if message['poll']['initiator_id'] == robot_id:
+                    outcome.forward = None
+            
+        elif verdict == "accepted":
+            # Majority for (or a ballot winner that can no longer be caught) - perform the action
+            log_message(f"Robot{robot_id} : Proposal to '{topics[chosen]}' by " \
+                        f"robot {message['poll']['initiator_id']}{poll_label(poll_id)} was accepted.")
+            outcome.action = Topics(chosen)
+            if poll_id is not None:
+                finish_poll(new_message['poll'], robot_id, accepted=True)
+
+            # Convert to action message and propagate
+            outcome.forward = {
+                'sender_id': robot_id,
+                'sender_host': robots[robot_id]['host'],
+                'sender_port': robots[robot_id]['port'],
+                'type': 'action',
+                'action': {
+                    'initiator_id': robot_id,
+                    'topic': chosen
+                },
+                'message': f"Action '{Topics(chosen).name}' initiated by robot {message['sender_id']}."
+            }
+            if poll_id is not None:
+                outcome.forward['action']['poll_id'] = poll_id
+            outcome.action_ack = expect_acks(outcome.forward['action'])
+        else:
+            # No majority yet - continue voting
+            log_message(f"Robot{robot_id} : Poll for {topic} still in progress.", DEBUG)
+
+    elif message['type'] == 'action':
+        # Action execution message
+        topic = Topics(message['action']['topic']).name
+        poll_id = message['action'].get('poll_id')
+
+        log_message(f"Robot{robot_id} : Received action message on topic '{topic}' " \
+                    f"from robot {message['sender_id']}{poll_label(poll_id)}.")
+
+        if poll_id is not None:
+            close_poll(poll_id)
+        
+        # Only perform action if we're not the original initiator
+        if message['action']['initiator_id'] != robot_id:
+            outcome.action = Topics(message['action']['topic'])
+            outcome.action_ack = dict(message['action'])
+            outcome.forward = handle_action_message(message, robot_id)
+        else:
+            # Message has returned to initiator - stop propagation and
+            # shut down once every robot has finished the action
+            log_message(f"Robot{robot_id} : Action '{topic}' " \
+                        f"returned to initiator{poll_label(poll_id)}.")
+            outcome = action_returned(message['action'], robot_id)
+
+    elif message['type'] == 'action_ack':
+        outcome = record_ack(message['action_ack'], message['sender_id'], robot_id)
+            
+    elif message['type'] in TREE_MESSAGES:
+        outcome = process_tree_message(message, robot_id)
+
+    elif message['type'] == 'shutdown':             
+        outcome.shutdown = "local"
+    else:
+        # Unknown message type
+        log_message(f"Robot{robot_id} : Unknown message type '{message['type']}' from robot {message['sender_id']}.")
+
+    return outcome
+
+def action_key(action):
+    return action.get('poll_id') or f"{action['initiator_id']}:{action['topic']}"
+
+def expect_acks(action):
+    """Start waiting for every robot to finish an action this robot decided on."""
+    with actions_lock:
+        pending_actions[action_key(action)] = {
+            "topic": action['topic'], "poll_id": action.get('poll_id'),
+            "acked": set(), "expected": None, "start_time": clock(),
+        }
+    return dict(action)
+
+def action_completed(action_ack, robot_id):
+    """
+    This robot has finished an action: tell the robot that decided on it,
+    or the tree parent in tree mode. Returns the Outcome to carry out.
+    """
+    if action_ack is None:
+        return Outcome()
+    if 'tree_key' in action_ack:
+        return tree_action_done(action_ack['tree_key'], robot_id)
+    if action_ack['initiator_id'] == robot_id:
+        return record_ack(action_ack, robot_id, robot_id)
+    ack_message = {
+        "type": "action_ack",
+        "sender_id": robot_id,
+        "action_ack": action_ack
+    }
+    return Outcome(sends=[(action_ack['initiator_id'], ack_message)])
+
+def record_ack(action, sender_id, robot_id):
+    with actions_lock:
+        state = pending_actions.get(action_key(action))
+        if state is None:
+            return Outcome()
+        state["acked"].add(sender_id)
+        return actions_done(action_key(action), robot_id)
+
+def action_returned(action, robot_id):
+    """
+    The action message has been around the ring: every robot that started
+    the action counted itself in it, and this robot acts too. Wait for that
+    many acks, or give up on the missing ones after ACK_TIMEOUT.
+    """
+    with actions_lock:
+        state = pending_actions.get(action_key(action))
+        if state is None:
+            return Outcome(shutdown="broadcast" if action.get('poll_id') is None else None)
+        state["expected"] = action.get('started', 0) + 1
+        outcome = actions_done(action_key(action), robot_id)
+        if action_key(action) in pending_actions:
+            outcome.ack_timer = action_key(action)
+        return outcome
+
+def actions_done(key, robot_id):
+    """Shut down once every robot has acknowledged the action. The caller holds actions_lock."""
+    state = pending_actions[key]
+    if state["expected"] is None or len(state["acked"]) < state["expected"]:
+        return Outcome()
+    pending_actions.pop(key)
+    log_message(f"Robot{robot_id} : All {len(state['acked'])} robots completed action " \
+                f"'{Topics(state['topic']).name}' in {clock() - state['start_time']:.2f} seconds.")
+    if state["poll_id"] is None:
+        return Outcome(shutdown="broadcast")
+    return Outcome()
+
+def acks_expired(key, robot_id):
+    """Called ACK_TIMEOUT after an action returned; stop waiting for robots that never acked."""
+    with actions_lock:
+        state = pending_actions.pop(key, None)
+    if state is None:
+        return Outcome()
+    log_message(f"Robot{robot_id} : {state['expected'] - len(state['acked'])} of {state['expected']} robots " \
+                f"did not acknowledge action '{Topics(state['topic']).name}' within {ACK_TIMEOUT}s.", WARNING)
+    if state["poll_id"] is None:
+        return Outcome(shutdown="broadcast")
+    return Outcome()
+
+# ---------------------------------------------------------------------------
+# Tree overlay
+#
+# The initiator orders the ring into a member list with itself first; the
+# children of members[i] are members[k*i+1 .. k*i+k]. A tree_poll goes down
+# the tree, every robot votes once and answers its parent with a tree_tally
+# of its whole subtree once all of its children have answered. The
+# initiator decides and sends a tree_decision down the same way; robots
+# answer with tree_done after acting. A robot that cannot reach a child
+# adopts the child's children, and the initiator re-runs the poll on the
+# ring if the tallies are not complete within TREE_TIMEOUT.
+# ---------------------------------------------------------------------------
+
+TREE_MESSAGES = ('tree_poll', 'tree_tally', 'tree_decision', 'tree_done')
+
+def tree_key(poll):
+    """Polls without an id (single-poll mode) are told apart by initiator and start time."""
+    return poll.get('id') or f"{poll['initiator_id']}@{poll.get('start_time')}"
+
+def blank_tally(poll):
+    """The counts a robot adds its vote to and that are summed up the tree."""
+    if 'ballot' in poll:
+        return {'count_for': 0, 'scores': [0] * len(poll['scores'])}
+    return {'count_for': 0, 'count_against': 0}
+
+def add_tally(total, tally):
+    for field, value in tally.items():
+        if isinstance(value, list):
+            total[field] = [a + b for a, b in zip(total[field], value)]
+        else:
+            total[field] += value
+
+def tree_children(members, fanout, rid):
+    i = members.index(rid)
+    return members[fanout * i + 1: fanout * i + fanout + 1]
+
+def ring_order(robot_id):
+    """Robots in ring order, starting with robot_id."""
+    members = [robot_id]
+    rid = robots[robot_id]["successor"]
+    while rid != robot_id and rid in robots and rid not in members:
+        members.append(rid)
+        rid = robots[rid]["successor"]
+    return members
+
+def tree_message(robot_id, msg_type, poll, **fields):
+    message = {
+        'sender_id': robot_id,
+        'sender_host': robots[robot_id]['host'],
+        'sender_port': robots[robot_id]['port'],
+        'type': msg_type,
+        'poll': poll,
+    }
+    message.update(fields)
+    return message
+
+def create_tree_poll_message(message, robot_id):
+    """Turn a poll created by this robot into the tree_poll that starts it on the tree."""
+    return tree_message(robot_id, 'tree_poll', message['poll'], members=ring_order(robot_id),
+                        fanout=TREE_FANOUT, message=message['message'])
+
+def start_tree_poll(message, robot_id):
+    """
+    Register this robot as the root of a tree poll and send it to its children.
+    Per poll, a robot keeps {"parent", "phase" ("vote" or "decision"),
+    "waiting" (children that have not answered), "tally" (the counts of
+    its subtree, see blank_tally), "missing" (robots found unreachable),
+    "members", "fanout", "poll"}.
+    """
+    poll = message['poll']
+    children = tree_children(message['members'], message['fanout'], robot_id)
+    log_message(f"Robot{robot_id} : Started tree poll on '{Topics(poll['topic']).name}' " \
+                f"over {len(message['members'])} robots (fanout {message['fanout']}).")
+    with tree_lock:
+        tree_votes[tree_key(poll)] = {
+            "parent": None, "phase": "vote", "waiting": set(children),
+            "tally": {field: poll[field] for field in blank_tally(poll)}, "missing": [],
+            "members": message['members'], "fanout": message['fanout'], "poll": poll,
+        }
+        outcome = tree_step(tree_key(poll), robot_id)
+    outcome.sends = [(child, message) for child in children] + outcome.sends
+    return outcome
+
+def process_tree_message(message, robot_id):
+    """Handle one of the TREE_MESSAGES; called by process_message."""
+    global start_time_shutdown
+    poll = message['poll']
+    key = tree_key(poll)
+    topic = Topics(poll['topic']).name
+    sender_id = message['sender_id']
+
+    if message['type'] == 'tree_poll':
+        if poll.get('id') is None and start_time_shutdown is None and poll.get('start_time'):
+            start_time_shutdown = poll['start_time']
+            log_message(f"Robot{robot_id} : start_time_shutdown set to {start_time_shutdown}")
+        log_message(f"Robot{robot_id} : Received tree poll message on action '{topic}' " \
+                    f"from robot {sender_id}{poll_label(poll.get('id'))}.")
+        if poll.get('id') is not None and not open_poll(poll, robot_id):
+            log_message(f"Robot{robot_id} : Poll {poll['id']} is past its deadline. Dropped.", WARNING)
+            return Outcome()
+
+        # Vote on a blank tally; the counts are added up on the way back
+        vote = handle_vote_message({'sender_id': sender_id,
+                                    'poll': dict(poll, **blank_tally(poll))}, robot_id)['poll']
+        children = tree_children(message['members'], message['fanout'], robot_id)
+        with tree_lock:
+            tree_votes[key] = {
+                "parent": sender_id, "phase": "vote", "waiting": set(children),
+                "tally": {field: vote[field] for field in blank_tally(poll)}, "missing": [],
+                "members": message['members'], "fanout": message['fanout'], "poll": poll,
+            }
+            outcome = tree_step(key, robot_id)
+        outcome.sends = [(child, relay_message(message, robot_id)) for child in children] + outcome.sends
+        return outcome
+
+    if message['type'] == 'tree_decision':
+        log_message(f"Robot{robot_id} : Received tree decision on action '{topic}' " \
+                    f"({poll['result']}) from robot {sender_id}{poll_label(poll.get('id'))}.")
+        if poll.get('id') is not None:
+            close_poll(poll['id'])
+        children = tree_children(message['members'], message['fanout'], robot_id)
+        accepted = poll['result'] == "accepted"
+        with tree_lock:
+            # This robot's own action is awaited like a child's tree_done
+            tree_votes[key] = {
+                "parent": sender_id, "phase": "decision",
+                "waiting": set(children) | ({robot_id} if accepted else set()),
+                "members": message['members'], "fanout": message['fanout'], "poll": poll,
+            }
+            outcome = tree_step(key, robot_id)
+        if accepted:
+            outcome.action = Topics(poll['topic'])
+            outcome.action_ack = {'tree_key': key}
+        outcome.sends = [(child, relay_message(message, robot_id)) for child in children] + outcome.sends
+        return outcome
+
+    # tree_tally or tree_done from a child
+    phase = "vote" if message['type'] == 'tree_tally' else "decision"
+    with tree_lock:
+        state = tree_votes.get(key)
+        if state is None or state["phase"] != phase or sender_id not in state["waiting"]:
+            log_message(f"Robot{robot_id} : Ignored late {message['type']} message from robot {sender_id}.", DEBUG)
+            return Outcome()
+        state["waiting"].discard(sender_id)
+        if phase == "vote":
+            add_tally(state["tally"], message['tally'])
+            state["missing"].extend(message['missing'])
+        return tree_step(key, robot_id)
+
+def tree_step(key, robot_id):
+    """
+    Answer the parent, or decide as the root, once every child has answered.
+    The caller holds tree_lock.
+    """
+    state = tree_votes[key]
+    if state["waiting"]:
+        return Outcome()
+    poll = state["poll"]
+
+    if state["parent"] is not None:
+        tree_votes.pop(key)
+        if state["phase"] == "vote":
+            reply = tree_message(robot_id, 'tree_tally', poll, tally=state["tally"], missing=state["missing"])
+        else:
+            reply = tree_message(robot_id, 'tree_done', poll)
+        return Outcome(sends=[(state["parent"], reply)])
+
+    if state["phase"] == "vote":
+        return tree_decide(key, robot_id)
+
+    # Every robot of the tree has acted on the decision
+    tree_votes.pop(key)
+    log_message(f"Robot{robot_id} : Decision on '{Topics(poll['topic']).name}' returned to initiator.")
+    if poll.get('id') is None:
+        return Outcome(shutdown="broadcast")
+    return Outcome()
+
+def tree_decide(key, robot_id):
+    """Count the tallies at the root and send the decision down the tree. The caller holds tree_lock."""
+    state = tree_votes[key]
+    poll = state["poll"]
+    missing = state["missing"]
+    voters = len(state["members"]) - len(missing)
+    if 'ballot' in poll:
+        verdict, chosen = ballot_verdict(dict(poll, **state["tally"]), voters)
+        accepted = verdict == "accepted"
+    else:
+        chosen = poll['topic']
+        accepted = state["tally"]['count_for'] > voters // 2
+    result = "accepted" if accepted else "rejected"
+    log_message(f"Robot{robot_id} : Proposal to '{topics[chosen]}' by " \
+                f"robot {poll['initiator_id']}{poll_label(poll.get('id'))} was {result}.")
+    if missing:
+        log_message(f"Robot{robot_id} : Robots {missing} did not take part in the tree poll.", WARNING)
+    if poll.get('id') is not None:
+        finish_poll(poll, robot_id, accepted=accepted)
+    elif not accepted:
+        # Same as the ring: the vote is over
+        tree_votes.pop(key)
+        return Outcome(shutdown="broadcast")
+
+    # The decision tree leaves out the robots that are known to be down
+    members = [rid for rid in state["members"] if rid not in missing]
+    decision = dict(poll, result=result, topic=chosen)
+    children = tree_children(members, state["fanout"], robot_id)
+    tree_votes[key] = {
+        "parent": None, "phase": "decision",
+        "waiting": set(children) | ({robot_id} if accepted else set()),
+        "members": members, "fanout": state["fanout"], "poll": decision,
+    }
+    outcome = tree_step(key, robot_id)
+    if accepted:
+        outcome.action = Topics(chosen)
+        outcome.action_ack = {'tree_key': key}
+    message = tree_message(robot_id, 'tree_decision', decision, members=members, fanout=state["fanout"])
+    outcome.sends = [(child, message) for child in children] + outcome.sends
+    return outcome
+
+def tree_action_done(key, robot_id):
+    with tree_lock:
+        state = tree_votes.get(key)
+        if state is None or robot_id not in state["waiting"]:
+            return Outcome()
+        state["waiting"].discard(robot_id)
+        return tree_step(key, robot_id)
+
+def tree_send_failed(message, target_id, robot_id):
+    """
+    A tree message could not be delivered. A missing child is skipped by
+    sending the message to its children instead; a missing parent leaves
+    the poll to the initiator's ring fallback.
+    """
+    key = tree_key(message['poll'])
+    if message['type'] in ('tree_tally', 'tree_done'):
+        log_message(f"Robot{robot_id} : Parent {target_id} is unreachable. " \
+                    f"Dropped {message['type']} message.", WARNING)
+        return Outcome()
+
+    with tree_lock:
+        state = tree_votes.get(key)
+        if state is None or target_id not in state["waiting"]:
+            return Outcome()
+        grandchildren = tree_children(state["members"], state["fanout"], target_id)
+        log_message(f"Robot{robot_id} : Tree child {target_id} is unreachable. " \
+                    f"Adopting its children {grandchildren}.", WARNING)
+        state["waiting"].discard(target_id)
+        state["waiting"].update(grandchildren)
+        if state["phase"] == "vote":
+            state["missing"].append(target_id)
+        outcome = tree_step(key, robot_id)
+    outcome.sends = [(rid, message) for rid in grandchildren] + outcome.sends
+    return outcome
+
+def tree_vote_expired(key, robot_id):
+    """
+    Called by the root TREE_TIMEOUT after starting a tree poll. If the
+    tallies are still incomplete, the tree poll is abandoned and the ring
+    poll to send to the successor is returned instead.
+    """
+    with tree_lock:
+        state = tree_votes.get(key)
+        if state is None or state["phase"] != "vote" or state["parent"] is not None:
+            return None
+        tree_votes.pop(key)
+    poll = state["poll"]
+    log_message(f"Robot{robot_id} : Tree poll on '{Topics(poll['topic']).name}' incomplete after " \
+                f"{TREE_TIMEOUT}s (waiting for {sorted(state['waiting'])}). Falling back to the ring.", WARNING)
+    # The root's poll still holds only its own vote
+    return tree_message(robot_id, 'poll', poll, message=f"Vote for '{Topics(poll['topic']).name}' from robot {robot_id}.")
+
+# ---------------------------------------------------------------------------
+# asyncio runtime
+#
+# Alternative to the thread-per-connection runtime above, selected with
+# --runtime asyncio. It shares process_message with the thread runtime and
+# only replaces the blocking I/O: the listener, the pooled streams and the
+# action delay. Ring repair and shutdown reuse the blocking helpers in a
+# worker thread since they are rare.
+# ---------------------------------------------------------------------------
+
+async def async_perform_action(action, robot_id):
+    """Non-blocking version of perform_action."""
+    start_time = clock()
+    await asyncio.sleep(ACTION_DURATION)
+    complete_action(action, robot_id, start_time)
+
+async def async_perform_graceful_shutdown(robot_id, send_shutdown_to_others=True):
+    """Run perform_graceful_shutdown off the event loop and close the async streams."""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, perform_graceful_shutdown, robot_id, send_shutdown_to_others)
+    except SystemExit:
+        pass
+    async_connection_pool.close_all()
+
+async def async_handle_server(server_host, server_port, robot_id, message):
+    """asyncio version of handle_server."""
+    start_time = clock()
+    message = with_message_id(with_membership(message, robots[robot_id]["successor"]), robot_id)
+    try:
+        with tracer.span(f"send {message['type']}", message.get('trace')) as span:
+            if await async_connection_pool.send(server_host, server_port, tracer.inject(message, span)):
+                log_message(f"Robot{robot_id} : Connected to server {server_host}:{server_port}.", DEBUG)
+        log_sent_message(robot_id, message, server_host, server_port, start_time)
+    except OSError as e:
+        log_message(f"Robot{robot_id} : Could not reach successor {server_host}:{server_port}. Error: {e}", WARNING)
+        async_connection_pool.discard(server_host, server_port)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, find_new_successor, robot_id)
+        except SystemExit:
+            # No successor left
+            return
+        new_successor = robots[robot_id]["successor"]
+        await async_handle_server(robots[new_successor]["host"], robots[new_successor]["port"], robot_id, message)
+
+async def async_handle_message(message, robot_id):
+    """asyncio version of handle_message."""
+    global timeout_flag
+    if consensus_timed_out():
+        log_message(f"Robot{robot_id} : Consensus timeout reached. Shutting down...", WARNING)
+        timeout_flag = True
+        await async_perform_graceful_shutdown(robot_id)
+        return
+
+    receive_time = time.time()
+    journal.received(message)
+    with tracer.span(f"receive {message['type']}", message.get('trace')):
+        outcome = process_message(message, robot_id)
+        if not await async_carry_out(outcome, robot_id):
+            return
+
+    processed_time = time.time() - receive_time
+    log_message(f"Robot{robot_id} : Message processed in {processed_time:.2f} seconds.", DEBUG)
+    if consensus_timed_out():
+        log_message(f"Robot{robot_id} : Timeout reached after processing in handle_client", WARNING)
+        await async_perform_graceful_shutdown(robot_id)
+
+async def async_carry_out(outcome, robot_id):
+    """asyncio version of carry_out. Returns False if the robot shut down."""
+    if outcome.action and action_queue is not None:
+        action_queue.put_nowait((outcome.action, outcome.action_ack, tracer.current()))
+    elif outcome.action:
+        await async_run_action(outcome.action, outcome.action_ack, robot_id)
+
+    if outcome.shutdown:
+        await async_perform_graceful_shutdown(robot_id, send_shutdown_to_others=outcome.shutdown == "broadcast")
+        return False
+
+    if outcome.forward:
+        successor_id = robots[robot_id]["successor"]
+        await async_handle_server(robots[successor_id]["host"], robots[successor_id]["port"],
+                                  robot_id, tracer.stamp(outcome.forward))
+
+    for target_id, message in outcome.sends:
+        if not await async_send_direct(robot_id, target_id, tracer.stamp(message)) and message['type'] in TREE_MESSAGES:
+            if not await async_carry_out(tree_send_failed(message, target_id, robot_id), robot_id):
+                return False
+
+    if outcome.ack_timer:
+        asyncio.create_task(async_check_acks(outcome.ack_timer, robot_id))
+    return True
+
+async def async_run_action(action, action_ack, robot_id, parent=None):
+    with tracer.span(f"action {action.name}", parent):
+        await async_perform_action(action, robot_id)
+        await async_carry_out(action_completed(action_ack, robot_id), robot_id)
+
+async def async_check_acks(key, robot_id):
+    await asyncio.sleep(ACK_TIMEOUT)
+    await async_carry_out(acks_expired(key, robot_id), robot_id)
+
+async def async_action_executor(robot_id):
+    """asyncio version of the action executor: performs the queued actions one at a time."""
+    while not shutdown_flag:
+        action, action_ack, parent = await action_queue.get()
+        await async_run_action(action, action_ack, robot_id, parent)
+
+async def async_send_direct(robot_id, target_id, message):
+    """asyncio version of send_direct."""
+    if target_id not in robots:
+        return False
+    host, port = robots[target_id]["host"], robots[target_id]["port"]
+    message = with_message_id(message, robot_id)
+    start_time = clock()
+    try:
+        with tracer.span(f"send {message['type']}", message.get('trace')) as span:
+            if await async_connection_pool.send(host, port, tracer.inject(message, span)):
+                log_message(f"Robot{robot_id} : Connected to server {host}:{port}.", DEBUG)
+        log_sent_message(robot_id, message, host, port, start_time)
+        return True
+    except OSError as e:
+        log_message(f"Robot{robot_id} : Could not reach robot {target_id}. Error: {e}", WARNING)
+        async_connection_pool.discard(host, port)
+        return False
+
+async def async_start_tree_vote(message, robot_id):
+    """asyncio version of start_tree_vote."""
+    with tracer.span("start tree", poll=tree_key(message['poll'])):
+        outcome = start_tree_poll(message, robot_id)
+        asyncio.create_task(async_check_tree_vote(tree_key(message['poll']), robot_id))
+        await async_carry_out(outcome, robot_id)
+
+async def async_check_tree_vote(key, robot_id):
+    await asyncio.sleep(TREE_TIMEOUT)
+    fallback = tree_vote_expired(key, robot_id)
+    if fallback:
+        successor_id = robots[robot_id]["successor"]
+        await async_handle_server(robots[successor_id]["host"], robots[successor_id]["port"], robot_id, fallback)
+
+async def async_poll_initiator(robot_id, host, port, interval, max_in_flight):
+    """asyncio version of poll_initiator."""
+    while not timeout_flag and not shutdown_flag:
+        message = start_poll(robot_id, host, port, max_in_flight)
+        if message and overlay == "tree":
+            await async_start_tree_vote(create_tree_poll_message(message, robot_id), robot_id)
+        elif message:
+            successor_id = robots[robot_id]["successor"]
+            await async_handle_server(robots[successor_id]["host"], robots[successor_id]["port"],
+                                      robot_id, message)
+        await asyncio.sleep(interval)
+
+async def async_handle_client(reader, writer, robot_id):
+    """
+    asyncio version of handle_client.
+    Messages of one stream are handled in order; streams run concurrently.
+    """
+    try:
+        while not shutdown_flag:
+            try:
+                payload = await read_frame(reader)
+            except (OSError, ValueError) as e:
+                log_message(f"Robot{robot_id} : Dropped connection: {e}", WARNING)
+                break
+            if payload is None:
+                break
+            decode_start = time.time_ns()
+            message = decode_message(payload)
+            if message['type'] == 'hello':
+                # Codec offer on a new stream: tell the peer what to use
+                writer.write(encode_message(answer_hello(message, async_connection_pool.codecs)))
+                continue
+            tracer.record("decode", decode_start, message.get('trace'), type=message['type'])
+            message = deduplicate(message, robot_id)
+            if message is not None:
+                await async_handle_message(message, robot_id)
+    finally:
+        writer.close()
+
+async def run_async(robot_id, host, port, initial_message=None, server_host=None, server_port=None,
+                    initiate_polls=None, use_action_executor=True):
+    """
+    Serve this robot with asyncio.start_server until shutdown.
+    The optional initial message is sent once the listener is up.
+    `initiate_polls` is (interval, max_in_flight) for a multi-poll initiator.
+    Actions run on an executor task unless `use_action_executor` is False.
+    """
+    global timeout_flag, action_queue
+    wait_start = [time.time()]
+
+    async def on_connect(reader, writer):
+        # Record connection wait time
+        end_time = time.time()
+        metrics.record_wait_time(end_time - wait_start[0])
+        wait_start[0] = end_time
+        addr = writer.get_extra_info('peername')
+        log_message(f"Robot{robot_id} : Accepted connection from {peer_name(addr)}.", DEBUG)
+        await async_handle_client(reader, writer, robot_id)
+
+    server = await asyncio.start_server(on_connect, host, port, reuse_address=True)
+    log_message(f"Robot{robot_id} : Listening on {host}:{port} (asyncio runtime)...")
+    if unix_path:
+        unix_server = await asyncio.start_unix_server(on_connect, sock=listen_unix(unix_path))
+        log_message(f"Robot{robot_id} : Listening on {unix_path}...")
+
+    async with server:
+        if use_action_executor:
+            action_queue = asyncio.Queue()
+            asyncio.create_task(async_action_executor(robot_id))
+        if initial_message and initial_message['type'] == 'tree_poll':
+            asyncio.create_task(async_start_tree_vote(initial_message, robot_id))
+        elif initial_message:
+            asyncio.create_task(async_handle_server(server_host, server_port, robot_id, initial_message))
+        if initiate_polls:
+            asyncio.create_task(async_poll_initiator(robot_id, host, port, *initiate_polls))
+
+        while not timeout_flag and not shutdown_flag:
+            if consensus_timed_out():
+                log_message(f"Robot{robot_id} : Timeout reached in server loop", WARNING)
+                await async_perform_graceful_shutdown(robot_id)
+                break
+            await asyncio.sleep(POLL_INTERVAL)
+    if unix_path:
+        unix_server.close()
+
+def create_poll_message(robot_id, host, port):
+    """Create the poll that starts a vote on a randomly selected topic."""
+    # Randomly select a topic to vote on
+    topic = Topics(random.randint(1, 5))
+
+    message = {
+        'sender_id': robot_id,
+        'sender_host': host,
+        'sender_port': port,
+        'type': 'poll',
+        'poll': {
+            'topic': topic.value,
+            'initiator_id': robot_id,
+            'count_for': 1,  # Start with 1 vote for (our own vote)
+            'count_against': 0,
+            'start_time':start_time_shutdown
+        },
+        'message': f"Vote for '{topic.name}' from robot {robot_id}."
+    }
+    if BALLOT != "yes_no":
+        # One pass decides between all topics. 'topic' is the initiator's first
+        # choice and count_for the number of ballots cast so far.
+        ranking = rank_topics()
+        message['poll'].update({
+            'ballot': BALLOT,
+            'topic': ranking[0].value,
+            'scores': ballot_points(ranking, BALLOT),
+        })
+        message['message'] = f"Ballot on all topics ({BALLOT}) from robot {robot_id}."
+    return message
 
 def main():
     """
@@ -542,10 +1806,17 @@ def main():
     global client_threads
     global server_threads
     global robots
+    global membership
     global COMMON_LOG_FILE
     global LOG_FILE
     global METRICS_FILE
     global metrics
+    global logger
+    global worker_pool
+    global snapshot_writer
+    global failure_detector
+    global action_executor
+    global unix_path
 
     # Set up command line argument parsing
     parser = argparse.ArgumentParser(description="Individual Robot Control")
@@ -613,19 +1884,215 @@ def main():
         action='store_true',
         default=False
     )
+    parser.add_argument(
+        '--runtime',
+        help="Runtime used to serve the robot (default: threads)",
+        choices=["threads", "asyncio"],
+        default="threads"
+    )
+    parser.add_argument(
+        '--codec',
+        help="Preferred wire codec, negotiated per connection with JSON as fallback (default: binary)",
+        choices=["binary", "json"],
+        default="binary"
+    )
+    parser.add_argument(
+        '--log_level',
+        help="Lowest level written to the logs; 'info' silences per-hop chatter (default: debug)",
+        choices=list(LEVELS),
+        default="debug"
+    )
+    parser.add_argument(
+        '--workers',
+        help="Handle connections with a pool of N worker threads, threads runtime only (default: 0, one thread per connection)",
+        type=int,
+        default=0
+    )
+    parser.add_argument(
+        '--queue_depth',
+        help="Messages that may wait for a free worker before streams are paused (default: 16)",
+        type=int,
+        default=16
+    )
+    parser.add_argument(
+        '--serial_actions',
+        help="Perform each action before passing the action message on, instead of on a background executor",
+        action='store_true'
+    )
+    parser.add_argument(
+        '--trace',
+        help="Record spans of every message and write them as Chrome trace events to robot_traces/ at shutdown",
+        action='store_true'
+    )
+    parser.add_argument(
+        '--trace_buffer',
+        help="Spans kept in memory for --trace; the oldest are dropped beyond that (default: 100000)",
+        type=int,
+        default=100000
+    )
+    parser.add_argument(
+        '--profile',
+        help="Profile the robot: 'cpu' (cProfile, every call) or 'sample' (stack samples, low overhead); "
+             "written to robot_profiles/ at shutdown and on SIGUSR1",
+        choices=['cpu', 'sample']
+    )
+    parser.add_argument(
+        '--profile_memory',
+        help="Track allocations with tracemalloc and write the top allocation sites to robot_profiles/",
+        action='store_true'
+    )
+    parser.add_argument(
+        '--profile_interval',
+        help="Seconds between stack samples with --profile sample (default: 0.005)",
+        type=float,
+        default=0.005
+    )
+    parser.add_argument(
+        '--dedup_size',
+        help="Ids of handled messages kept to drop duplicates resent after a failover (default: 10000)",
+        type=int,
+        default=10000
+    )
+    parser.add_argument(
+        '--dedup_ttl',
+        help="Seconds the id of a handled message is kept (default: 60)",
+        type=float,
+        default=60.0
+    )
+    parser.add_argument(
+        '--journal',
+        help="Record every message received and sent to robot_journals/ for replay with journal.py",
+        action='store_true'
+    )
+    parser.add_argument(
+        '--seed',
+        help="Seed the random votes and topics, so a run can be repeated (default: random)",
+        type=int
+    )
+    parser.add_argument(
+        '--ack_timeout',
+        help="Seconds to wait for the last action acknowledgements once the action message has returned (default: 10)",
+        type=float,
+        default=10.0
+    )
+    parser.add_argument(
+        '--multi_poll',
+        help="Keep the swarm running and let several polls, each with its own id and deadline, circulate at once",
+        action='store_true'
+    )
+    parser.add_argument(
+        '--poll_interval',
+        help="Multi-poll mode: seconds between new polls from each initiating robot (default: 1.0)",
+        type=float,
+        default=1.0
+    )
+    parser.add_argument(
+        '--max_in_flight',
+        help="Multi-poll mode: unfinished polls an initiating robot may have at once (default: 4)",
+        type=int,
+        default=4
+    )
+    parser.add_argument(
+        '--poll_timeout',
+        help="Multi-poll mode: seconds before an unfinished poll is dropped (default: 30)",
+        type=float,
+        default=30.0
+    )
+    parser.add_argument(
+        '--ballot',
+        help="Poll type: yes/no on one random topic, or one pass ranking all topics counted by plurality or Borda (default: yes_no)",
+        choices=["yes_no", "plurality", "borda"],
+        default="yes_no"
+    )
+    parser.add_argument(
+        '--overlay',
+        help="How polls reach the swarm: one lap of the ring, or a k-ary tree with tallies combined on the way back (default: ring)",
+        choices=["ring", "tree"],
+        default="ring"
+    )
+    parser.add_argument(
+        '--fanout',
+        help="Tree overlay: children per robot (default: 4)",
+        type=int,
+        default=4
+    )
+    parser.add_argument(
+        '--tree_timeout',
+        help="Tree overlay: seconds the initiator waits for all tallies before re-running the poll on the ring (default: 5)",
+        type=float,
+        default=5.0
+    )
+    parser.add_argument(
+        '--heartbeat_interval',
+        help="Send heartbeats to the next robots on the ring every N seconds and fail over from their liveness table (default: 0, disabled)",
+        type=float,
+        default=0
+    )
+    parser.add_argument(
+        '--watch',
+        help="Failure detector: robots after this one to send heartbeats to (default: 3)",
+        type=int,
+        default=3
+    )
+    parser.add_argument(
+        '--broadcast_concurrency',
+        help="Shutdown messages sent in parallel at most (default: 8)",
+        type=int,
+        default=8
+    )
+    parser.add_argument(
+        '--broadcast_deadline',
+        help="Seconds a shutdown broadcast may take in total (default: 5)",
+        type=float,
+        default=5.0
+    )
+    parser.add_argument(
+        '--metrics_port',
+        help="Serve live metrics in the Prometheus text format on this port (default: 0, disabled)",
+        type=int,
+        default=0
+    )
+    parser.add_argument(
+        '--metrics_interval',
+        help="Append a JSON metrics snapshot every N seconds to robot_metrics/robot_<id>_metrics.jsonl (default: 0, disabled)",
+        type=float,
+        default=0
+    )
 
 
     args = parser.parse_args()
+    if args.workers > 0 and args.runtime != "threads":
+        parser.error("--workers applies to --runtime threads only")
     robot_id = args.id
     host = args.host
     port = args.port
     test_send = args.test_send
     faulty = args.faulty
+    metrics_port = args.metrics_port
     global CONSENSUS_TIMEOUT
     CONSENSUS_TIMEOUT = args.timeout
     global start_time_shutdown
+    global shutdown_flag
     global all_vote_against
     all_vote_against = args.all_vote_against
+    global multi_poll, POLL_TIMEOUT
+    multi_poll = args.multi_poll
+    POLL_TIMEOUT = args.poll_timeout
+    global BROADCAST_CONCURRENCY, BROADCAST_DEADLINE
+    BROADCAST_CONCURRENCY = args.broadcast_concurrency
+    BROADCAST_DEADLINE = args.broadcast_deadline
+    global BALLOT
+    BALLOT = args.ballot
+    global overlay, TREE_FANOUT, TREE_TIMEOUT
+    overlay = args.overlay
+    TREE_FANOUT = args.fanout
+    TREE_TIMEOUT = args.tree_timeout
+    global ACK_TIMEOUT
+    ACK_TIMEOUT = args.ack_timeout
+    if args.seed is not None:
+        seed_random(args.seed, robot_id)
+    global dedup_cache
+    dedup_cache = DedupCache(args.dedup_size, args.dedup_ttl)
 
 
     # Initialize logging and metrics files
@@ -633,6 +2100,7 @@ def main():
     LOG_FILE = get_log_file(robot_id)
     METRICS_FILE = get_metrics_file(robot_id)
     metrics = RobotMetrics(robot_id)
+    logger = AsyncLogger([LOG_FILE, COMMON_LOG_FILE], level=LEVELS[args.log_level])
 
     # Load robot network configuration if in automated mode
     if args.automate:
@@ -642,13 +2110,16 @@ def main():
             port = data[str(robot_id)]["port"]
             test_send = data[str(robot_id)]["test_send"]
             faulty = data[str(robot_id)]["faulty"]
+            metrics_port = data[str(robot_id)].get("metrics_port", metrics_port)
+            unix_path = data[str(robot_id)].get("path")
             for id_str in data.keys():
                 info = data[id_str]
                 robots[int(id_str)] = {
                     "host": info["host"],
                     "port": info["port"],
                     "successor": info["successor"],
-                    "all_vote_against": info.get("all_vote_against", False)
+                    "all_vote_against": info.get("all_vote_against", False),
+                    "path": info.get("path")
                 }
             if not all_vote_against:  # if not stated in CLI
                 all_vote_against = robots[robot_id].get("all_vote_against", False)
@@ -658,10 +2129,63 @@ def main():
         log_metrics()
         exit(1)
 
+    membership = Membership(robots, robot_id)
+    if args.trace:
+        global tracer
+        tracer = Tracer(robot_id, get_trace_file(robot_id), capacity=args.trace_buffer)
+    if args.profile or args.profile_memory:
+        global profiler
+        profiler = Profiler(robot_id, args.profile, memory=args.profile_memory,
+                            interval=args.profile_interval).start()
+        if hasattr(signal, "SIGUSR1"):
+            # Snapshot on demand (kill -USR1 <pid>), written off the signal handler
+            signal.signal(signal.SIGUSR1, lambda signum, frame: threading.Thread(
+                target=dump_profiles, args=(robot_id, True), daemon=True).start())
+        log_message(f"Robot{robot_id} : Profiling ({args.profile or 'memory only'}), " \
+                    f"send SIGUSR1 for a snapshot.")
+
+    # Codecs offered to and accepted from peers, most preferred first
+    codecs = [args.codec, "json"] if args.codec != "json" else ["json"]
+    connection_pool.codecs = async_connection_pool.codecs = heartbeat_pool.codecs = codecs
+    # Robots on this host with a Unix socket are reached through it
+    connection_pool.unix_paths = async_connection_pool.unix_paths = heartbeat_pool.unix_paths = \
+        unix_paths(robots, host)
+    connection_pool.on_sent = async_connection_pool.on_sent = heartbeat_pool.on_sent = record_sent
+
+    if args.workers > 0:
+        worker_pool = WorkerPool(args.workers, args.queue_depth, name=f"robot{robot_id}-worker")
+        log_message(f"Robot{robot_id} : Using {args.workers} workers (queue depth {args.queue_depth}).")
+
+    if not args.serial_actions and args.runtime == "threads":
+        action_executor = WorkerPool(1, 1024, name=f"robot{robot_id}-actions", daemon=True)
+
+    if metrics_port:
+        try:
+            MetricsServer(metrics, host, metrics_port, ring_size=lambda: len(robots)).start()
+            log_message(f"Robot{robot_id} : Serving metrics on http://{host}:{metrics_port}/metrics")
+        except OSError as e:
+            log_message(f"Robot{robot_id} : Could not serve metrics on port {metrics_port}: {e}", WARNING)
+    if args.metrics_interval > 0:
+        snapshot_writer = SnapshotWriter(metrics, get_snapshot_file(robot_id), args.metrics_interval,
+                                         ring_size=lambda: len(robots)).start()
+
+    if args.heartbeat_interval > 0:
+        global WATCHED_ROBOTS
+        WATCHED_ROBOTS = args.watch
+        failure_detector = FailureDetector(
+            lambda rid: heartbeat(robot_id, rid),
+            lambda: successors(robot_id, WATCHED_ROBOTS),
+            interval=args.heartbeat_interval,
+            on_change=lambda rid, alive, detection_time: liveness_changed(robot_id, rid, alive, detection_time),
+        ).start()
+        log_message(f"Robot{robot_id} : Watching the next {WATCHED_ROBOTS} robots " \
+                    f"(heartbeat every {args.heartbeat_interval}s).")
+
     print(f"Robot{robot_id}: List of comrades:")
     pprint(robots)
 
-    if start_time_shutdown is None:
+    # In multi-poll mode each poll has its own deadline instead
+    if start_time_shutdown is None and not multi_poll:
         start_time_shutdown = time.time()
         log_message(f"Robot{robot_id} : Consensus timer started (timeout: {CONSENSUS_TIMEOUT}s)")
     
@@ -677,56 +2201,93 @@ def main():
         server_host = -1
         server_port = -1
 
-    try:    
+    if args.journal:
+        global journal
+        journal = Journal(robot_id, get_journal_file(robot_id), robots, seed=args.seed, settings={
+            "CONSENSUS_TIMEOUT": CONSENSUS_TIMEOUT, "start_time_shutdown": start_time_shutdown,
+            "all_vote_against": all_vote_against, "multi_poll": multi_poll, "POLL_TIMEOUT": POLL_TIMEOUT,
+            "BALLOT": BALLOT, "overlay": overlay, "TREE_FANOUT": TREE_FANOUT, "ACK_TIMEOUT": ACK_TIMEOUT,
+        })
+        log_message(f"Robot{robot_id} : Journaling messages to {journal.path}.")
+
+    # If in test mode, prepare the initial poll
+    initial_message = create_poll_message(robot_id, host, port) if test_send and not multi_poll else None
+    # In multi-poll mode, test robots keep starting polls instead
+    initiate_polls = (args.poll_interval, args.max_in_flight) if test_send and multi_poll else None
+    if initial_message and overlay == "tree":
+        initial_message = create_tree_poll_message(initial_message, robot_id)
+    if initial_message:
+        journal.started(initial_message)
+
+    try:
+        if args.runtime == "asyncio":
+            asyncio.run(run_async(robot_id, host, port, initial_message, server_host, server_port, initiate_polls,
+                                  use_action_executor=not args.serial_actions))
+            return
+
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            # Bind to specified host and port
+            # Bind to specified host and port (peers may leave TIME_WAIT sockets behind)
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             s.bind((host, port))
             s.listen()
             log_message(f"Robot{robot_id} : Listening on {host}:{port}...")
+            listeners = [s]
+            if unix_path:
+                listeners.append(listen_unix(unix_path))
+                log_message(f"Robot{robot_id} : Listening on {unix_path}...")
             # If in test mode, send initial message
-            if test_send:
-                # Randomly select a topic to vote on
-                topic = Topics(random.randint(1, 5))
-
-                # Create poll message
-                message = {
-                    'sender_id': robot_id,
-                    'sender_host': host,
-                    'sender_port': port,
-                    'type': 'poll',
-                    'poll': {
-                        'topic': topic.value,
-                        'initiator_id': robot_id,
-                        'count_for': 1,  # Start with 1 vote for (our own vote)
-                        'count_against': 0,
-                        'start_time':start_time_shutdown
-                    },
-                    'message': f"Vote for '{topic.name}' from robot {robot_id}."
-                }
-                
+            if initial_message:
                 # Start thread to send the message
-                server_thread = threading.Thread(
-                    target=handle_server,
-                    args=(server_host, server_port, robot_id, message)
-                )
+                if initial_message['type'] == 'tree_poll':
+                    server_thread = threading.Thread(
+                        target=start_tree_vote,
+                        args=(initial_message, robot_id)
+                    )
+                else:
+                    server_thread = threading.Thread(
+                        target=handle_server,
+                        args=(server_host, server_port, robot_id, initial_message)
+                    )
                 server_threads.append(server_thread)
                 server_thread.start()
                 server_thread.join()
+            if initiate_polls:
+                initiator_thread = threading.Thread(
+                    target=poll_initiator,
+                    args=(robot_id, host, port, *initiate_polls)
+                )
+                server_threads.append(initiator_thread)
+                initiator_thread.start()
 
             # Start main server loop in a thread
             server_thread = threading.Thread(
                 target=server_loop,
-                args=(s, robot_id)
+                args=(listeners, robot_id)
             )
             server_thread.start()
             server_thread.join()
             
     except KeyboardInterrupt:
         # Handle graceful shutdown
+        shutdown_flag = True
         log_message(f"Robot{robot_id} : Shutting down...")
+        if failure_detector is not None:
+            failure_detector.stop()
         log_metrics()
+        if profiler is not None:
+            dump_profiles(robot_id)
+        connection_pool.close_all()
+        heartbeat_pool.close_all()
         for t in client_threads:
             t.join()
+    finally:
+        # Let the handlers finish first, so the spans of the shutdown are in
+        for t in client_threads:
+            t.join(timeout=1.0)
+        tracer.export()
+        journal.close()
+        if unix_path and os.path.exists(unix_path):
+            os.unlink(unix_path)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,435 @@
+import argparse
+from collections import Counter
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+import heapq
+import itertools
+import json
+from pprint import pprint
+import random
+import time
+
+import robot
+from logger import DEBUG, WARNING
+from membership import Membership
+from metrics import RobotMetrics
+
+# Discrete-event simulation of a whole swarm in one process.
+#
+# Every robot runs the real protocol code from robot.py (process_message,
+# select_new_successor, record_repair, ...). Before a robot acts,
+# its private state is swapped into the robot module globals, the same
+# globals a robot process uses. Network, action delays and failures are
+# modelled on a virtual clock, so a run takes as long as the CPU work.
+
+
+class RingView(MutableMapping):
+    """
+    One robot's view of the ring, in the format of robot.robots, on top of
+    a topology shared by all simulated robots. Entries are copied on first
+    access so a robot can change its view (new successors, removed robots)
+    without affecting the others, while untouched entries cost nothing.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.entries = {}
+        self.removed = set()
+
+    def __getitem__(self, rid):
+        entry = self.entries.get(rid)
+        if entry is None:
+            if rid in self.removed:
+                raise KeyError(rid)
+            entry = self.entries[rid] = dict(self.base[rid])
+        return entry
+
+    def __setitem__(self, rid, info):
+        if rid not in self.base:
+            raise KeyError(rid)
+        self.removed.discard(rid)
+        self.entries[rid] = info
+
+    def __delitem__(self, rid):
+        if rid not in self:
+            raise KeyError(rid)
+        self.entries.pop(rid, None)
+        self.removed.add(rid)
+
+    def __contains__(self, rid):
+        return rid in self.base and rid not in self.removed
+
+    def __iter__(self):
+        for rid in self.base:
+            if rid not in self.removed:
+                yield rid
+
+    def __len__(self):
+        return len(self.base) - len(self.removed)
+
+
+class Latency:
+    """One-way network delay: `base` seconds plus uniform jitter."""
+
+    def __init__(self, base, jitter, rng):
+        self.base = base
+        self.jitter = jitter
+        self.rng = rng
+
+    def sample(self):
+        return self.base + self.rng.uniform(0, self.jitter) if self.jitter else self.base
+
+
+class Failures:
+    """
+    When robots stop responding. `down_from` maps a robot to the virtual
+    time it fails (0 for robots that are faulty from the start).
+    Reaching a dead robot costs `detection_delay` seconds before the
+    sender gives up (refused or timed out connection).
+    """
+
+    def __init__(self, down_from=None, detection_delay=0.01):
+        self.down_from = down_from or {}
+        self.detection_delay = detection_delay
+
+    @classmethod
+    def random(cls, ids, fail_fraction, crash_fraction, crash_window, rng, detection_delay, spare=()):
+        """Pick faulty robots and robots that crash at a random time within crash_window."""
+        candidates = [rid for rid in ids if rid not in spare]
+        rng.shuffle(candidates)
+        n_faulty = int(len(candidates) * fail_fraction)
+        n_crash = int(len(candidates) * crash_fraction)
+        down_from = {rid: 0.0 for rid in candidates[:n_faulty]}
+        for rid in candidates[n_faulty:n_faulty + n_crash]:
+            down_from[rid] = rng.uniform(0, crash_window)
+        return cls(down_from, detection_delay)
+
+    def alive(self, rid, now):
+        down_from = self.down_from.get(rid)
+        return down_from is None or now < down_from
+
+
+class SimRobot:
+    """Private state of one simulated robot (what a robot process keeps in globals)."""
+
+    __slots__ = ("rid", "robots", "start_time_shutdown", "all_vote_against", "stopped",
+                 "pending_actions", "busy_until", "repaired_at", "membership")
+
+    def __init__(self, rid, robots, all_vote_against=False):
+        self.rid = rid
+        self.robots = robots
+        # Every robot starts its consensus timer at launch, as in main()
+        self.start_time_shutdown = 0.0
+        self.all_vote_against = all_vote_against
+        self.stopped = False
+        # Actions this robot decided on, waiting for acknowledgements
+        self.pending_actions = {}
+        # When the action in progress is done
+        self.busy_until = 0.0
+        # When the ring repair in progress is done; later sends wait for it
+        self.repaired_at = 0.0
+        self.membership = Membership(robots, rid)
+
+
+class SimLogger:
+    """Stands in for AsyncLogger: prints lines with the virtual time, or drops them."""
+
+    def __init__(self, simulator, verbose=False):
+        self.simulator = simulator
+        self.verbose = verbose
+
+    def log(self, message, level=DEBUG):
+        if self.verbose:
+            print(f"[{self.simulator.now:14.6f}] {message}")
+
+
+class Simulator:
+    """
+    Runs one poll on a ring of n robots (robot i's successor is i + 1) and
+    reports how it ended. Robot 1 starts the poll.
+
+    Differences from real processes: pings during ring repair are not sent
+    as messages, only their cost is counted; and a robot that reaches the
+    consensus timeout stops without broadcasting, since all of them time
+    out at nearly the same moment.
+    """
+
+    def __init__(self, n, latency, failures, timeout=30.0, action_duration=robot.ACTION_DURATION,
+                 all_vote_against=False, serial_actions=False, verbose=False):
+        self.n = n
+        self.latency = latency
+        self.failures = failures
+        self.timeout = timeout
+        self.action_duration = action_duration
+        self.serial_actions = serial_actions
+        self.now = 0.0
+        self.events = []
+        self.seq = itertools.count()
+        # Arrival time of the last message on each (sender, receiver) stream;
+        # streams are FIFO like the pooled TCP connections
+        self.link_clear = {}
+        self.stats = Counter()
+        self.messages_by_type = Counter()
+        self.decision = None
+        self.decision_time = None
+        self.last_stop = 0.0
+
+        base = {rid: {"host": "sim", "port": rid, "successor": rid % n + 1} for rid in range(1, n + 1)}
+        self.robots = {rid: SimRobot(rid, RingView(base), all_vote_against) for rid in base}
+
+        robot.clock = lambda: self.now
+        robot.logger = SimLogger(self, verbose)
+        robot.metrics = RobotMetrics("swarm")
+        robot.CONSENSUS_TIMEOUT = timeout
+
+    # --- event queue -------------------------------------------------------
+
+    def schedule(self, delay, fn, *args):
+        heapq.heappush(self.events, (self.now + delay, next(self.seq), fn, args))
+
+    @contextmanager
+    def acting_as(self, sim_robot):
+        """Swap a robot's state into the robot module for the protocol code."""
+        robot.robots = sim_robot.robots
+        robot.start_time_shutdown = sim_robot.start_time_shutdown
+        robot.all_vote_against = sim_robot.all_vote_against
+        robot.pending_actions = sim_robot.pending_actions
+        robot.membership = sim_robot.membership
+        try:
+            yield
+        finally:
+            sim_robot.start_time_shutdown = robot.start_time_shutdown
+
+    def reachable(self, rid):
+        return not self.robots[rid].stopped and self.failures.alive(rid, self.now)
+
+    # --- robot behaviour ---------------------------------------------------
+
+    def send(self, sim_robot, message):
+        """Forward a message to the successor, repairing the ring if it is gone."""
+        if sim_robot.stopped:
+            return
+        if self.now < sim_robot.repaired_at:
+            # The repair takes its time; keep messages in order behind it
+            self.schedule(sim_robot.repaired_at - self.now, self.send, sim_robot, message)
+            return
+        rid = sim_robot.rid
+        successor = sim_robot.robots[rid]["successor"]
+        if self.reachable(successor):
+            with self.acting_as(sim_robot):
+                message = robot.with_membership(message, successor)
+            self.transmit(rid, successor, message)
+            return
+
+        self.stats['repairs'] += 1
+        cost = [self.failures.detection_delay]
+
+        def is_alive(candidate):
+            if self.reachable(candidate):
+                cost[0] += 2 * self.latency.sample()
+                return True
+            cost[0] += self.failures.detection_delay
+            return False
+
+        with self.acting_as(sim_robot):
+            robot.log_message(f"Robot{rid} : Could not reach successor {successor}.", WARNING)
+            new_successor, faulty_robots = robot.select_new_successor(rid, is_alive)
+            if new_successor == rid:
+                robot.log_message(f"Robot{rid} : No successor found. I am alone in this world.", WARNING)
+                self.stop(sim_robot)
+                return
+            robot.record_repair(rid, successor, new_successor, faulty_robots)
+
+        # The message that could not be sent carries the repair to the new successor
+        sim_robot.repaired_at = self.now + cost[0]
+        self.schedule(cost[0], self.send, sim_robot, message)
+
+    def transmit(self, sender_id, receiver_id, message):
+        arrival = self.now + self.latency.sample()
+        link = (sender_id, receiver_id)
+        arrival = max(arrival, self.link_clear.get(link, 0.0))
+        self.link_clear[link] = arrival
+        self.stats['messages'] += 1
+        self.messages_by_type[message['type']] += 1
+        self.schedule(arrival - self.now, self.deliver, sender_id, receiver_id, message, self.now)
+
+    def deliver(self, sender_id, receiver_id, message, sent_at):
+        if message['type'] != 'shutdown':
+            robot.log_sent_message(sender_id, message, "sim", receiver_id, sent_at)
+        if not self.reachable(receiver_id):
+            # Crashed while the message was in flight
+            self.stats['lost'] += 1
+            return
+
+        sim_robot = self.robots[receiver_id]
+        with self.acting_as(sim_robot):
+            outcome = robot.process_message(message, receiver_id)
+
+        if message['type'] == 'poll' and self.decision is None:
+            if outcome.action:
+                self.decision, self.decision_time = "accepted", self.now
+            elif outcome.shutdown:
+                self.decision, self.decision_time = "rejected", self.now
+
+        self.carry_out(sim_robot, outcome)
+
+    def carry_out(self, sim_robot, outcome):
+        """Carry out an Outcome like robot.carry_out does."""
+        if outcome.action:
+            # One action at a time, like the action executor
+            action_start = max(self.now, sim_robot.busy_until)
+            sim_robot.busy_until = action_start + self.action_duration
+            self.schedule(sim_robot.busy_until - self.now, self.act, sim_robot, outcome, action_start)
+            if self.serial_actions:
+                # The rest waits for the action
+                return
+        self.finish(sim_robot, outcome)
+
+    def act(self, sim_robot, outcome, action_start):
+        """An action has taken its time: record it and acknowledge it."""
+        if not self.reachable(sim_robot.rid):
+            return
+        robot.complete_action(outcome.action, sim_robot.rid, action_start)
+        with self.acting_as(sim_robot):
+            done = robot.action_completed(outcome.action_ack, sim_robot.rid)
+        self.finish(sim_robot, done)
+        if self.serial_actions:
+            self.finish(sim_robot, outcome)
+
+    def finish(self, sim_robot, outcome):
+        """Shutdown and sends of an Outcome."""
+        if not self.reachable(sim_robot.rid):
+            return
+        if outcome.shutdown:
+            self.shutdown(sim_robot, broadcast=outcome.shutdown == "broadcast")
+            return
+        if outcome.forward:
+            self.send(sim_robot, outcome.forward)
+        for target, message in outcome.sends:
+            if self.reachable(target):
+                self.transmit(sim_robot.rid, target, message)
+            else:
+                self.stats['lost'] += 1
+        if outcome.ack_timer:
+            self.schedule(robot.ACK_TIMEOUT, self.acks_expired, sim_robot, outcome.ack_timer)
+
+    def acks_expired(self, sim_robot, key):
+        if not self.reachable(sim_robot.rid) or sim_robot.stopped:
+            return
+        with self.acting_as(sim_robot):
+            outcome = robot.acks_expired(key, sim_robot.rid)
+        self.finish(sim_robot, outcome)
+
+    def shutdown(self, sim_robot, broadcast):
+        if broadcast:
+            shutdown_msg = {"type": "shutdown", "sender_id": sim_robot.rid}
+            for rid in sim_robot.robots:
+                if rid == sim_robot.rid:
+                    continue
+                if self.reachable(rid):
+                    self.transmit(sim_robot.rid, rid, shutdown_msg)
+                else:
+                    self.stats['failed_shutdowns'] += 1
+        self.stop(sim_robot)
+
+    def stop(self, sim_robot):
+        if not sim_robot.stopped:
+            sim_robot.stopped = True
+            self.stats['stopped'] += 1
+            self.last_stop = self.now
+            robot.log_message(f"Robot{sim_robot.rid} : Gracefully shutted down.", DEBUG)
+
+    def time_out(self, sim_robot):
+        if self.reachable(sim_robot.rid):
+            robot.log_message(f"Robot{sim_robot.rid} : Consensus timeout reached. Shutting down...", WARNING)
+            self.stats['timeouts'] += 1
+            self.stop(sim_robot)
+
+    # --- driver ------------------------------------------------------------
+
+    def run(self):
+        wall_start = time.perf_counter()
+        for sim_robot in self.robots.values():
+            if self.failures.alive(sim_robot.rid, 0.0):
+                self.schedule(self.timeout, self.time_out, sim_robot)
+
+        initiator = self.robots[1]
+        with self.acting_as(initiator):
+            poll = robot.create_poll_message(1, "sim", 1)
+        self.send(initiator, poll)
+
+        events = 0
+        while self.events:
+            self.now, _, fn, args = heapq.heappop(self.events)
+            fn(*args)
+            events += 1
+
+        return {
+            'robots': self.n,
+            'faulty': sum(1 for t in self.failures.down_from.values() if t == 0),
+            'crashed': sum(1 for t in self.failures.down_from.values() if t > 0),
+            'decision': self.decision,
+            'decision_time': self.decision_time,
+            'finish_time': self.last_stop,
+            'messages': self.stats['messages'],
+            'messages_by_type': dict(self.messages_by_type),
+            'repairs': self.stats['repairs'],
+            'lost_messages': self.stats['lost'],
+            'failed_shutdowns': self.stats['failed_shutdowns'],
+            'timeouts': self.stats['timeouts'],
+            'stopped': self.stats['stopped'],
+            'events': events,
+            'wall_time': time.perf_counter() - wall_start,
+            'metrics': robot.metrics.get_metrics(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a swarm vote on a virtual clock")
+    parser.add_argument('-n', '--robots', help="Robots in the ring (default: 1000)", type=int, default=1000)
+    parser.add_argument('--latency', help="One-way message latency in seconds (default: 0.001)",
+                        type=float, default=0.001)
+    parser.add_argument('--jitter', help="Extra uniform random latency in seconds (default: 0.0005)",
+                        type=float, default=0.0005)
+    parser.add_argument('--fail_fraction', help="Fraction of robots that are faulty from the start (default: 0)",
+                        type=float, default=0.0)
+    parser.add_argument('--crash_fraction', help="Fraction of robots that crash during the run (default: 0)",
+                        type=float, default=0.0)
+    parser.add_argument('--crash_window', help="Crashes happen within this many seconds (default: 10)",
+                        type=float, default=10.0)
+    parser.add_argument('--detection_delay', help="Seconds to notice an unreachable robot (default: 0.01)",
+                        type=float, default=0.01)
+    parser.add_argument('--timeout', help="Consensus timeout in seconds (default: 30)", type=float, default=30.0)
+    parser.add_argument('--action_duration', help=f"Seconds an action takes (default: {robot.ACTION_DURATION})",
+                        type=float, default=robot.ACTION_DURATION)
+    parser.add_argument('--all_vote_against', help="Force all robots to vote against", action='store_true')
+    parser.add_argument('--serial_actions', help="Perform each action before passing the action message on",
+                        action='store_true')
+    parser.add_argument('--ballot', help="Poll type, as robot.py --ballot (default: yes_no)",
+                        choices=["yes_no", "plurality", "borda"], default="yes_no")
+    parser.add_argument('--seed', help="Random seed (default: 0)", type=int, default=0)
+    parser.add_argument('--verbose', help="Print the robots' log lines with virtual timestamps", action='store_true')
+    parser.add_argument('--output', help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    # Votes and topics come from the random module inside robot.py
+    random.seed(args.seed)
+    robot.BALLOT = args.ballot
+    rng = random.Random(args.seed)
+    ids = range(1, args.robots + 1)
+    failures = Failures.random(ids, args.fail_fraction, args.crash_fraction, args.crash_window, rng,
+                               args.detection_delay, spare=(1,))
+    simulator = Simulator(args.robots, Latency(args.latency, args.jitter, rng), failures,
+                          timeout=args.timeout, action_duration=args.action_duration,
+                          all_vote_against=args.all_vote_against, serial_actions=args.serial_actions,
+                          verbose=args.verbose)
+    results = simulator.run()
+
+    pprint(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
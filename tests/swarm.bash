@@ -0,0 +1,126 @@
+# Shared by the swarm tests: set TOTAL_ROBOTS (and LIVE_ROBOTS and
+# FAILED_SHUTDOWNS when some robots are faulty), source this file, then start the robots, wait for
+# them and check the logs. Robots exit on their own once the vote is over;
+# TEST_TIMEOUT stops a robot that does not.
+
+LIVE_ROBOTS=${LIVE_ROBOTS:-$TOTAL_ROBOTS}
+FAILED_SHUTDOWNS=${FAILED_SHUTDOWNS:-0}
+TEST_TIMEOUT=${TEST_TIMEOUT:-60}
+
+function remove_logs() {
+    echo "Removing old logs..."
+    rm -f robot_metrics/*.log 2>/dev/null || true
+    rm -f robot_logs/*.log 2>/dev/null || true
+
+    echo "Logs cleaned up."
+}
+
+function begin_test() {
+    pkill -9 python3 >> /dev/null 2>&1 || true
+    remove_logs
+    echo "Starting robots..."
+}
+
+# start_robot <id> <setup file> [robot.py options...]
+function start_robot() {
+    local robot_id=$1
+    local setup=$2
+    shift 2
+    timeout -s INT $TEST_TIMEOUT python3 robot.py $robot_id -a -f $setup "$@" &
+}
+
+# start_robots <setup file> [robot.py options...]: robots 1..TOTAL_ROBOTS
+function start_robots() {
+    for ((i=1; i<=TOTAL_ROBOTS; i++))
+    do
+        start_robot $i "$@"
+    done
+}
+
+function robot_logs_exist() {
+    log_directory="robot_logs"
+
+    if [ ! -f "$log_directory/all_robots.log" ]
+    then
+        echo "File '$log_directory/all_robots.log' does not exist."
+        return 1
+    fi
+
+    for ((i=1;i<=TOTAL_ROBOTS;i++))
+    do
+        if [ ! -f "$log_directory/robot_$i.log" ]
+        then
+            echo "Log '$log_directory/robot_$i.log' does not exist"
+            return 1
+        fi
+    done
+
+    return 0
+}
+
+function metric_logs_exist() {
+    metric_directory="robot_metrics"
+
+    for ((i=1;i<=TOTAL_ROBOTS;i++))
+    do
+        if [ ! -f "$metric_directory/robot_${i}_metrics.log" ]
+        then
+            echo "Log '$metric_directory/robot_${i}_metrics.log' does not exist"
+            return 1
+        fi
+    done
+
+    return 0
+}
+
+function analyze_logs() {
+    failed_shutdowns=$(grep "Failed to send shutdown" robot_logs/all_robots.log | wc -l)
+    graceful_shutdowns=$(grep "Gracefully shutted down" robot_logs/all_robots.log | wc -l)
+
+    if grep -q "Timeout reached in server loop" robot_logs/all_robots.log
+    then
+        echo "Timeout for swarm voting was exceeded"
+        return 1
+
+    elif [ $failed_shutdowns != $FAILED_SHUTDOWNS ]
+    then
+        echo "$failed_shutdowns robot(s) in the swarm failed to recieve a shutdown message (expected $FAILED_SHUTDOWNS)."
+        return 1
+
+    elif [ $graceful_shutdowns != $LIVE_ROBOTS ]
+    then
+        echo "$graceful_shutdowns robot(s) shut down gracefully (expected $LIVE_ROBOTS)."
+        return 1
+    fi
+    return 0
+}
+
+function fail() {
+    echo "Failure: $1"
+    pkill -9 python3 >> /dev/null 2>&1 || true
+    exit 1
+}
+
+function succeed() {
+    pkill -9 python3 >> /dev/null 2>&1 || true
+    echo "Success: $1"
+    exit 0
+}
+
+# check_swarm <failure message>: logs and metrics written, vote over in time
+function check_swarm() {
+    echo "Robots finished, checking logs..."
+    metric_logs_exist || fail "Robot metric logs don't exist"
+    robot_logs_exist || fail "Robot logs don't exist"
+    analyze_logs || fail "$1"
+}
+
+# expect_log <pattern> <failure message>
+function expect_log() {
+    grep -q "$1" robot_logs/all_robots.log || fail "$2"
+}
+
+# expect_no_log <pattern> <failure message>
+function expect_no_log() {
+    ! grep -q "$1" robot_logs/all_robots.log || fail "$2"
+}
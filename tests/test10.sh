@@ -0,0 +1,15 @@
+#!/bin/bash
+
+# 3 robots, robot 1 faulty: the failover reads the heartbeat table instead of pinging
+TOTAL_ROBOTS=3
+LIVE_ROBOTS=2
+source "$(dirname "$0")/swarm.bash"
+
+begin_test
+start_robots setup3_faulty.json --heartbeat_interval 0.2
+wait
+check_swarm "Robot swarm with heartbeats failed to reach a majority vote in time"
+expect_log "Watching the next" "No robot sent heartbeats."
+expect_log "Ring repaired" "No robot removed robot 1 from the ring."
+expect_no_log "ping robot 1" "The failover pinged robot 1 instead of using the heartbeat table."
+succeed "Robots with heartbeats routed around the faulty robot"
@@ -0,0 +1,12 @@
+#!/bin/bash
+
+# 5 robots ranking all topics in one Borda count ballot
+TOTAL_ROBOTS=5
+source "$(dirname "$0")/swarm.bash"
+
+begin_test
+start_robots setup5.json --ballot borda
+wait
+check_swarm "Robot swarm with Borda ballots failed to decide in time"
+expect_log "Ballot " "No robot cast a ranked ballot."
+succeed "Robots decided by Borda count"
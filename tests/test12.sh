@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# 5 robots hosted in one process by host.py, on one event loop
+TOTAL_ROBOTS=5
+source "$(dirname "$0")/swarm.bash"
+
+begin_test
+# Returns once the vote is over and every hosted robot has shut down
+timeout -s INT $TEST_TIMEOUT python3 host.py -f setup5.json
+check_swarm "Robot swarm in host.py failed to reach a majority vote in time"
+succeed "Robots in host.py reached majority vote"
@@ -0,0 +1,13 @@
+#!/bin/bash
+
+# 5 robots talking over Unix domain sockets (setup5_unix.json)
+TOTAL_ROBOTS=5
+source "$(dirname "$0")/swarm.bash"
+
+begin_test
+rm -f /tmp/swarm_robot_*.sock 2>/dev/null || true
+start_robots setup5_unix.json
+wait
+check_swarm "Robot swarm on Unix sockets failed to reach a majority vote in time"
+expect_log "Accepted connection from unix socket" "No robot was reached over a Unix socket."
+succeed "Robots on Unix sockets reached majority vote"
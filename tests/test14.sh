@@ -0,0 +1,22 @@
+#!/bin/bash
+
+# 5 robots journaling their messages with a fixed seed; every journal replays to the same messages
+TOTAL_ROBOTS=5
+source "$(dirname "$0")/swarm.bash"
+
+begin_test
+rm -f robot_journals/*.journal 2>/dev/null || true
+start_robots setup5.json --journal --seed 7
+wait
+check_swarm "Robot swarm with journals failed to reach a majority vote in time"
+
+echo "Replaying journals..."
+for ((i=1; i<=TOTAL_ROBOTS; i++))
+do
+    replay=robot_journals/robot_${i}_replay.json
+    python3 journal.py robot_journals/robot_$i.journal --output $replay > /dev/null \
+        || fail "Replaying the journal of robot $i failed"
+    python3 -c "import json, sys; run = json.load(open(sys.argv[1]))[0]; print(*run['diverged'], sep='\n'); sys.exit(bool(run['diverged']))" $replay \
+        || fail "The replay of robot $i diverged from its journal"
+done
+succeed "Robots' journals replayed to the recorded messages"
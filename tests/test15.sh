@@ -0,0 +1,29 @@
+#!/bin/bash
+
+# 3 idle robots get the same poll twice, as after a failover resend: the copy is dropped
+TOTAL_ROBOTS=3
+source "$(dirname "$0")/swarm.bash"
+
+begin_test
+# The same robots without an initiator; the test sends the poll
+SETUP=$(mktemp --suffix .json)
+python3 -c "import json; setup = json.load(open('setup3.json')); [info.update(test_send=False) for info in setup.values()]; json.dump(setup, open('$SETUP', 'w'))"
+start_robots $SETUP
+sleep 1
+python3 -c "
+import time
+import robot
+from connections import ConnectionPool
+robot.start_time_shutdown = time.time()
+poll = robot.with_message_id(robot.create_poll_message(1, '127.0.0.1', 8001), 1)
+pool = ConnectionPool()
+for _ in range(2):
+    pool.send('127.0.0.1', 8002, poll)
+pool.close_all()
+"
+wait
+rm -f $SETUP
+check_swarm "Robot swarm with a duplicate poll failed to reach a majority vote in time"
+[ $(grep "Dropped duplicate poll message 1.1" robot_logs/all_robots.log | wc -l) == 1 ] \
+    || fail "The resent poll was not dropped exactly once."
+succeed "Robots dropped the duplicate poll and reached majority vote"
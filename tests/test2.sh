@@ -22,6 +22,11 @@ function analyze_logs() {
         echo "Timeout for swarm voting was exceeded"
         return 1
 
+    elif ! grep -q "was rejected" robot_logs/all_robots.log
+    then
+        echo "No robot rejected the proposal."
+        return 1
+
     elif [ $failed_shutdowns != 0 ]
     then
         echo "$failed_shutdowns robot(s) in the swarm failed to recieve a shutdown message."
@@ -22,16 +22,30 @@ function run_robots() {
 }
 
 function analyze_logs() {
+    # Robots found unreachable are removed from the ring, so the shutdown
+    # only goes to the live ones
     failed_shutdowns=$(grep "Failed to send shutdown" robot_logs/all_robots.log | wc -l)
+    graceful_shutdowns=$(grep "Gracefully shutted down" robot_logs/all_robots.log | wc -l)
+    live_robots=$((TOTAL_ROBOTS - INITIALLY_FAILED))
 
     if grep -q "Timeout reached in server loop" robot_logs/all_robots.log
     then
         echo "Timeout for swarm voting was exceeded"
         return 1
 
-    elif [ $failed_shutdowns != $INITIALLY_FAILED ]
+    elif ! grep -q "Ring repaired" robot_logs/all_robots.log
     then
-        echo "$failed_shutdowns robot(s) in the swarm failed to recieve a shutdown message (expected $INITIALLY_FAILED)."
+        echo "No robot removed the faulty robots from the ring."
+        return 1
+
+    elif [ $failed_shutdowns != 0 ]
+    then
+        echo "$failed_shutdowns robot(s) in the swarm failed to recieve a shutdown message (expected 0)."
+        return 1
+
+    elif [ $graceful_shutdowns != $live_robots ]
+    then
+        echo "$graceful_shutdowns robot(s) shut down gracefully (expected $live_robots)."
         return 1
     fi
     return 0
@@ -0,0 +1,12 @@
+#!/bin/bash
+
+# 5 robots handling messages on a worker pool of 2 threads
+TOTAL_ROBOTS=5
+source "$(dirname "$0")/swarm.bash"
+
+begin_test
+start_robots setup5.json --workers 2 --queue_depth 4
+wait
+check_swarm "Robot swarm with worker pools failed to reach a majority vote in time"
+expect_no_log "Error in server loop" "A server loop stopped with an error."
+succeed "Robots with worker pools reached majority vote"
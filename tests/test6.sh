@@ -0,0 +1,12 @@
+#!/bin/bash
+
+# 5 robots on the asyncio runtime (one event loop per robot)
+TOTAL_ROBOTS=5
+source "$(dirname "$0")/swarm.bash"
+
+begin_test
+start_robots setup5.json --runtime asyncio
+wait
+check_swarm "Robot swarm on the asyncio runtime failed to reach a majority vote in time"
+expect_log "(asyncio runtime)" "No robot ran on the asyncio runtime."
+succeed "Robots on the asyncio runtime reached majority vote"
@@ -0,0 +1,13 @@
+#!/bin/bash
+
+# Unit tests of the building blocks (tests/test_*.py)
+echo "Running unit tests..."
+python3 -m unittest discover -s tests -v
+if [[ $? != 0 ]]
+then
+    echo "Failure: Unit tests failed"
+    exit 1
+fi
+
+echo "Success: Unit tests passed"
+exit 0
@@ -0,0 +1,19 @@
+#!/bin/bash
+
+# 5 robots, the odd ones only speaking JSON: binary and JSON streams are negotiated per connection
+TOTAL_ROBOTS=5
+source "$(dirname "$0")/swarm.bash"
+
+begin_test
+for ((i=1; i<=TOTAL_ROBOTS; i++))
+do
+    if (( i % 2 ))
+    then
+        start_robot $i setup5.json --codec json
+    else
+        start_robot $i setup5.json --codec binary
+    fi
+done
+wait
+check_swarm "Robot swarm with mixed codecs failed to reach a majority vote in time"
+succeed "Robots with mixed codecs reached majority vote"
@@ -0,0 +1,13 @@
+#!/bin/bash
+
+# 5 robots voting down a tree overlay of fanout 2 instead of the ring
+TOTAL_ROBOTS=5
+source "$(dirname "$0")/swarm.bash"
+
+begin_test
+start_robots setup5.json --overlay tree --fanout 2
+wait
+check_swarm "Robot swarm on the tree overlay failed to reach a majority vote in time"
+expect_log "Started tree poll" "No tree poll was started."
+expect_no_log "incomplete after" "The tree poll fell back to the ring."
+succeed "Robots on the tree overlay reached majority vote"
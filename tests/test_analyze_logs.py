@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+from analyze_logs import LogAnalyzer, log_files, read_logs
+
+# Run from the repository root: python3 -m unittest discover -s tests
+
+# One poll around a ring of 3 robots, then its action. Robot 3 repairs
+# the ring on the way. Times are in ms from the first line:
+#
+#   poll    1 sent 0   -> 2 received 10, sent 30 -> 3 received 45, sent 75 -> 1 received 80
+#   action  1 sent 100 -> 2 received 120, sent 130 -> 3 received 160
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "ring_of_3.log")
+
+
+def analyze(paths, chunk_size=1 << 20):
+    analyzer = LogAnalyzer()
+    for ts, rid, text in read_logs(paths, chunk_size):
+        analyzer.add(ts, rid, text)
+    return analyzer.report()
+
+
+class AnalyzeLogsTest(unittest.TestCase):
+
+    def assertStats(self, stats, count, values):
+        """count, p50 and max of a histogram summary, to its bucket precision."""
+        self.assertEqual(stats['count'], count)
+        for field, value in values.items():
+            self.assertAlmostEqual(stats[field], value, delta=value / 32)
+
+    def test_per_poll_breakdown(self):
+        report = analyze([FIXTURE])
+        self.assertEqual((report['lines'], report['robots'], report['results']), (22, 3, {'accepted': 1}))
+
+        [poll] = report['polls']
+        self.assertEqual((poll['poll'], poll['topic'], poll['initiator']), ("-", "MOVE_RIGHT", 1))
+        self.assertAlmostEqual(poll['decision_s'], 0.090, places=6)
+
+        ring = poll['phases']['poll']
+        self.assertEqual((ring['hops'], ring['path']), (3, [2, 3, 1]))
+        self.assertAlmostEqual(ring['duration_s'], 0.070, places=6)
+        # Sent to received: 10, 15 and 5 ms. Received to sent on: 20 and 30 ms
+        self.assertStats(ring['hop_s'], 3, {'p50': 0.010, 'max': 0.015})
+        self.assertStats(ring['robot_s'], 2, {'p50': 0.020, 'max': 0.030})
+
+        action = poll['phases']['action']
+        self.assertEqual((action['hops'], action['path']), (2, [1, 2, 3]))
+        self.assertAlmostEqual(action['duration_s'], 0.040, places=6)
+        self.assertStats(action['hop_s'], 2, {'p50': 0.020, 'max': 0.030})
+        self.assertStats(action['robot_s'], 1, {'max': 0.010})
+
+    def test_swarm_totals(self):
+        report = analyze([FIXTURE])
+        self.assertStats(report['hop_s']['poll'], 3, {'max': 0.015})
+        self.assertStats(report['propagation_s']['poll'], 2, {'p50': 0.002, 'max': 0.004})
+        self.assertStats(report['processing_s']['poll'], 1, {'max': 0.03})
+        self.assertEqual(report['failovers']['unreachable'], 1)
+        self.assertStats(report['failovers']['duration_s'], 1, {'max': 0.010})
+        self.assertEqual((report['expired_polls'], report['graceful_shutdowns']), (1, 1))
+
+    def test_per_robot_logs_give_the_same_report(self):
+        with open(FIXTURE) as f:
+            lines = f.readlines()
+        with tempfile.TemporaryDirectory() as directory:
+            for rid in (1, 2, 3):
+                with open(os.path.join(directory, f"robot_{rid}.log"), "w") as f:
+                    f.writelines(line for line in lines if f"] Robot{rid} : " in line)
+            paths = log_files(directory)
+            self.assertEqual(len(paths), 3)
+            # Small chunks split lines across reads
+            self.assertEqual(analyze(paths, chunk_size=16), analyze([FIXTURE]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+import os
+from pprint import pprint
+import tempfile
+import unittest
+
+from benchmark import analyze, make_setup, percentiles, read_last_metrics
+from metrics import RobotMetrics
+
+# Run from the repository root: python3 -m unittest discover -s tests
+
+START = datetime(2025, 4, 29, 23, 5, 3)
+
+# (ms after START, robot, text) of a run where robot 1 starts the poll
+RUN = [
+    (0, 1, "Consensus timer started (timeout: 110.0s)"),
+    (100, 1, "Proposal to 'MOVE_RIGHT' by robot 1 was accepted."),
+    (110, 1, "Message propagation to the next peer took 0.0020 seconds."),
+    (150, 2, "Proposal to 'MOVE_RIGHT' by robot 1 was accepted."),
+    (160, 2, "Message propagation to the next peer took 0.0040 seconds."),
+    (300, 1, "Action 'MOVE_RIGHT' completed in 0.20 seconds."),
+    (500, 2, "Action 'MOVE_RIGHT' completed in 0.35 seconds."),
+    (600, 1, "Gracefully shutted down."),
+    (700, 2, "Gracefully shutted down."),
+]
+
+
+def write_metrics(path, sent):
+    """A metrics file as robot.log_metrics writes it, with an older snapshot first."""
+    metrics = RobotMetrics(1)
+    with open(path, "w") as f:
+        for msg_type, size in sent:
+            f.write(f"\n==== Metrics at {START.isoformat()} ====\n")
+            pprint(metrics.get_metrics(), f)
+            f.write("\n")
+            metrics.record_sent(msg_type, size)
+        f.write(f"\n==== Metrics at {START.isoformat()} ====\n")
+        pprint(metrics.get_metrics(), f)
+        f.write("\n")
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_make_setup_spreads_faulty_robots(self):
+        setup = make_setup(10, 3, base_port=9000)
+        self.assertEqual(sorted(rid for rid, info in setup.items() if info["faulty"]), ["2", "5", "8"])
+        self.assertEqual([rid for rid, info in setup.items() if info["test_send"]], ["1"])
+        self.assertEqual((setup["10"]["port"], setup["10"]["successor"]), (9010, 1))
+        self.assertNotIn("path", setup["1"])
+        self.assertEqual(make_setup(3, 0, unix=True)["2"]["path"], "robot_2.sock")
+
+    def test_percentiles(self):
+        stats = percentiles([float(v) for v in range(100, 0, -1)])
+        self.assertEqual((stats['count'], stats['p50'], stats['p90'], stats['p99'], stats['max']),
+                         (100, 51.0, 91.0, 100.0, 100.0))
+        self.assertIsNone(percentiles([]))
+
+    def test_analyze_run(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            os.mkdir(os.path.join(workdir, "robot_logs"))
+            with open(os.path.join(workdir, "robot_logs", "all_robots.log"), "w") as f:
+                for offset, rid, text in RUN:
+                    f.write(f"[{(START + timedelta(milliseconds=offset)).isoformat()}] Robot{rid} : {text}\n")
+            os.mkdir(os.path.join(workdir, "robot_metrics"))
+            for rid in (1, 2):
+                write_metrics(os.path.join(workdir, "robot_metrics", f"robot_{rid}_metrics.log"),
+                              [("poll", 40), ("action", 30)])
+            self.assertEqual(read_last_metrics(os.path.join(workdir, "robot_metrics", "robot_1_metrics.log"))
+                             ['traffic']['bytes_sent'], {"poll": 40, "action": 30})
+
+            result = analyze(workdir)
+
+        # Times from the initiator's timer start, as there is no start_time line
+        self.assertEqual(result['decision'], "accepted")
+        for field, seconds in (('decision_s', 0.1), ('first_action_s', 0.3), ('last_action_s', 0.5),
+                               ('shutdown_s', 0.7)):
+            self.assertAlmostEqual(result[field], seconds, places=6)
+        self.assertEqual(result['graceful_shutdowns'], 2)
+        self.assertEqual((result['propagation_s']['count'], result['propagation_s']['max']), (2, 0.004))
+        self.assertIsNone(result['failover_s'])
+        self.assertEqual(result['messages_sent'], {"poll": 2, "action": 2})
+        self.assertEqual(result['bytes_sent'], {"poll": 80, "action": 60})
+        self.assertEqual((result['messages_per_decision'], result['bytes_per_decision']), (4, 140))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from codec import BINARY, JSON, choose_codec, decode_payload, encode_payload
+
+# Run from the repository root: python3 -m unittest discover -s tests
+
+
+class BinaryCodecTest(unittest.TestCase):
+
+    def round_trip(self, message):
+        return decode_payload(encode_payload(message, BINARY))
+
+    def test_round_trips(self):
+        messages = [
+            {"type": "poll", "sender_id": 2,
+             "poll": {"topic": 3, "initiator_id": 1, "count_for": 2, "count_against": 1, "start_time": 1.5}},
+            {"type": "poll", "sender_id": 2,
+             "poll": {"topic": 3, "initiator_id": 1, "count_for": 1, "count_against": 0}},
+            {"type": "poll", "sender_id": 2,
+             "poll": {"topic": 3, "initiator_id": 1, "count_for": 1, "count_against": 0, "start_time": None}},
+            {"type": "action", "sender_id": 4, "action": {"topic": 5, "initiator_id": 3}},
+            {"type": "ping", "sender_id": 9},
+            {"type": "shutdown", "sender_id": 9},
+        ]
+        for message in messages:
+            self.assertEqual(self.round_trip(message), message)
+
+    def test_unknown_fields_travel_in_the_extension(self):
+        message = {"type": "poll", "sender_id": 2, "trace": ["1.1", "2.3"],
+                   "poll": {"topic": 3, "initiator_id": 1, "count_for": 2, "count_against": 1,
+                            "start_time": 1.5, "id": "1.4", "scores": [1, 2, 3, 4, 5]}}
+        self.assertEqual(self.round_trip(message), message)
+
+    def test_message_id_is_in_the_fixed_part(self):
+        poll = {"type": "poll", "sender_id": 2, "msg_id": [3, 17],
+                "poll": {"topic": 3, "initiator_id": 1, "count_for": 2, "count_against": 1, "start_time": 1.5}}
+        payload = encode_payload(poll, BINARY)
+        self.assertNotIn(b"{", payload)
+        self.assertEqual(decode_payload(payload), poll)
+        # Ids that do not fit the fixed fields travel in the extension
+        ping = {"type": "ping", "sender_id": 2, "msg_id": ["a", -1]}
+        self.assertEqual(self.round_trip(ping), ping)
+
+    def test_text_and_addresses_are_left_out(self):
+        message = {"type": "ping", "sender_id": 2, "sender_host": "127.0.0.1", "sender_port": 8002,
+                   "message": "Ping from robot 2."}
+        self.assertEqual(self.round_trip(message), {"type": "ping", "sender_id": 2})
+
+    def test_unknown_types_fall_back_to_json(self):
+        for message in ({"type": "regular", "sender_id": 1, "message": "hello"},
+                        {"type": "update", "sender_id": 1, "initiator_id": 1, "successor": 3, "faulty_robots": [2]}):
+            payload = encode_payload(message, BINARY)
+            self.assertEqual(payload[0], JSON.id)
+            self.assertEqual(decode_payload(payload), message)
+
+    def test_choose_codec(self):
+        self.assertIs(choose_codec(["binary", "json"], ["binary", "json"]), BINARY)
+        self.assertIs(choose_codec(["binary", "json"], ["json"]), JSON)
+        self.assertIs(choose_codec(["zstd"], ["binary"]), JSON)
+
+
+if __name__ == "__main__":
+    unittest.main()
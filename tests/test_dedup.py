@@ -0,0 +1,34 @@
+import unittest
+
+from dedup import DedupCache
+
+# Run from the repository root: python3 -m unittest discover -s tests
+
+
+class DedupCacheTest(unittest.TestCase):
+
+    def test_second_sighting_is_a_duplicate(self):
+        cache = DedupCache()
+        self.assertFalse(cache.seen((1, 1, "poll")))
+        self.assertTrue(cache.seen((1, 1, "poll")))
+        self.assertFalse(cache.seen((1, 1, "action")))
+
+    def test_entries_expire(self):
+        now = [0.0]
+        cache = DedupCache(ttl=10.0, clock=lambda: now[0])
+        cache.seen("a")
+        now[0] = 11.0
+        self.assertFalse(cache.seen("a"))
+        self.assertEqual(len(cache), 1)
+
+    def test_capacity_drops_the_oldest(self):
+        cache = DedupCache(capacity=2)
+        for key in ("a", "b", "c"):
+            cache.seen(key)
+        self.assertEqual(len(cache), 2)
+        self.assertFalse(cache.seen("a"))
+        self.assertTrue(cache.seen("c"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import unittest
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from exporter import MetricsServer, SnapshotWriter, render_prometheus
+from metrics import RobotMetrics
+
+# Run from the repository root: python3 -m unittest discover -s tests
+
+
+def populated_metrics():
+    metrics = RobotMetrics(3)
+    for msg_type in ("poll", "poll", "action"):
+        metrics.increment_message_count(msg_type)
+    metrics.record_propagation_time("poll", 0.002)
+    metrics.record_propagation_time("poll", 0.2)
+    metrics.record_vote(True)
+    return metrics
+
+
+class PrometheusTest(unittest.TestCase):
+
+    def test_exposition_format(self):
+        lines = render_prometheus(populated_metrics(), ring_size=5).splitlines()
+
+        # Every family is declared once, before its samples
+        for name, kind in (("robot_messages_received_total", "counter"), ("robot_ring_size", "gauge"),
+                           ("robot_message_propagation_seconds", "histogram")):
+            self.assertEqual(lines.count(f"# TYPE {name} {kind}"), 1)
+            self.assertEqual(sum(line.startswith(f"# HELP {name} ") for line in lines), 1)
+            first_sample = next(i for i, line in enumerate(lines) if line.startswith(name))
+            self.assertLess(lines.index(f"# TYPE {name} {kind}"), first_sample)
+
+        self.assertIn('robot_messages_received_total{robot="3",type="poll"} 2', lines)
+        self.assertIn('robot_messages_received_total{robot="3",type="action"} 1', lines)
+        self.assertIn('robot_votes_total{robot="3",vote="for"} 1', lines)
+        self.assertIn('robot_ring_size{robot="3"} 5', lines)
+
+        # Cumulative buckets up to +Inf, then _sum and _count
+        histogram = 'robot_message_propagation_seconds_bucket{robot="3",type="poll",'
+        self.assertIn(histogram + 'le="0.001"} 0', lines)
+        self.assertIn(histogram + 'le="0.005"} 1', lines)
+        self.assertIn(histogram + 'le="0.25"} 2', lines)
+        self.assertIn(histogram + 'le="+Inf"} 2', lines)
+        self.assertIn('robot_message_propagation_seconds_count{robot="3",type="poll"} 2', lines)
+        self.assertTrue(any(line.startswith('robot_message_propagation_seconds_sum{robot="3",type="poll"} 0.20')
+                            for line in lines))
+
+    def test_server(self):
+        server = MetricsServer(populated_metrics(), "127.0.0.1", 0, ring_size=lambda: 5).start()
+        self.addCleanup(server.stop)
+        port = server.server.server_address[1]
+        with urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            self.assertIn("text/plain", response.headers["Content-Type"])
+            self.assertIn('robot_ring_size{robot="3"} 5', response.read().decode())
+        with self.assertRaises(HTTPError):
+            urlopen(f"http://127.0.0.1:{port}/other")
+
+
+class SnapshotWriterTest(unittest.TestCase):
+
+    def test_one_json_line_per_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshots.jsonl")
+            writer = SnapshotWriter(populated_metrics(), path, interval=60, ring_size=lambda: 5)
+            writer.write()
+            writer.write()
+            with open(path) as f:
+                snapshots = [json.loads(line) for line in f]
+        self.assertEqual(len(snapshots), 2)
+        self.assertEqual(snapshots[0]["robot_id"], 3)
+        self.assertEqual(snapshots[0]["ring_size"], 5)
+        self.assertEqual(snapshots[0]["message_propagation"]["counts"], {"poll": 2, "action": 1})
+        self.assertEqual(snapshots[0]["message_propagation"]["percentiles"]["poll"]["count"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
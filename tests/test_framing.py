@@ -0,0 +1,53 @@
+import asyncio
+import socket
+import unittest
+
+from framing import MAX_FRAME_SIZE, FrameDecoder, encode_frame, read_frame
+
+# Run from the repository root: python3 -m unittest discover -s tests
+
+
+class FrameDecoderTest(unittest.TestCase):
+
+    def test_frames_split_across_reads(self):
+        payloads = [b"a", b"", b"x" * 100000, b"last"]
+        data = b"".join(encode_frame(p) for p in payloads)
+        decoder = FrameDecoder(size=16)
+        received = []
+        for i in range(0, len(data), 7):
+            decoder.feed(data[i:i + 7])
+            received.extend(decoder.frames())
+        self.assertEqual(received, payloads)
+
+    def test_recv_into_from_socket(self):
+        left, right = socket.socketpair()
+        with left, right:
+            left.sendall(encode_frame(b"one") + encode_frame(b"two")[:3])
+            decoder = FrameDecoder()
+            decoder.recv_into(right)
+            self.assertEqual(list(decoder.frames()), [b"one"])
+            left.sendall(encode_frame(b"two")[3:])
+            decoder.recv_into(right)
+            self.assertEqual(list(decoder.frames()), [b"two"])
+
+    def test_oversized_frame_is_refused(self):
+        decoder = FrameDecoder()
+        decoder.feed((MAX_FRAME_SIZE + 1).to_bytes(4, "big"))
+        with self.assertRaises(ValueError):
+            list(decoder.frames())
+
+    def test_read_frame_ends_at_a_cut_frame(self):
+        async def read_all(data):
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            frames = []
+            while (frame := await read_frame(reader)) is not None:
+                frames.append(frame)
+            return frames
+
+        self.assertEqual(asyncio.run(read_all(encode_frame(b"whole") + encode_frame(b"cut")[:5])), [b"whole"])
+
+
+if __name__ == "__main__":
+    unittest.main()
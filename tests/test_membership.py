@@ -0,0 +1,65 @@
+import unittest
+
+from membership import Membership
+
+# Run from the repository root: python3 -m unittest discover -s tests
+
+
+def ring(n):
+    return {rid: {"host": "127.0.0.1", "port": 8000 + rid, "successor": rid % n + 1} for rid in range(1, n + 1)}
+
+
+class MembershipTest(unittest.TestCase):
+
+    def test_deltas_apply_once_in_any_order(self):
+        deltas = [
+            {"epoch": [1, 2], "successors": [[2, 4]], "removed": [3]},
+            {"epoch": [2, 4], "successors": [[4, 1]], "removed": [5]},
+        ]
+        forward, backward = Membership(ring(5), 1), Membership(ring(5), 1)
+        for delta in deltas:
+            self.assertTrue(forward.apply(delta))
+            self.assertFalse(forward.apply(delta))
+        for delta in reversed(deltas):
+            backward.apply(delta)
+        self.assertEqual(forward.robots, backward.robots)
+        self.assertEqual(sorted(forward.robots), [1, 2, 4])
+
+    def test_late_delta_from_another_robot_after_the_log_wrapped(self):
+        membership = Membership(ring(5), 1, log_size=1)
+        self.assertTrue(membership.apply({"epoch": [5, 2], "successors": [], "removed": []}))
+        self.assertTrue(membership.apply({"epoch": [6, 3], "successors": [], "removed": []}))
+        # Made before the others by robot 4, delivered last
+        self.assertTrue(membership.apply({"epoch": [3, 4], "successors": [[4, 1]], "removed": [5]}))
+        self.assertNotIn(5, membership.robots)
+        self.assertEqual(membership.robots[4]["successor"], 1)
+
+    def test_new_successor_gets_what_has_not_gone_round(self):
+        membership = Membership(ring(4), 1)
+        own = membership.record(successors=[(1, 3)], removed=[2])
+        relayed = {"epoch": [2, 3], "successors": [[3, 4]], "removed": []}
+        membership.apply(relayed)
+        self.assertEqual(membership.outgoing(3)["deltas"], [own, relayed])
+        self.assertEqual(membership.outgoing(3)["deltas"], [])
+        # Robot 1's delta is back, so every robot has seen it
+        self.assertFalse(membership.apply(own))
+        self.assertEqual(membership.outgoing(4)["deltas"], [relayed])
+
+    def test_a_delta_never_removes_this_robot(self):
+        membership = Membership(ring(3), 1)
+        membership.apply({"epoch": [1, 2], "successors": [], "removed": [1, 3]})
+        self.assertEqual(sorted(membership.robots), [1, 2])
+
+    def test_log_is_capped(self):
+        membership = Membership(ring(3), 1, log_size=4)
+        for _ in range(10):
+            membership.record(successors=[(1, 2)])
+        self.assertEqual(len(membership.log), 4)
+        self.assertEqual(len(membership.seen), 4)
+        # A delta older than the log is not applied again
+        self.assertFalse(membership.apply({"epoch": [1, 1], "successors": [[1, 3]], "removed": []}))
+        self.assertEqual(membership.robots[1]["successor"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
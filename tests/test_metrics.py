@@ -0,0 +1,38 @@
+import unittest
+
+from metrics import SUB_BUCKETS, Histogram
+
+# Run from the repository root: python3 -m unittest discover -s tests
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_percentiles_within_bucket_error(self):
+        h = Histogram()
+        for i in range(1, 1001):
+            h.record(i / 1000)  # 1 ms .. 1 s
+        self.assertEqual(h.count, 1000)
+        for p in (50, 90, 99):
+            expected = p / 100
+            self.assertAlmostEqual(h.percentile(p), expected, delta=expected / SUB_BUCKETS)
+        self.assertEqual(h.percentile(100), 1.0)
+
+    def test_merge_adds_samples(self):
+        a, b = Histogram(), Histogram()
+        for _ in range(10):
+            a.record(0.001)
+            b.record(0.1)
+        merged = a.copy().merge(b)
+        self.assertEqual(merged.count, 20)
+        self.assertEqual(merged.min, 0.001)
+        self.assertEqual(merged.max, 0.1)
+        self.assertEqual(a.count, 10)
+
+    def test_empty(self):
+        h = Histogram()
+        self.assertEqual(h.percentile(99), 0)
+        self.assertEqual(h.mean(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from unittest import mock
+
+import robot
+from logger import INFO
+from metrics import RobotMetrics
+
+# Run from the repository root: python3 -m unittest discover -s tests
+
+
+class MultiPollTest(unittest.TestCase):
+    """Polls of robot 1 on a 5-robot ring, with a clock the test moves."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.lines = []
+        ring = {rid: {"host": "127.0.0.1", "port": 8000 + rid, "successor": rid % 5 + 1, "all_vote_against": False}
+                for rid in range(1, 6)}
+        for name, value in (("robots", ring), ("polls", {}), ("multi_poll", True), ("POLL_TIMEOUT", 10.0),
+                            ("clock", lambda: self.now), ("metrics", RobotMetrics(1)), ("logger", self)):
+            patcher = mock.patch.object(robot, name, value, create=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def log(self, message, level=INFO):
+        self.lines.append(message)
+
+    def start_poll(self):
+        return robot.start_poll(1, "127.0.0.1", 8001, max_in_flight=2)
+
+    def test_overlapping_polls_and_expiry(self):
+        first = self.start_poll()
+        self.now = 5.0
+        second = self.start_poll()
+        first_id, second_id = first['poll']['id'], second['poll']['id']
+        self.assertNotEqual(first_id, second_id)
+        self.assertEqual(set(robot.polls), {first_id, second_id})
+        self.assertIsNone(self.start_poll())
+
+        # Past the first poll's deadline, not the second's: the first one
+        # is dropped and makes room for a new poll
+        self.now = 12.0
+        third = self.start_poll()
+        self.assertEqual(set(robot.polls), {second_id, third['poll']['id']})
+        self.assertIn(f"Robot1 : Poll {first_id} expired without a result.", self.lines)
+        self.assertEqual(robot.metrics.snapshot().polls_expired, 1)
+
+    def test_poll_past_its_deadline_is_not_passed_on(self):
+        first = self.start_poll()
+        self.now = 5.0
+        second = self.start_poll()
+        self.now = 12.0
+        # Robot 2 has not seen either poll yet
+        robot.polls.clear()
+
+        outcome = robot.process_message(first, 2)
+        self.assertIsNone(outcome.forward)
+        self.assertNotIn(first['poll']['id'], robot.polls)
+
+        # Two votes of five decide nothing yet
+        outcome = robot.process_message(second, 2)
+        self.assertEqual(outcome.forward['poll']['id'], second['poll']['id'])
+        self.assertEqual(outcome.forward['poll']['count_for'] + outcome.forward['poll']['count_against'], 2)
+        self.assertIn(second['poll']['id'], robot.polls)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+from unittest import mock
+
+import robot
+from profiling import Profiler
+
+# Run from the repository root: python3 -m unittest discover -s tests
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def in_thread(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.start()
+    thread.join()
+
+
+class ProfilerTest(unittest.TestCase):
+    """Dumps are written to robot_profiles/ under a temporary directory."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+
+    def start(self, mode, **kwargs):
+        profiler = Profiler(7, mode, **kwargs).start()
+        self.addCleanup(profiler.stop)
+        return profiler
+
+    def test_cpu_profile_covers_other_threads(self):
+        profiler = self.start("cpu")
+        self.addCleanup(lambda: [profile.disable() for profile in profiler.profiles])
+        in_thread(busy, 0.01)
+
+        paths = profiler.dump()
+        self.assertEqual(paths, [os.path.join("robot_profiles", "robot_7_final.prof"),
+                                 os.path.join("robot_profiles", "robot_7_final_cpu.txt")])
+        functions = {name for _, _, name in pstats.Stats(paths[0]).stats}
+        self.assertIn("busy", functions)
+        with open(paths[1]) as f:
+            self.assertTrue(f.readline().startswith("Robot 7: 2 threads profiled"))
+
+    def test_samples_are_folded_by_stack(self):
+        profiler = self.start("sample", interval=0.001)
+        in_thread(busy, 0.1)
+
+        folded, summary = profiler.dump()
+        with open(folded) as f:
+            stacks = [line.rsplit(" ", 1) for line in f]
+        self.assertTrue(any(stack.endswith("test_profiling.py:busy") for stack, _ in stacks))
+        self.assertTrue(all(int(count) > 0 for _, count in stacks))
+        with open(summary) as f:
+            self.assertIn("test_profiling.py:busy", f.read())
+
+    def test_snapshots_while_running(self):
+        profiler = self.start(None, memory=True, frames=1)
+        self.addCleanup(tracemalloc.stop)
+        lines = []
+        logger = mock.Mock(log=lambda message, level: lines.append(message))
+        with mock.patch.object(robot, "profiler", profiler), mock.patch.object(robot, "logger", logger, create=True):
+            # What the SIGUSR1 handler runs
+            robot.dump_profiles(7, snapshot=True)
+            kept = [bytearray(1024) for _ in range(100)]
+            robot.dump_profiles(7, snapshot=True)
+
+        first = os.path.join("robot_profiles", "robot_7_snapshot1_memory.txt")
+        second = os.path.join("robot_profiles", "robot_7_snapshot2_memory.txt")
+        self.assertEqual(lines, [f"Robot7 : Wrote profile snapshot to {first}",
+                                 f"Robot7 : Wrote profile snapshot to {second}"])
+        with open(first) as f:
+            self.assertNotIn("changes since the last dump", f.read())
+        with open(second) as f:
+            self.assertIn("changes since the last dump", f.read())
+        self.assertEqual(len(kept), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from tracing import Tracer, merge
+
+# Run from the repository root: python3 -m unittest discover -s tests
+
+
+def complete_events(tracer):
+    return {event["name"]: event for event in tracer.events() if event["ph"] == "X"}
+
+
+class TracerTest(unittest.TestCase):
+
+    def test_spans_nest_through_the_context(self):
+        tracer = Tracer(1, None)
+        with tracer.span("handle poll") as outer:
+            with tracer.span("send poll") as inner:
+                self.assertEqual(tracer.current(), inner.context())
+            self.assertEqual(tracer.current(), outer.context())
+        self.assertIsNone(tracer.current())
+
+        self.assertIsNone(outer.parent_id)
+        self.assertEqual(inner.trace_id, outer.trace_id)
+        self.assertEqual(inner.parent_id, outer.span_id)
+        # A span started outside any other begins a new trace
+        with tracer.span("heartbeat") as other:
+            self.assertNotEqual(other.trace_id, outer.trace_id)
+
+    def test_tasks_inherit_the_current_span(self):
+        tracer = Tracer(1, None)
+
+        async def child():
+            with tracer.span("send action") as span:
+                return span
+
+        async def run():
+            with tracer.span("handle poll") as parent:
+                return parent, await asyncio.create_task(child())
+
+        parent, span = asyncio.run(run())
+        self.assertEqual(span.parent_id, parent.span_id)
+
+    def test_chrome_trace_events_across_robots(self):
+        sender, receiver = Tracer(1, None), Tracer(2, None)
+        with sender.span("send poll") as span:
+            message = sender.inject({"type": "poll"}, span)
+        with receiver.span("receive poll", parent=message["trace"]) as received:
+            pass
+        self.assertEqual(received.trace_id, span.trace_id)
+
+        events = sender.events() + receiver.events()
+        self.assertIn({"name": "process_name", "ph": "M", "pid": 2, "args": {"name": "Robot 2"}}, events)
+        sent = complete_events(sender)["send poll"]
+        handled = complete_events(receiver)["receive poll"]
+        self.assertEqual((sent["pid"], handled["pid"]), (1, 2))
+        self.assertGreaterEqual(sent["dur"], 0)
+        self.assertEqual(handled["args"]["parent_id"], span.span_id)
+        # A flow arrow from the send to the receive
+        flows = [(event["ph"], event["pid"]) for event in events if event.get("id") == span.span_id]
+        self.assertEqual(flows, [("s", 1), ("f", 2)])
+
+    def test_oldest_spans_are_dropped(self):
+        tracer = Tracer(1, None, capacity=2)
+        for name in ("a", "b", "c"):
+            with tracer.span(name):
+                pass
+        self.assertEqual(sorted(complete_events(tracer)), ["b", "c"])
+
+    def test_export_and_merge(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for robot_id in (1, 2):
+                tracer = Tracer(robot_id, os.path.join(directory, f"robot_{robot_id}_trace.json"))
+                with tracer.span("handle poll"):
+                    pass
+                tracer.export()
+                paths.append(tracer.path)
+            output = os.path.join(directory, "swarm_trace.json")
+            self.assertEqual(merge(paths, output), 6)
+            with open(output) as f:
+                trace = json.load(f)
+        self.assertEqual({event["pid"] for event in trace["traceEvents"]}, {1, 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+import argparse
+from collections import deque
+from contextvars import ContextVar
+import glob
+import itertools
+import json
+import os
+import threading
+import time
+
+# Per-message tracing. Every traced message carries a trace context,
+#
+#     "trace": {"trace_id": "3.1", "span_id": "3.17"}
+#
+# naming the trace (one per poll) and the span that sent it. The robot that
+# receives it starts its spans for the message as children of that span,
+# so the spans of all robots form one tree per poll. Finished spans go
+# into a fixed-size ring buffer and are written as Chrome trace-event JSON
+# (chrome://tracing, https://ui.perfetto.dev) at shutdown; `python
+# tracing.py` merges the files of all robots into one timeline.
+
+# The span the current thread or task is working in
+current_span = ContextVar("current_span", default=None)
+
+
+def get_trace_file(robot_id):
+    trace_dir = "robot_traces"
+    os.makedirs(trace_dir, exist_ok=True)
+    return os.path.join(trace_dir, f"robot_{robot_id}_trace.json")
+
+
+class Span:
+    """A timed piece of work; use it as a context manager."""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "remote", "args", "start", "token")
+
+    def __init__(self, tracer, name, trace_id, span_id, parent_id, remote, args):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.remote = remote
+        self.args = args
+
+    def context(self):
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        self.token = current_span.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        current_span.reset(self.token)
+        self.tracer.finish(self, self.start, time.time_ns())
+        return False
+
+
+class Tracer:
+    """
+    Records spans of one robot. Recording a span is a tuple appended to a
+    deque of `capacity` entries; when it is full the oldest spans are dropped.
+    export() writes them to `path`.
+    """
+
+    def __init__(self, robot_id, path, capacity=100000):
+        self.robot_id = robot_id
+        self.path = path
+        self.spans = deque(maxlen=capacity)
+        self.ids = itertools.count(1)
+        self.threads = {}
+
+    def new_id(self):
+        return f"{self.robot_id}.{next(self.ids)}"
+
+    def span(self, name, parent=None, **args):
+        """
+        A span under `parent`: the trace context of a received message, or by
+        default the current span. Without either, the span starts a new trace.
+        """
+        remote = parent is not None
+        if parent is None:
+            current = current_span.get()
+            parent = current.context() if current is not None else None
+        if parent is None:
+            return Span(self, name, self.new_id(), self.new_id(), None, False, args)
+        return Span(self, name, parent["trace_id"], self.new_id(), parent["span_id"], remote, args)
+
+    def record(self, name, start, parent=None, **args):
+        """Record a span that started at `start` (time.time_ns()) and ends now."""
+        span = self.span(name, parent, **args)
+        self.finish(span, start, time.time_ns())
+
+    def finish(self, span, start, end):
+        thread = threading.current_thread()
+        if thread.ident not in self.threads:
+            self.threads[thread.ident] = thread.name
+        self.spans.append((span.name, span.trace_id, span.span_id, span.parent_id, span.remote,
+                           start, end, thread.ident, span.args))
+
+    def current(self):
+        """Trace context of the current span, or None."""
+        span = current_span.get()
+        return span.context() if span is not None else None
+
+    def stamp(self, message):
+        """A copy of a message to send, carrying the current span as its parent."""
+        context = self.current()
+        if context is None:
+            return message
+        message = message.copy()
+        message['trace'] = context
+        return message
+
+    def inject(self, message, span):
+        """A copy of a message sent from within `span`."""
+        message = message.copy()
+        message['trace'] = span.context()
+        return message
+
+    def events(self):
+        """The recorded spans as Chrome trace events."""
+        pid = self.robot_id
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"Robot {pid}"}}]
+        for tid, name in list(self.threads.items()):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        for name, trace_id, span_id, parent_id, remote, start, end, tid, args in list(self.spans):
+            ts = start / 1000
+            events.append({
+                "name": name, "cat": name.split()[0], "ph": "X", "ts": ts, "dur": (end - start) / 1000,
+                "pid": pid, "tid": tid,
+                "args": dict(args, trace_id=trace_id, span_id=span_id, parent_id=parent_id),
+            })
+            # Arrows from a send on one robot to the handling of the message on the next
+            if name.startswith("send "):
+                events.append({"name": "message", "cat": "message", "ph": "s", "id": span_id,
+                               "ts": ts, "pid": pid, "tid": tid})
+            elif remote and name.startswith("receive "):
+                events.append({"name": "message", "cat": "message", "ph": "f", "bp": "e", "id": parent_id,
+                               "ts": ts, "pid": pid, "tid": tid})
+        return events
+
+    def export(self):
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, f)
+
+
+class NullTracer:
+    """Stands in for Tracer when tracing is off."""
+
+    class _NullSpan:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    _span = _NullSpan()
+
+    def span(self, name, parent=None, **args):
+        return self._span
+
+    def record(self, name, start, parent=None, **args):
+        pass
+
+    def current(self):
+        return None
+
+    def stamp(self, message):
+        return message
+
+    def inject(self, message, span):
+        return message
+
+    def export(self):
+        pass
+
+
+def merge(paths, output):
+    """Merge the trace files of several robots into one."""
+    events = []
+    for path in paths:
+        with open(path) as f:
+            events.extend(json.load(f)["traceEvents"])
+    with open(output, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge robot trace files into one Chrome/Perfetto trace")
+    parser.add_argument('paths', help="Trace files or directories (default: robot_traces)", nargs='*',
+                        default=["robot_traces"])
+    parser.add_argument('--output', help="Merged trace (default: swarm_trace.json)", default="swarm_trace.json")
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "robot_*_trace.json"))) if os.path.isdir(path) else [path])
+    count = merge(files, args.output)
+    print(f"Merged {count} events from {len(files)} robots into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
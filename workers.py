@@ -0,0 +1,98 @@
+from collections import deque
+import queue
+import threading
+import traceback
+
+
+def _call(fn, args):
+    try:
+        fn(*args)
+    except SystemExit:
+        # Handlers end themselves with exit(); keep the worker alive
+        pass
+    except Exception:
+        traceback.print_exc()
+
+
+class WorkerPool:
+    """
+    Fixed number of worker threads fed from a bounded queue.
+    submit() never blocks: when the queue is full the task is rejected
+    and the caller decides what to do with it.
+    """
+
+    def __init__(self, size, queue_depth, name="worker", daemon=False):
+        self.size = size
+        self.queue_depth = queue_depth
+        self.tasks = queue.Queue(maxsize=queue_depth)
+        self.threads = []
+        for i in range(size):
+            t = threading.Thread(target=self._run, name=f"{name}-{i}", daemon=daemon)
+            self.threads.append(t)
+            t.start()
+
+    def _run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            fn, args = task
+            _call(fn, args)
+            self.tasks.task_done()
+
+    def submit(self, fn, *args):
+        """Queue a task. Returns False if the queue is full."""
+        try:
+            self.tasks.put_nowait((fn, args))
+            return True
+        except queue.Full:
+            return False
+
+    def pending(self):
+        return self.tasks.qsize()
+
+    def shutdown(self, timeout=None):
+        """Let the workers finish the queued tasks, then stop them."""
+        for _ in self.threads:
+            self.tasks.put(None)
+        for t in self.threads:
+            if t is not threading.current_thread():
+                t.join(timeout=timeout)
+
+
+class Strand:
+    """
+    Runs the tasks submitted to it one at a time and in order, on a shared
+    WorkerPool. Used to keep the messages of one stream ordered while
+    different streams are handled concurrently.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.pending = deque()
+        self.running = False
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """Queue a task behind the earlier ones. Returns False if overloaded."""
+        with self.lock:
+            if len(self.pending) >= self.pool.queue_depth:
+                return False
+            self.pending.append((fn, args))
+            if self.running:
+                return True
+            self.running = True
+            if not self.pool.submit(self._drain):
+                self.pending.pop()
+                self.running = False
+                return False
+            return True
+
+    def _drain(self):
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.running = False
+                    return
+                fn, args = self.pending.popleft()
+            _call(fn, args)